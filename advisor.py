@@ -0,0 +1,55 @@
+"""Index advisor: EXPLAIN the queries a route runs and flag sequential scans."""
+
+from contextlib import contextmanager
+import json
+
+from sqlalchemy import event
+
+
+@contextmanager
+def captured_statements(engine):
+    """Collect (statement, parameters) for every SELECT run on engine."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+
+def explain(connection, statement, parameters):
+    result = connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement}', parameters).scalar()
+    plan = json.loads(result) if isinstance(result, str) else result
+    return plan[0]['Plan']
+
+
+def seq_scans(plan):
+    """Yield the relation names of the Seq Scan nodes in plan."""
+    if plan['Node Type'] == 'Seq Scan':
+        yield plan['Relation Name']
+    for child in plan.get('Plans', []):
+        yield from seq_scans(child)
+
+
+def advise(engine, statements, force_index=True):
+    """Return (statement, seq scanned relations) for statements with seq scans.
+
+    With force_index the planner avoids seq scans wherever an index can
+    serve, so any that remain mean no usable index exists, however small
+    the tables are.
+    """
+    findings = []
+    with engine.connect() as connection:
+        with connection.begin():
+            if force_index:
+                connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+            for statement, parameters in statements:
+                relations = sorted(set(seq_scans(explain(connection, statement, parameters))))
+                if relations:
+                    findings.append((statement, relations))
+    return findings
@@ -3,22 +3,49 @@
 #----------------------------------------------------------------------------#
 
 
-from datetime import timezone
-import babel
-import dateutil.parser
-from enum import Enum
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort
+from datetime import timedelta, timezone
+import click
+from collections import namedtuple
+from functools import wraps
+import hashlib
+import heapq
+from flask import Flask, Blueprint, render_template, request, Response, flash, redirect, url_for, abort, session, make_response, stream_with_context
+from flask.cli import AppGroup
 from flask_migrate import Migrate
 from flask_moment import Moment
-from flask_wtf import Form
-from flask_sqlalchemy import SQLAlchemy
+from werkzeug.utils import import_string
 from forms import *
+from genres import GENRE_NAMES, GenreList, UnknownGenre, genre_filter, genre_names_ddl
+from geo import (InvalidLocation, box_center, distance_km, geohash_clause, geohash_of, in_box, load_gazetteer,
+                 parse_box, place_key, radius_box)
+from itertools import groupby
+from jobs import JobQueue
 import json
 import logging
 from logging import Formatter, FileHandler
-from sqlalchemy.dialects.postgresql import ARRAY
-from sqlalchemy import cast
+from operator import itemgetter
+import os
+import signal
+from advisor import advise, captured_statements
+from asyncdb import fan_out, use_asyncio
+from bookings import DEFAULT_DURATION, MAX_DURATION, InvalidWindow, booking_constraints_ddl, free_intervals
+from bulk import FORMATS, batches, detect_format, read_rows, validate, write_rows
+from cache import PageCache, make_backend
+from calendars import (ICALENDAR, InvalidMonth, add_months, ical_event, ical_feed, month_grid, month_weeks, parse_day,
+                       parse_month, weeks_bounds)
+from config import CONFIGS
+from dates import format_datetime
+from instrumentation import RequestMetrics, current_stats
+from pagination import InvalidCursor, keyset_page, keyset_pager, keyset_slice
+from querycheck import QueryBudgetExceeded, QueryDetector, query_budget
+from replicas import ReplicaRouter, RoutingSQLAlchemy, read_only
+from search import InMemorySearchIndex, pg_trgm_ddl, search_filter, search_rank, search_vector_ddl
+from serving import PoolBudgetExceeded, check_pool_budget
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy import event, or_
+from sqlalchemy.orm import with_loader_criteria
 import sys
+from templating import compile_templates, init_templates
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -26,9 +53,21 @@ import sys
 
 app = Flask(__name__)
 moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
+app.config.from_object(CONFIGS[os.environ.get('FYYUR_CONFIG', 'development')])
+if app.config['ASYNC_IO']:
+    use_asyncio(app.config)
+if not app.config['SECRET_KEY']:
+    raise RuntimeError('SECRET_KEY must be set')
+db = RoutingSQLAlchemy(app)
 migrate = Migrate(app, db)
+replicas = ReplicaRouter(app, db)
+# Pages are never served from cache while flashed messages are pending, nor
+# while a user reads their own writes from the primary
+page_cache = PageCache(make_backend(app.config), app.config['PAGE_CACHE_TTL'],
+                       bypass=lambda: '_flashes' in session or replicas.pinned())
+metrics = RequestMetrics(app)
+init_templates(app)
+query_detector = QueryDetector(app)
 
 
 #----------------------------------------------------------------------------#
@@ -38,6 +77,13 @@ migrate = Migrate(app, db)
 
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = (
+        db.Index('ix_venues_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_venues_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venues_state_city_name_id', 'state', 'city', 'name', 'id'),
+        db.Index('ix_venues_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_venues_geohash', 'geohash'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
@@ -45,13 +91,25 @@ class Venue(db.Model):
     state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120), nullable=False)
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    genres = db.Column(GenreList(), nullable=False)
     facebook_link = db.Column(db.String(120))
     image_link = db.Column(db.String(500), nullable=False)
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean(), default=False)
     seeking_description = db.Column(db.String(500))
-    artists = db.relationship("Show", back_populates="venue", cascade='delete')
+    # IANA name; show times at the venue are wall-clock times in it
+    timezone = db.Column(db.String(64))
+    # From the gazetteer (see Locations); geohash follows them on every write
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12).with_variant(db.String(12, collation='C'), 'postgresql'))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_time = db.Column(db.DateTime, index=True)
+    search_vector = db.deferred(db.Column(TSVECTOR().with_variant(db.Text(), 'sqlite')))
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    deleted_at = db.Column(db.DateTime)
+    artists = db.relationship("Show", back_populates="venue", cascade='delete', passive_deletes=True)
 
     def __repr__(self):
         return str(self.__dict__)
@@ -69,25 +127,40 @@ class Venue(db.Model):
         'image_link': self.image_link,
         'website': self.website,
         'seeking_talent': self.seeking_talent,
-        'seeking_description': self.seeking_description
+        'seeking_description': self.seeking_description,
+        'timezone': self.timezone,
+        'latitude': self.latitude,
+        'longitude': self.longitude
       }
 
 
 class Artist(db.Model):
     __tablename__ = 'artists'
+    __table_args__ = (
+        db.Index('ix_artists_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_artists_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artists_name_id', 'name', 'id'),
+        db.Index('ix_artists_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120), nullable=False)
-    genres = db.Column(db.ARRAY(db.String), nullable=False)
+    genres = db.Column(GenreList(), nullable=False)
     facebook_link = db.Column(db.String(120))
     image_link = db.Column(db.String(500), nullable=False)
     website = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean(), default=False)
     seeking_description = db.Column(db.String(500))
-    venues = db.relationship("Show", back_populates="artist", cascade='delete')
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_time = db.Column(db.DateTime, index=True)
+    search_vector = db.deferred(db.Column(TSVECTOR().with_variant(db.Text(), 'sqlite')))
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    deleted_at = db.Column(db.DateTime)
+    venues = db.relationship("Show", back_populates="artist", cascade='delete', passive_deletes=True)
 
     def __repr__(self):
         return str(self.__dict__)
@@ -110,11 +183,19 @@ class Artist(db.Model):
 
 class Show(db.Model):
     __tablename__ = 'shows'
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time', 'id'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time', 'id'),
+        db.Index('ix_shows_start_time', 'start_time', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
-    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    # The show books its venue and artist until then (see Bookings)
+    end_time = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     venue = db.relationship("Venue", back_populates="artists")
     artist = db.relationship("Artist", back_populates="venues")
 
@@ -126,25 +207,687 @@ class Show(db.Model):
         'id': self.id,
         'artist_id': self.artist_id,
         'venue_id': self.venue_id,
-        'start_time': self.start_time
+        'start_time': self.start_time,
+        'end_time': self.end_time
       }
 
 
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default='queued', server_default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return str(self.__dict__)
+
+
+class ShowListing(db.Model):
+    """Read model: each show with the venue and artist columns listings show."""
+    __tablename__ = 'show_listings'
+    __table_args__ = (
+        db.Index('ix_show_listings_start_time', 'start_time', 'show_id'),
+        db.Index('ix_show_listings_venue_id_start_time', 'venue_id', 'start_time', 'show_id'),
+        db.Index('ix_show_listings_artist_id_start_time', 'artist_id', 'start_time', 'show_id'),
+    )
+
+    show_id = db.Column(db.Integer, db.ForeignKey('shows.id', ondelete='CASCADE'), primary_key=True)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+    venue_id = db.Column(db.Integer, nullable=False)
+    venue_name = db.Column(db.String(120), nullable=False)
+    venue_city = db.Column(db.String(120), nullable=False)
+    venue_state = db.Column(db.String(120), nullable=False)
+    venue_image_link = db.Column(db.String(500), nullable=False)
+    venue_timezone = db.Column(db.String(64))
+    artist_id = db.Column(db.Integer, nullable=False)
+    artist_name = db.Column(db.String(120), nullable=False)
+    artist_image_link = db.Column(db.String(500), nullable=False)
+
+    def __repr__(self):
+        return str(self.__dict__)
+
+
+# Deleted venues and artists keep their rows until a purge job removes them
+# along with their shows. Until then every ORM select skips them, unless
+# run with the include_deleted execution option.
+
+def hide_deleted(execute_state):
+    if execute_state.is_select and not execute_state.execution_options.get('include_deleted', False):
+        execute_state.statement = execute_state.statement.options(
+            with_loader_criteria(Venue, lambda cls: cls.deleted_at.is_(None), include_aliases=True),
+            with_loader_criteria(Artist, lambda cls: cls.deleted_at.is_(None), include_aliases=True))
+
+
+event.listen(db.session, 'do_orm_execute', hide_deleted)
+event.listen(db.metadata, 'before_create', pg_trgm_ddl())
+event.listen(db.metadata, 'before_create', genre_names_ddl())
+event.listen(Venue.__table__, 'after_create', search_vector_ddl('venues'))
+event.listen(Artist.__table__, 'after_create', search_vector_ddl('artists'))
+event.listen(Show.__table__, 'after_create', booking_constraints_ddl())
+
+
+def fetch_all(*queries):
+    """The results of independent queries, run at once under asgi.py (asyncdb.py)."""
+    stats = current_stats()
+    if stats is not None:
+        queries = [query.execution_options(request_stats=stats) for query in queries]
+    return fan_out(db.session(), *queries, session_events=[('do_orm_execute', hide_deleted)])
+
+
 #----------------------------------------------------------------------------#
-# Filters.
+# Search.
+#----------------------------------------------------------------------------#
+
+# Databases without tsvector/pg_trgm search an in-memory index per model,
+# rebuilt on the first search after any venue or artist write.
+search_indexes = {}
+
+SearchRow = namedtuple('SearchRow', ['id', 'name', 'upcoming_shows_count', 'rank'])
+
+
+def search_page(model, term, cursor, limit):
+    """Count the rows of model matching term and fetch one page, best first.
+
+    Rows are (id, name, upcoming_shows_count, rank) tuples.
+    """
+    row_key = lambda row: (-row.rank, row.name, row.id)
+    query = model.query.with_entities(model.id, model.name, model.upcoming_shows_count)
+    if db.engine.dialect.name == 'postgresql':
+        rank = search_rank(model, term)
+        query = query.add_columns(rank.label('rank'))
+        clause = search_filter(model, term)
+        if clause is not None:
+            query = query.filter(clause)
+        page_query, page = keyset_pager(query, [-rank, model.name, model.id], row_key, cursor, limit)
+        counts, rows = fetch_all(query.with_entities(db.func.count(model.id)), page_query)
+        return counts[0][0], page(rows)
+    index = search_indexes.get(model)
+    if index is None:
+        documents = model.query.with_entities(model.id, model.name, model.city, model.state, model.genres)
+        index = search_indexes[model] = InMemorySearchIndex(documents)
+    ranks = dict(index.search(term))
+    rows = [SearchRow(*row, ranks[row.id]) for row in query.filter(model.id.in_(ranks))]
+    rows.sort(key=row_key)
+    return len(rows), keyset_slice(rows, row_key, cursor, limit)
+
+
+def invalidate_search_index(mapper, connection, target):
+    search_indexes.pop(type(target), None)
+
+
+for model in (Venue, Artist):
+    for identifier in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, identifier, invalidate_search_index)
+
+
+def filter_listing(query, model, genre=None, state=None):
+    """Narrow a venue or artist listing to a genre (GIN index) and state."""
+    if genre is not None:
+        query = query.filter(genre_filter(model, genre, db.engine.dialect.name))
+    if state is not None:
+        query = query.filter(model.state==state)
+    return query
+
+
+#----------------------------------------------------------------------------#
+# Locations.
+#----------------------------------------------------------------------------#
+
+# Venues get coordinates from the gazetteer file (GAZETTEER_PATH) by city
+# and state: `flask fyyur geocode-venues` fills them in bulk, and a job
+# geocodes venues created or moved through the app. Nearby searches read
+# the geohash index (see geo.py) and sort the venues in range by distance.
+
+NearbyVenue = namedtuple('NearbyVenue', ['id', 'name', 'city', 'state', 'address', 'latitude', 'longitude',
+                                         'upcoming_shows_count', 'distance_km'])
+gazetteers = {}
+
+
+def set_geohash(mapper, connection, target):
+    target.geohash = geohash_of(target.latitude, target.longitude)
+
+
+event.listen(Venue, 'before_insert', set_geohash)
+event.listen(Venue, 'before_update', set_geohash)
+
+
+def nearby_venues(box, latitude, longitude, limit, radius_km=None):
+    """The venues in box (and within radius_km, if given) nearest a point, nearest first."""
+    query = Venue.query.with_entities(Venue.id, Venue.name, Venue.city, Venue.state, Venue.address, Venue.latitude,
+                                      Venue.longitude, Venue.upcoming_shows_count) \
+        .filter(geohash_clause(Venue.geohash, box)) \
+        .filter(Venue.latitude.between(box.south, box.north))
+    if box.west <= box.east:
+        query = query.filter(Venue.longitude.between(box.west, box.east))
+    venues = []
+    for row in query:
+        if not in_box(box, row.latitude, row.longitude):
+            continue
+        distance = distance_km(latitude, longitude, row.latitude, row.longitude)
+        if radius_km is None or distance <= radius_km:
+            venues.append(NearbyVenue(*row, distance))
+    return heapq.nsmallest(limit, venues, key=lambda venue: (venue.distance_km, venue.id))
+
+
+def search_area():
+    """(box, latitude, longitude, radius_km) from the request, or None.
+
+    Either lat and lng with an optional radius (km), or bbox
+    (south,west,north,east) with distances from lat and lng if given, else
+    from its center. Both are limited to NEARBY_MAX_RADIUS_KM.
+    """
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lng', type=float)
+    max_radius = app.config['NEARBY_MAX_RADIUS_KM']
+    if request.args.get('bbox'):
+        box = parse_box(request.args['bbox'])
+        center = box_center(box)
+        corners = [(box.south, box.west), (box.south, box.east), (box.north, box.west), (box.north, box.east)]
+        if max(distance_km(*center, *corner) for corner in corners) > max_radius:
+            raise InvalidLocation(f'boxes must fit in a {max_radius} km radius')
+        if latitude is None or longitude is None:
+            latitude, longitude = center
+        return box, latitude, longitude, None
+    if latitude is None or longitude is None:
+        return None
+    radius = min(request.args.get('radius', app.config['NEARBY_RADIUS_KM'], type=float), max_radius)
+    return radius_box(latitude, longitude, radius), latitude, longitude, radius
+
+
+def gazetteer():
+    path = app.config['GAZETTEER_PATH']
+    if path not in gazetteers:
+        gazetteers[path] = load_gazetteer(path)
+    return gazetteers[path]
+
+
+def geocode_venues(venues, places):
+    """Set the coordinates of venues found in places; return the others."""
+    missing = []
+    for venue in venues:
+        point = places.get(place_key(venue.city, venue.state))
+        if point is None:
+            missing.append(venue)
+        else:
+            venue.latitude, venue.longitude = point
+    return missing
+
+
+def queue_geocoding(venue_id):
+    if app.config['GAZETTEER_PATH']:
+        job_queue.enqueue('geocode-venues', ids=[venue_id])
+
+
+#----------------------------------------------------------------------------#
+# Bookings.
+#----------------------------------------------------------------------------#
+
+# A venue or artist has one show at a time (bookings.py); Postgres enforces
+# it with exclusion constraints, and writes check first to say why.
+
+
+def overlapping_shows(criterion, start_time, end_time):
+    """Shows matching criterion overlapping [start_time, end_time), by start."""
+    return Show.query.filter(criterion,
+                             Show.start_time > start_time - MAX_DURATION,
+                             Show.start_time < end_time,
+                             Show.end_time > start_time) \
+        .order_by(Show.start_time, Show.id)
+
+
+def booking_conflicts(venue_id, artist_id, start_time, end_time):
+    """Shows of the venue or the artist overlapping [start_time, end_time)."""
+    return overlapping_shows(or_(Show.venue_id==venue_id, Show.artist_id==artist_id), start_time, end_time).all()
+
+
+def conflicting_show_rows(rows):
+    """Return the errors for imported show rows overlapping shows or earlier rows."""
+    start_time = min(values['start_time'] for _, values in rows)
+    end_time = max(values['end_time'] for _, values in rows)
+    venue_ids = {values['venue_id'] for _, values in rows}
+    artist_ids = {values['artist_id'] for _, values in rows}
+    booked = {}
+    shows = overlapping_shows(or_(Show.venue_id.in_(venue_ids), Show.artist_id.in_(artist_ids)), start_time, end_time)
+    for show in shows.with_entities(Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.end_time):
+        for key in (('venue_id', show.venue_id), ('artist_id', show.artist_id)):
+            booked.setdefault(key, []).append((show.start_time, show.end_time, f'show {show.id}'))
+    errors = {}
+    for line, values in rows:
+        keys = [('venue_id', values['venue_id']), ('artist_id', values['artist_id'])]
+        for key in keys:
+            for other_start, other_end, other in booked.get(key, []):
+                if other_start < values['end_time'] and values['start_time'] < other_end:
+                    errors.setdefault(line, []).append(f'{key[0]} {key[1]} is booked by {other}')
+        if line not in errors:
+            for key in keys:
+                booked.setdefault(key, []).append((values['start_time'], values['end_time'], f'line {line}'))
+    return errors
+
+
+#----------------------------------------------------------------------------#
+# Calendars.
+#----------------------------------------------------------------------------#
+
+# Month pages and iCalendar feeds of the shows of a venue or an artist
+# (calendars.py), read from show_listings by its (venue_id, start_time) and
+# (artist_id, start_time) indexes.
+
+CALENDAR_KINDS = {
+    'venue': (Venue, ShowListing.venue_id, 'show_venue'),
+    'artist': (Artist, ShowListing.artist_id, 'show_artist')
+}
+
+
+def day_start(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+def show_day_counts(column, entity_id, start, end):
+    """Query the (day, show count) rows of the shows of an entity between two dates."""
+    day = db.func.date(ShowListing.start_time)
+    return db.session.query(day, db.func.count(ShowListing.show_id)) \
+        .filter(column==entity_id) \
+        .filter(ShowListing.start_time>=day_start(start), ShowListing.start_time<day_start(end)) \
+        .group_by(day)
+
+
+def calendar_validators(validators):
+    """validators plus today's date, which calendars open on and mark."""
+    def calendar_validators(**kwargs):
+        values = validators(**kwargs)
+        return None if values is None else (*values, datetime.now().date())
+    return calendar_validators
+
+
+def calendar_page(kind, entity_id):
+    model, column, endpoint = CALENDAR_KINDS[kind]
+    error = 0
+    try:
+        today = datetime.now().date()
+        month = parse_month(request.args.get('month'), today)
+        day = parse_day(request.args['day']) if request.args.get('day') else None
+        weeks = month_weeks(month)
+        queries = [model.query.with_entities(model.id, model.name).filter(model.id==entity_id),
+                   show_day_counts(column, entity_id, *weeks_bounds(weeks))]
+        if day is not None:
+            queries.append(db.session.query(ShowListing.start_time, ShowListing.end_time, ShowListing.venue_id,
+                                            ShowListing.venue_name, ShowListing.venue_timezone, ShowListing.artist_id,
+                                            ShowListing.artist_name)
+                           .filter(column==entity_id)
+                           .filter(ShowListing.start_time>=day_start(day),
+                                   ShowListing.start_time<day_start(day + timedelta(days=1)))
+                           .order_by(ShowListing.start_time, ShowListing.show_id))
+        entities, counts, *shows = fetch_all(*queries)
+        if entities:
+            entity = entities[0]
+            grid = month_grid(month, weeks, counts)
+            shows = shows[0] if shows else []
+            return render_template('pages/calendar.html', kind=kind, entity=entity, endpoint=endpoint, month=month,
+                                   grid=grid, today=today, selected_day=day, shows=shows,
+                                   prev_month=add_months(month, -1).strftime('%Y-%m'),
+                                   next_month=add_months(month, 1).strftime('%Y-%m'))
+        else:
+            error = 404
+    except InvalidMonth:
+        error = 400
+    except:
+        error = 500
+        print(sys.exc_info())
+    handle_error(error, model.__name__, entity_id)
+
+
+def calendar_feed(kind, entity_id):
+    """Stream the shows of a venue or artist from CALENDAR_FEED_PAST_DAYS ago as iCalendar."""
+    model, column, _ = CALENDAR_KINDS[kind]
+    name = model.query.with_entities(model.name).filter(model.id==entity_id).scalar()
+    if name is None:
+        abort(404)
+    since = datetime.now() - timedelta(days=app.config['CALENDAR_FEED_PAST_DAYS'])
+    rows = db.session.query(ShowListing.show_id, ShowListing.start_time, ShowListing.end_time, ShowListing.venue_id,
+                            ShowListing.venue_name, ShowListing.venue_city, ShowListing.venue_state,
+                            ShowListing.venue_timezone, ShowListing.artist_name) \
+        .filter(column==entity_id) \
+        .filter(ShowListing.start_time>=since) \
+        .order_by(ShowListing.start_time, ShowListing.show_id) \
+        .yield_per(STREAM_BATCH_SIZE)
+    stamp = datetime.now(timezone.utc)
+    events = (ical_event(f'show-{row.show_id}@{request.host}', stamp, row.start_time, row.end_time,
+                         f'{row.artist_name} at {row.venue_name}', row.venue_timezone,
+                         f'{row.venue_name}, {row.venue_city}, {row.venue_state}',
+                         url_for('show_venue', venue_id=row.venue_id, _external=True))
+              for row in rows)
+    response = Response(stream_with_context(ical_feed(name, events)), mimetype=ICALENDAR)
+    response.headers['Content-Disposition'] = f'inline; filename="{kind}-{entity_id}.ics"'
+    return response
+
+
+#----------------------------------------------------------------------------#
+# Show counters.
 #----------------------------------------------------------------------------#
 
+# Venue and Artist carry upcoming/past show counters and the start time of
+# their next show. A show counts as upcoming until a roll-over moves it to
+# past, so a counted show is upcoming exactly when it starts at or after
+# next_show_time.
 
-def format_datetime(value, format='medium'):
-    if isinstance(value, str):
-        date = dateutil.parser.parse(value)
+
+def show_foreign_key(model):
+    return Show.venue_id if model is Venue else Show.artist_id
+
+
+def count_show(entity, start_time, now):
+    next_show_time = entity.next_show_time
+    if start_time >= now or (next_show_time is not None and start_time >= next_show_time):
+        entity.upcoming_shows_count += 1
+        if next_show_time is None or start_time < next_show_time:
+            entity.next_show_time = start_time
+    else:
+        entity.past_shows_count += 1
+
+
+def uncount_show(entity, start_time):
+    # Call after the show's deletion has been flushed
+    next_show_time = entity.next_show_time
+    if next_show_time is not None and start_time >= next_show_time:
+        entity.upcoming_shows_count -= 1
+        if start_time == next_show_time:
+            entity.next_show_time = db.session.query(db.func.min(Show.start_time)) \
+                .filter(show_foreign_key(type(entity))==entity.id, Show.start_time>=next_show_time) \
+                .scalar()
     else:
-        date = value
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+        entity.past_shows_count -= 1
+
+
+def show_counters(model, now):
+    foreign_key = show_foreign_key(model)
+    shows = db.select([db.func.count(Show.id)]).where(foreign_key==model.id)
+    return {
+        model.upcoming_shows_count: shows.where(Show.start_time>=now).scalar_subquery(),
+        model.past_shows_count: shows.where(Show.start_time<now).scalar_subquery(),
+        model.next_show_time: db.select([db.func.min(Show.start_time)]) \
+            .where(foreign_key==model.id, Show.start_time>=now) \
+            .scalar_subquery()
+    }
+
+
+def rebuild_show_counters(model, now, ids=None):
+    query = model.query
+    if ids is not None:
+        query = query.filter(model.id.in_(ids))
+    return query.update(show_counters(model, now), synchronize_session=False)
+
+
+def roll_over_show_counters(model, now):
+    query = model.query.filter(model.next_show_time<now)
+    return query.update(show_counters(model, now), synchronize_session=False)
+
+
+def show_counter_drift(model, now):
+    # Rows whose next show has started are waiting for the roll-over: their
+    # counters are right as of next_show_time, not as of now.
+    counters = show_counters(model, db.case([(model.next_show_time<now, model.next_show_time)], else_=now))
+    stored = [model.upcoming_shows_count, model.past_shows_count, model.next_show_time]
+    actual = [counters[column].label(f'actual_{column.key}') for column in stored]
+    drifted = db.or_(*[column.is_distinct_from(counters[column]) for column in stored])
+    return db.session.query(model.id, *stored, *actual).filter(drifted).order_by(model.id).all()
+
+
+#----------------------------------------------------------------------------#
+# Show listings.
+#----------------------------------------------------------------------------#
+
+# show_listings holds a copy of each show joined to its venue and artist, so
+# /shows and the show lists of venue and artist pages are index range scans
+# without joins. Mapper events keep it in step with every ORM write; Core
+# bulk loads call sync_show_listings(), soft deletes drop the listings of
+# the deleted venue or artist at once, and `flask fyyur
+# refresh-show-listings` rebuilds it in one transaction, during which
+# readers keep seeing the previous rows.
+#
+# On Postgres, rebuilds and syncs hold SHOW_LISTINGS_LOCK exclusively and
+# the mapper events hold it shared until their transaction ends. A rebuild
+# therefore waits for in-flight writes to commit and reads their rows, and
+# writes wait for the rebuild instead of updating rows it is replacing.
+
+SHOW_LISTING_COLUMNS = ['show_id', 'start_time', 'end_time', 'venue_id', 'venue_name', 'venue_city', 'venue_state',
+                        'venue_image_link', 'venue_timezone', 'artist_id', 'artist_name', 'artist_image_link']
+# Listing columns copied from venues and artists
+VENUE_LISTING_COLUMNS = {'venue_name': 'name', 'venue_city': 'city', 'venue_state': 'state', 'venue_image_link': 'image_link',
+                         'venue_timezone': 'timezone'}
+ARTIST_LISTING_COLUMNS = {'artist_name': 'name', 'artist_image_link': 'image_link'}
+# pg_advisory_xact_lock key
+SHOW_LISTINGS_LOCK = 0x5105
+
+
+def lock_show_listings(connection, shared=True):
+    """Hold SHOW_LISTINGS_LOCK until the transaction ends (SQLite serializes writes anyway)."""
+    if connection.dialect.name == 'postgresql':
+        function = 'pg_advisory_xact_lock_shared' if shared else 'pg_advisory_xact_lock'
+        connection.execute(db.text(f'SELECT {function}(:key)'), {'key': SHOW_LISTINGS_LOCK})
+
+
+def show_listing_rows():
+    """Select the show_listings rows from shows, in SHOW_LISTING_COLUMNS order."""
+    tables = Show.__table__ \
+        .join(Venue.__table__, Show.venue_id==Venue.id) \
+        .join(Artist.__table__, Show.artist_id==Artist.id)
+    return db.select([Show.id, Show.start_time, Show.end_time, Show.venue_id, Venue.name, Venue.city, Venue.state,
+                      Venue.image_link, Venue.timezone, Show.artist_id, Artist.name, Artist.image_link]) \
+        .select_from(tables) \
+        .where(Venue.deleted_at.is_(None)) \
+        .where(Artist.deleted_at.is_(None))
+
+
+def insert_show_listings(connection, rows):
+    connection.execute(ShowListing.__table__.insert().from_select(SHOW_LISTING_COLUMNS, rows))
+
+
+def sync_show_listings():
+    """Add listings for shows that lack one and drop listings of deleted shows."""
+    listed = db.exists().where(ShowListing.show_id==Show.id)
+    connection = db.session.connection()
+    lock_show_listings(connection, shared=False)
+    insert_show_listings(connection, show_listing_rows().where(~listed))
+    shows = db.select([Show.id])
+    connection.execute(ShowListing.__table__.delete().where(ShowListing.show_id.notin_(shows)))
+
+
+def refresh_show_listings():
+    connection = db.session.connection()
+    lock_show_listings(connection, shared=False)
+    connection.execute(ShowListing.__table__.delete())
+    insert_show_listings(connection, show_listing_rows())
+
+
+def show_listing_changed(target, attributes):
+    state = db.inspect(target)
+    return [attribute for attribute in attributes if state.attrs[attribute].history.has_changes()]
+
+
+def insert_show_listing(mapper, connection, target):
+    lock_show_listings(connection)
+    insert_show_listings(connection, show_listing_rows().where(Show.id==target.id))
+
+
+def update_show_listing(mapper, connection, target):
+    if show_listing_changed(target, ['start_time', 'end_time', 'venue_id', 'artist_id']):
+        delete_show_listing(mapper, connection, target)
+        insert_show_listing(mapper, connection, target)
+
+
+def delete_show_listing(mapper, connection, target):
+    lock_show_listings(connection)
+    connection.execute(ShowListing.__table__.delete().where(ShowListing.show_id==target.id))
+
+
+def delete_show_listings(column, entity_id, other):
+    """Drop the listings of a deleted venue or artist, returning the ids in other column they listed."""
+    lock_show_listings(db.session.connection())
+    other_ids = [other_id for other_id, in db.session.query(other).filter(column==entity_id).distinct()]
+    ShowListing.query.filter(column==entity_id).delete(synchronize_session=False)
+    return other_ids
+
+
+def copy_to_show_listings(key, columns):
+    """Mapper event copying changed venue or artist columns to their listings."""
+    def copy(mapper, connection, target):
+        changed = show_listing_changed(target, columns.values())
+        values = {listing: getattr(target, attribute) for listing, attribute in columns.items() if attribute in changed}
+        if values:
+            lock_show_listings(connection)
+            connection.execute(ShowListing.__table__.update().where(ShowListing.__table__.c[key]==target.id).values(**values))
+    return copy
+
+
+event.listen(Show, 'after_insert', insert_show_listing)
+event.listen(Show, 'after_update', update_show_listing)
+event.listen(Show, 'after_delete', delete_show_listing)
+event.listen(Venue, 'after_update', copy_to_show_listings('venue_id', VENUE_LISTING_COLUMNS))
+event.listen(Artist, 'after_update', copy_to_show_listings('artist_id', ARTIST_LISTING_COLUMNS))
+
+
+#----------------------------------------------------------------------------#
+# Jobs.
+#----------------------------------------------------------------------------#
+
+# Follow-up work of write handlers, run by `flask fyyur worker`. Tasks
+# return the page cache tags to invalidate once their changes commit.
+
+job_queue = JobQueue(db, Job, app.config, after_commit=lambda tags: page_cache.invalidate(*(tags or [])))
+
+
+@job_queue.task('purge')
+def purge_job(table, id):
+    """Delete one batch of the shows of a deleted venue or artist, then itself.
+
+    Each batch is its own short transaction and re-enqueues the next, so
+    purging never holds many row locks for long.
+    """
+    model, other = (Venue, Artist) if table == 'venues' else (Artist, Venue)
+    tag, other_tag = ('venue', 'artist') if model is Venue else ('artist', 'venue')
+    rows = db.session.query(Show.id, show_foreign_key(other)) \
+        .filter(show_foreign_key(model)==id) \
+        .order_by(Show.id) \
+        .limit(app.config['PURGE_BATCH_SIZE']) \
+        .all()
+    if not rows:
+        # shows left behind by a racing insert go with the row, by ON DELETE CASCADE
+        model.query.filter(model.id==id).delete(synchronize_session=False)
+        return [f'{tag}:{id}']
+    show_ids = [show_id for show_id, _ in rows]
+    other_ids = sorted({other_id for _, other_id in rows})
+    ShowListing.query.filter(ShowListing.show_id.in_(show_ids)).delete(synchronize_session=False)
+    Show.query.filter(Show.id.in_(show_ids)).delete(synchronize_session=False)
+    rebuild_show_counters(other, datetime.now(), other_ids)
+    job_queue.enqueue('purge', table=table, id=id)
+    return ['shows', f'{tag}:{id}', f'{other_tag}-counts'] + [f'{other_tag}:{other_id}' for other_id in other_ids]
+
+
+@job_queue.task('geocode-venues')
+def geocode_venues_job(ids):
+    venues = Venue.query.filter(Venue.id.in_(ids), Venue.latitude.is_(None)).all()
+    geocode_venues(venues, gazetteer())
+    return []
+
+
+#----------------------------------------------------------------------------#
+# Conditional requests.
+#----------------------------------------------------------------------------#
+
+# Read pages carry an ETag and Last-Modified derived from the updated_at of
+# the rows they show, computed without rendering. Row counts are part of
+# the validators so deletes change the ETag too. A deleted row leaves no
+# updated_at behind, so list pages send no Last-Modified: clients that only
+# send If-Modified-Since would otherwise keep a list with the row in it.
+
+
+def table_validators(*models):
+    columns = []
+    for model in models:
+        columns.append(db.select([db.func.count(model.id)]).scalar_subquery())
+        columns.append(db.select([db.func.max(model.updated_at)]).scalar_subquery())
+    return db.session.query(*columns).one()
+
+
+def venue_validators(venue_id):
+    return db.session.query(
+        Venue.updated_at,
+        db.func.count(Show.id),
+        db.func.count(Show.id).filter(Show.start_time>=datetime.now()),
+        db.func.max(Show.updated_at),
+        db.func.max(Artist.updated_at)
+    ).outerjoin(Show, Show.venue_id==Venue.id) \
+        .outerjoin(Artist, Show.artist_id==Artist.id) \
+        .filter(Venue.id==venue_id) \
+        .group_by(Venue.id) \
+        .one_or_none()
+
+
+def artist_validators(artist_id):
+    return db.session.query(
+        Artist.updated_at,
+        db.func.count(Show.id),
+        db.func.count(Show.id).filter(Show.start_time>=datetime.now()),
+        db.func.max(Show.updated_at),
+        db.func.max(Venue.updated_at)
+    ).outerjoin(Show, Show.artist_id==Artist.id) \
+        .outerjoin(Venue, Show.venue_id==Venue.id) \
+        .filter(Artist.id==artist_id) \
+        .group_by(Artist.id) \
+        .one_or_none()
+
+
+def conditional(validators, last_modified=True):
+    """Answer GETs whose validators still match the client's with 304.
+
+    validators(**view_args) returns a tuple of values that change whenever
+    the page would, or None to serve the view unconditionally. Last-Modified
+    is the latest datetime among them unless last_modified is false.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if request.method != 'GET' or '_flashes' in session:
+                return view(**kwargs)
+            values = validators(**kwargs)
+            if values is None:
+                return view(**kwargs)
+            etag = hashlib.sha1(repr(tuple(values)).encode()).hexdigest()
+            modified = None
+            if last_modified:
+                modified = max((value for value in values if isinstance(value, datetime)), default=None)
+            if modified is not None:
+                modified = modified.replace(microsecond=0)
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = None not in (modified, request.if_modified_since) \
+                    and request.if_modified_since >= modified
+            response = Response(status=304) if not_modified else make_response(view(**kwargs))
+            response.set_etag(etag)
+            if modified is not None:
+                # Werkzeug stamps the current time when set to None
+                response.last_modified = modified
+            response.headers['Cache-Control'] = app.config['CACHE_CONTROL'].get(
+                request.endpoint, app.config['CACHE_CONTROL_DEFAULT'])
+            return response
+        return wrapper
+    return decorator
+
+
+#----------------------------------------------------------------------------#
+# Filters.
+#----------------------------------------------------------------------------#
 
 
 app.jinja_env.filters['datetime'] = format_datetime
@@ -155,6 +898,7 @@ app.jinja_env.filters['datetime'] = format_datetime
 
 
 @app.route('/')
+@read_only
 def index():
     return render_template('pages/home.html')
 
@@ -163,36 +907,76 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@read_only
+@conditional(lambda: table_validators(Venue), last_modified=False)
+@page_cache.cached('venues')
 def venues():
     error = 0
     try:
         areas = []
-        for state, city in Venue.query.with_entities(Venue.state, Venue.city).distinct().order_by(Venue.state, Venue.city).all():
-            area = {'city': city, 'state': state, 'venues': []}
-            for id, name in Venue.query.with_entities(Venue.id, Venue.name).filter(Venue.state==state, Venue.city==city).order_by(Venue.name).all():
-                num_upcoming_shows = Show.query.filter(Show.venue_id==id, Show.start_time>=datetime.now()).count()
-                venue = {'id': id, 'name': name, 'num_upcoming_shows': num_upcoming_shows}
+        cursor, limit = page_args()
+        genre, state = request.args.get('genre') or None, request.args.get('state') or None
+        query = Venue.query.with_entities(Venue.state, Venue.city, Venue.id, Venue.name, Venue.upcoming_shows_count,
+                                          Venue.updated_at)
+        query = filter_listing(query, Venue, genre, state)
+        page = keyset_page(query, [Venue.state, Venue.city, Venue.name, Venue.id], itemgetter(0, 1, 3, 2), cursor, limit)
+        for (area_state, city), area_rows in groupby(page.items, key=itemgetter(0, 1)):
+            area = {'city': city, 'state': area_state, 'venues': []}
+            for _, _, id, name, num_upcoming_shows, updated_at in area_rows:
+                venue = {'id': id, 'name': name, 'num_upcoming_shows': num_upcoming_shows, 'updated_at': updated_at}
                 area['venues'].append(venue)
             areas.append(area)
-        return render_template('pages/venues.html', areas=areas)
+        pages = page_links(page, 'venues', genre=genre, state=state)
+        return render_template('pages/venues.html', areas=areas, pages=pages, genres=GENRE_NAMES, states=State.list(),
+                               genre=genre, state=state)
+    except (InvalidCursor, UnknownGenre):
+        error = 400
+    except:
+        error = 500
+        print(sys.exc_info())
+    handle_error(error)
+
+
+@app.route('/venues/near')
+@read_only
+def venues_near():
+    error = 0
+    try:
+        _, limit = page_args()
+        area = search_area()
+        venues = None
+        if area is not None:
+            box, latitude, longitude, radius = area
+            venues = nearby_venues(box, latitude, longitude, limit, radius)
+        return render_template('pages/venues_near.html', venues=venues, lat=request.args.get('lat', ''),
+                               lng=request.args.get('lng', ''),
+                               radius=request.args.get('radius', app.config['NEARBY_RADIUS_KM']))
+    except InvalidLocation:
+        error = 400
     except:
         error = 500
         print(sys.exc_info())
     handle_error(error)
 
 
-@app.route('/venues/search', methods=['POST'])
+@app.route('/venues/search', methods=['GET', 'POST'])
+@read_only
+@conditional(lambda: table_validators(Venue), last_modified=False)
+@page_cache.cached('venues', 'venue-counts')
 def search_venues():
     error = 0
     try:
         results = {'count': 0, 'data': []}
-        search_term = request.form.get('search_term', '')
-        for id, name in Venue.query.with_entities(Venue.id, Venue.name).filter(Venue.name.ilike(f'%{search_term}%')).all():
-            num_upcoming_shows = Show.query.filter(Show.venue_id==id, Show.start_time>=datetime.now()).count()
+        search_term = request.values.get('search_term', '')
+        cursor, limit = page_args()
+        results['count'], page = search_page(Venue, search_term, cursor, limit)
+        for id, name, num_upcoming_shows, _ in page.items:
             venue = {'id': id, 'name': name, 'num_upcoming_shows': num_upcoming_shows}
             results['data'].append(venue)
-        results['count'] = len(results['data'])
-        return render_template('pages/search_venues.html', results=results, search_term=search_term)
+        pages = page_links(page, 'search_venues', search_term=search_term)
+        return render_template('pages/search_venues.html', results=results, search_term=search_term, pages=pages)
+    except InvalidCursor:
+        error = 400
     except:
         error = 500
         print(sys.exc_info())
@@ -200,41 +984,74 @@ def search_venues():
 
 
 @app.route('/venues/<int:venue_id>')
+@read_only
+@conditional(venue_validators)
+@page_cache.cached('venue:{venue_id}')
 def show_venue(venue_id):
     error = 0
     try:
-        venue = Venue.query.get(venue_id)
-        if venue is not None:
-            venue_with_shows = venue.as_dict()
+        now = datetime.now()
+        cursor, limit = page_args()
+        # from the listings, like the lists: shows with deleted venues or artists are not counted
+        counts = db.session.query(
+            db.func.count(ShowListing.show_id).filter(ShowListing.start_time>=now),
+            db.func.count(ShowListing.show_id).filter(ShowListing.start_time<now)
+        ).filter(ShowListing.venue_id==venue_id)
+        shows = db.session.query(ShowListing.artist_id, ShowListing.artist_name, ShowListing.artist_image_link,
+                                 ShowListing.start_time, ShowListing.show_id) \
+            .filter(ShowListing.venue_id==venue_id)
+        keys = [ShowListing.start_time, ShowListing.show_id]
+        past_query, past_page = keyset_pager(shows.filter(ShowListing.start_time<now), keys, itemgetter(3, 4), cursor, limit,
+                                             descending=True)
+        venues, counts, upcoming, past_rows = fetch_all(Venue.query.filter(Venue.id==venue_id), counts,
+                                                        shows.filter(ShowListing.start_time>=now).order_by(*keys), past_query)
+        if venues:
+            venue_with_shows = venues[0].as_dict()
+            venue_with_shows['upcoming_shows_count'], venue_with_shows['past_shows_count'] = counts[0]
+            past = past_page(past_rows)
             past_shows, upcoming_shows = [], []
-            for show in venue.artists:
-                show_details = {
-                    'artist_id': show.artist_id,
-                    'artist_name': show.artist.name,
-                    'artist_image_link': show.artist.image_link,
-                    'start_time': show.start_time
-                }
-                if show.start_time < datetime.now():
-                    past_shows.append(show_details)
-                else:
-                    upcoming_shows.append(show_details)
+            for rows, shows_list in ((past.items, past_shows), (upcoming, upcoming_shows)):
+                for artist_id, artist_name, artist_image_link, start_time, _ in rows:
+                    show_details = {
+                        'artist_id': artist_id,
+                        'artist_name': artist_name,
+                        'artist_image_link': artist_image_link,
+                        'start_time': start_time
+                    }
+                    shows_list.append(show_details)
             venue_with_shows['past_shows'] = past_shows
             venue_with_shows['upcoming_shows'] = upcoming_shows
-            venue_with_shows['past_shows_count'] = len(past_shows)
-            venue_with_shows['upcoming_shows_count'] = len(upcoming_shows)
-            return render_template('pages/show_venue.html', venue=venue_with_shows)
+            past_pages = page_links(past, 'show_venue', venue_id=venue_id)
+            return render_template('pages/show_venue.html', venue=venue_with_shows, past_pages=past_pages)
         else:
             error = 404
+    except InvalidCursor:
+        error = 400
     except:
         error = 500
         print(sys.exc_info())
     handle_error(error, 'Venue', venue_id)
 
 
+@app.route('/venues/<int:venue_id>/calendar')
+@read_only
+@conditional(calendar_validators(venue_validators))
+@page_cache.cached('venue:{venue_id}')
+def venue_calendar(venue_id):
+    return calendar_page('venue', venue_id)
+
+
+@app.route('/venues/<int:venue_id>/calendar.ics')
+@read_only
+def venue_calendar_feed(venue_id):
+    return calendar_feed('venue', venue_id)
+
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
 @app.route('/venues/create', methods=['GET'])
+@read_only
 def create_venue_form():
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
@@ -252,7 +1069,9 @@ def create_venue_submission():
             db.session.flush()
             db.session.refresh(venue)
             venue_id = venue.id
+            queue_geocoding(venue_id)
             db.session.commit()
+            page_cache.invalidate('venues')
             flash(f'Venue {venue_id} was successfully listed.')
             return render_template('pages/home.html')
         else:
@@ -273,8 +1092,12 @@ def delete_venue(venue_id):
     try:
         venue = Venue.query.get(venue_id)
         if venue is not None:
-            db.session.delete(venue)
+            # Hide the venue at once; a job purges it and its shows in batches
+            venue.deleted_at = datetime.utcnow()
+            artist_ids = delete_show_listings(ShowListing.venue_id, venue.id, ShowListing.artist_id)
+            job_queue.enqueue('purge', table='venues', id=venue.id)
             db.session.commit()
+            page_cache.invalidate('venues', 'shows', f'venue:{venue_id}', *[f'artist:{id}' for id in artist_ids])
             flash(f'Venue {venue_id} was successfully deleted.')
             return render_template('pages/home.html')
         else:
@@ -296,32 +1119,48 @@ def delete_venue(venue_id):
 
 
 @app.route('/artists')
+@read_only
+@conditional(lambda: table_validators(Artist), last_modified=False)
+@page_cache.cached('artists')
 def artists():
     error = 0
     try:
         artists = []
-        for name, id in Artist.query.with_entities(Artist.name, Artist.id).order_by(Artist.name).all():
-            artist = {'id': id, 'name': name}
+        cursor, limit = page_args()
+        genre = request.args.get('genre') or None
+        query = filter_listing(Artist.query.with_entities(Artist.name, Artist.id, Artist.updated_at), Artist, genre)
+        page = keyset_page(query, [Artist.name, Artist.id], itemgetter(0, 1), cursor, limit)
+        for name, id, updated_at in page.items:
+            artist = {'id': id, 'name': name, 'updated_at': updated_at}
             artists.append(artist)
-        return render_template('pages/artists.html', artists=artists)
+        pages = page_links(page, 'artists', genre=genre)
+        return render_template('pages/artists.html', artists=artists, pages=pages, genres=GENRE_NAMES, genre=genre)
+    except (InvalidCursor, UnknownGenre):
+        error = 400
     except:
         error = 500
         print(sys.exc_info())
     handle_error(error)
 
 
-@app.route('/artists/search', methods=['POST'])
+@app.route('/artists/search', methods=['GET', 'POST'])
+@read_only
+@conditional(lambda: table_validators(Artist), last_modified=False)
+@page_cache.cached('artists', 'artist-counts')
 def search_artists():
     error = 0
     try:
         results = {'count': 0, 'data': []}
-        search_term = request.form.get('search_term', '')
-        for id, name in Artist.query.with_entities(Artist.id, Artist.name).filter(Artist.name.ilike(f'%{search_term}%')).all():
-            num_upcoming_shows = Show.query.filter(Show.artist_id==id, Show.start_time>=datetime.now()).count()
+        search_term = request.values.get('search_term', '')
+        cursor, limit = page_args()
+        results['count'], page = search_page(Artist, search_term, cursor, limit)
+        for id, name, num_upcoming_shows, _ in page.items:
             artist = {'id': id, 'name': name, 'num_upcoming_shows': num_upcoming_shows}
             results['data'].append(artist)
-        results['count'] = len(results['data'])
-        return render_template('pages/search_artists.html', results=results, search_term=search_term)
+        pages = page_links(page, 'search_artists', search_term=search_term)
+        return render_template('pages/search_artists.html', results=results, search_term=search_term, pages=pages)
+    except InvalidCursor:
+        error = 400
     except:
         error = 500
         print(sys.exc_info())
@@ -329,41 +1168,75 @@ def search_artists():
 
 
 @app.route('/artists/<int:artist_id>')
+@read_only
+@conditional(artist_validators)
+@page_cache.cached('artist:{artist_id}')
 def show_artist(artist_id):
     error = 0
     try:
-        artist = Artist.query.get(artist_id)
-        if artist is not None:
-            artist_with_shows = artist.as_dict()
+        now = datetime.now()
+        cursor, limit = page_args()
+        # from the listings, like the lists: shows with deleted venues or artists are not counted
+        counts = db.session.query(
+            db.func.count(ShowListing.show_id).filter(ShowListing.start_time>=now),
+            db.func.count(ShowListing.show_id).filter(ShowListing.start_time<now)
+        ).filter(ShowListing.artist_id==artist_id)
+        shows = db.session.query(ShowListing.venue_id, ShowListing.venue_name, ShowListing.venue_image_link,
+                                 ShowListing.start_time, ShowListing.show_id, ShowListing.venue_timezone) \
+            .filter(ShowListing.artist_id==artist_id)
+        keys = [ShowListing.start_time, ShowListing.show_id]
+        past_query, past_page = keyset_pager(shows.filter(ShowListing.start_time<now), keys, itemgetter(3, 4), cursor, limit,
+                                             descending=True)
+        artists, counts, upcoming, past_rows = fetch_all(Artist.query.filter(Artist.id==artist_id), counts,
+                                                         shows.filter(ShowListing.start_time>=now).order_by(*keys), past_query)
+        if artists:
+            artist_with_shows = artists[0].as_dict()
+            artist_with_shows['upcoming_shows_count'], artist_with_shows['past_shows_count'] = counts[0]
+            past = past_page(past_rows)
             past_shows, upcoming_shows = [], []
-            for show in artist.venues:
-                show_details = {
-                    'venue_id': show.venue_id,
-                    'venue_name': show.venue.name,
-                    'venue_image_link': show.venue.image_link,
-                    'start_time': show.start_time
-                }
-                if show.start_time < datetime.now():
-                    past_shows.append(show_details)
-                else:
-                    upcoming_shows.append(show_details)
+            for rows, shows_list in ((past.items, past_shows), (upcoming, upcoming_shows)):
+                for venue_id, venue_name, venue_image_link, start_time, _, venue_timezone in rows:
+                    show_details = {
+                        'venue_id': venue_id,
+                        'venue_name': venue_name,
+                        'venue_image_link': venue_image_link,
+                        'venue_timezone': venue_timezone,
+                        'start_time': start_time
+                    }
+                    shows_list.append(show_details)
             artist_with_shows['past_shows'] = past_shows
             artist_with_shows['upcoming_shows'] = upcoming_shows
-            artist_with_shows['past_shows_count'] = len(past_shows)
-            artist_with_shows['upcoming_shows_count'] = len(upcoming_shows)
-            return render_template('pages/show_artist.html', artist=artist_with_shows)
+            past_pages = page_links(past, 'show_artist', artist_id=artist_id)
+            return render_template('pages/show_artist.html', artist=artist_with_shows, past_pages=past_pages)
         else:
             error = 404
+    except InvalidCursor:
+        error = 400
     except:
         error = 500
         print(sys.exc_info())
     handle_error(error, 'Artist', artist_id)
 
 
+@app.route('/artists/<int:artist_id>/calendar')
+@read_only
+@conditional(calendar_validators(artist_validators))
+@page_cache.cached('artist:{artist_id}')
+def artist_calendar(artist_id):
+    return calendar_page('artist', artist_id)
+
+
+@app.route('/artists/<int:artist_id>/calendar.ics')
+@read_only
+def artist_calendar_feed(artist_id):
+    return calendar_feed('artist', artist_id)
+
+
 #  Update
 #  ----------------------------------------------------------------
 
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@read_only
 def edit_artist(artist_id):
     error = 0
     try:
@@ -388,7 +1261,9 @@ def edit_artist_submission(artist_id):
             form = ArtistForm()
             if form.validate_on_submit():
                 form.populate_obj(artist)
+                venue_ids = [id for id, in db.session.query(Show.venue_id).filter(Show.artist_id==artist_id).distinct()]
                 db.session.commit()
+                page_cache.invalidate('artists', f'artist:{artist_id}', 'shows', *[f'venue:{id}' for id in venue_ids])
                 flash(f'Artist {artist_id} was successfully updated.')
                 return redirect(url_for('show_artist', artist_id=artist_id))
             else:
@@ -406,6 +1281,7 @@ def edit_artist_submission(artist_id):
 
 
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@read_only
 def edit_venue(venue_id):
     error = 0
     try:
@@ -429,8 +1305,14 @@ def edit_venue_submission(venue_id):
         if venue is not None:
             form = VenueForm()
             if form.validate_on_submit():
+                place = (venue.city, venue.state)
                 form.populate_obj(venue)
+                if (venue.city, venue.state) != place:
+                    venue.latitude = venue.longitude = None
+                    queue_geocoding(venue_id)
+                artist_ids = [id for id, in db.session.query(Show.artist_id).filter(Show.venue_id==venue_id).distinct()]
                 db.session.commit()
+                page_cache.invalidate('venues', f'venue:{venue_id}', 'shows', *[f'artist:{id}' for id in artist_ids])
                 flash(f'Venue {venue_id} was successfully updated.')
                 return redirect(url_for('show_venue', venue_id=venue_id))
             else:
@@ -451,6 +1333,7 @@ def edit_venue_submission(venue_id):
 #  ----------------------------------------------------------------
 
 @app.route('/artists/create', methods=['GET'])
+@read_only
 def create_artist_form():
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
@@ -469,6 +1352,7 @@ def create_artist_submission():
             db.session.refresh(artist)
             artist_id = artist.id
             db.session.commit()
+            page_cache.invalidate('artists')
             flash(f'Artist {artist_id} was successfully listed.')
             return render_template('pages/home.html')
         else:
@@ -489,8 +1373,12 @@ def delete_artist(artist_id):
     try:
         artist = Artist.query.get(artist_id)
         if artist is not None:
-            db.session.delete(artist)
+            # Hide the artist at once; a job purges it and its shows in batches
+            artist.deleted_at = datetime.utcnow()
+            venue_ids = delete_show_listings(ShowListing.artist_id, artist.id, ShowListing.venue_id)
+            job_queue.enqueue('purge', table='artists', id=artist.id)
             db.session.commit()
+            page_cache.invalidate('artists', 'shows', f'artist:{artist_id}', *[f'venue:{id}' for id in venue_ids])
             flash(f'Artist {artist_id} was successfully deleted.')
             return render_template('pages/home.html')
         else:
@@ -508,23 +1396,32 @@ def delete_artist(artist_id):
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@read_only
+@conditional(lambda: table_validators(Show, Venue, Artist), last_modified=False)
+@page_cache.cached('shows')
 def shows():
     error = 0
     try:
         shows = []
-        for show in Show.query.order_by(Show.start_time).all():
-            venue = show.venue
-            artist = show.artist
+        cursor, limit = page_args()
+        query = db.session.query(ShowListing.start_time, ShowListing.show_id, ShowListing.venue_id, ShowListing.venue_name,
+                                 ShowListing.venue_timezone, ShowListing.artist_id, ShowListing.artist_name,
+                                 ShowListing.artist_image_link)
+        page = keyset_page(query, [ShowListing.start_time, ShowListing.show_id], itemgetter(0, 1), cursor, limit)
+        for start_time, _, venue_id, venue_name, venue_timezone, artist_id, artist_name, artist_image_link in page.items:
             show_details = {
-                'venue_id': venue.id,
-                'venue_name': venue.name,
-                'artist_id': artist.id,
-                'artist_name': artist.name,
-                'artist_image_link': artist.image_link,
-                'start_time': show.start_time.strftime('%Y-%m-%dT%H:%M')
+                'venue_id': venue_id,
+                'venue_name': venue_name,
+                'venue_timezone': venue_timezone,
+                'artist_id': artist_id,
+                'artist_name': artist_name,
+                'artist_image_link': artist_image_link,
+                'start_time': start_time
             }
             shows.append(show_details)
-        return render_template('pages/shows.html', shows=shows)
+        return render_template('pages/shows.html', shows=shows, pages=page_links(page, 'shows'))
+    except InvalidCursor:
+        error = 400
     except:
         error = 500
         print(sys.exc_info())
@@ -569,6 +1466,7 @@ def shows():
 
 
 @app.route('/shows/create')
+@read_only
 def create_shows():
     # renders form. do not touch.
     form = ShowForm()
@@ -583,13 +1481,36 @@ def create_show_submission():
         if form.validate_on_submit():
             show = Show()
             form.populate_obj(show)
-            db.session.add(show)
-            db.session.flush()
-            db.session.refresh(show)
-            show_id = show.id
-            db.session.commit()
-            flash(f'Show {show_id} was successfully listed.')
-            return render_template('pages/home.html')
+            show.end_time = show.end_time or show.start_time + DEFAULT_DURATION
+            # Locking the venue and artist serializes their bookings
+            entities = [(model, id, model.query.filter(model.id==id).with_for_update().one_or_none())
+                        for model, id in ((Venue, show.venue_id), (Artist, show.artist_id))]
+            missing = [(model, id) for model, id, entity in entities if entity is None]
+            conflicts = [] if missing else booking_conflicts(show.venue_id, show.artist_id, show.start_time,
+                                                             show.end_time)
+            for model, id in missing:
+                flash(f'{model.__name__} {id} not found.')
+            for conflict in conflicts:
+                booked = 'Venue' if conflict.venue_id == show.venue_id else 'Artist'
+                flash(f'{booked} is already booked from {format_datetime(conflict.start_time)} to '
+                      f'{format_datetime(conflict.end_time)} (show {conflict.id}).')
+            if missing:
+                error = 400
+            elif conflicts:
+                error = 409
+            else:
+                now = datetime.now()
+                for _, _, entity in entities:
+                    count_show(entity, show.start_time, now)
+                db.session.add(show)
+                db.session.flush()
+                db.session.refresh(show)
+                show_id = show.id
+                pages = ['shows', 'venue-counts', 'artist-counts', f'venue:{show.venue_id}', f'artist:{show.artist_id}']
+                db.session.commit()
+                page_cache.invalidate(*pages)
+                flash(f'Show {show_id} was successfully listed.')
+                return render_template('pages/home.html')
         else:
             error = 400
             print(form.errors)
@@ -608,8 +1529,18 @@ def delete_show(show_id):
     try:
         show = Show.query.get(show_id)
         if show is not None:
+            # the venue or artist may be deleted and waiting to be purged
+            venue = Venue.query.filter(Venue.id==show.venue_id).execution_options(include_deleted=True) \
+                .with_for_update().one()
+            artist = Artist.query.filter(Artist.id==show.artist_id).execution_options(include_deleted=True) \
+                .with_for_update().one()
             db.session.delete(show)
+            db.session.flush()
+            uncount_show(venue, show.start_time)
+            uncount_show(artist, show.start_time)
+            pages = ['shows', 'venue-counts', 'artist-counts', f'venue:{show.venue_id}', f'artist:{show.artist_id}']
             db.session.commit()
+            page_cache.invalidate(*pages)
             flash(f'Show {show_id} was successfully deleted.')
             return render_template('pages/home.html')
         else:
@@ -628,6 +1559,11 @@ def server_error(error):
     return render_template('errors/400.html'), 400
 
 
+@app.errorhandler(409)
+def conflict_error(error):
+    return render_template('errors/409.html'), 409
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -645,11 +1581,569 @@ def handle_error(error, _type = '', _id = 0):
     elif error == 404:
         flash(f'{_type} {_id} not found.')
         abort(404)
+    elif error == 409:
+        abort(409)
     elif error == 500:
         flash('Sorry, something went wrong. Please try again.')
         abort (500)
 
 
+def page_args():
+    limit = request.args.get('limit', app.config['PAGE_SIZE'], type=int)
+    return request.args.get('cursor'), min(max(limit, 1), app.config['MAX_PAGE_SIZE'])
+
+
+def page_links(page, endpoint, **values):
+    values['limit'] = request.args.get('limit', type=int)
+    return {
+        'prev': url_for(endpoint, cursor=page.prev_cursor, **values) if page.prev_cursor else None,
+        'next': url_for(endpoint, cursor=page.next_cursor, **values) if page.next_cursor else None
+    }
+
+
+#----------------------------------------------------------------------------#
+# API.
+#----------------------------------------------------------------------------#
+
+# Lists are served as a keyset-paginated JSON document or, when the client
+# prefers application/x-ndjson, streamed one JSON object per line from a
+# server-side cursor so memory stays flat however many rows there are.
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+JSON = 'application/json'
+NDJSON = 'application/x-ndjson'
+STREAM_BATCH_SIZE = 1000
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def json_response(payload, status=200):
+    return Response(json.dumps(payload, default=json_default), status=status, mimetype=JSON)
+
+
+def negotiate(*mimetypes):
+    if not request.accept_mimetypes:
+        return mimetypes[0]
+    mimetype = request.accept_mimetypes.best_match(mimetypes)
+    if mimetype is None:
+        abort(406)
+    return mimetype
+
+
+def list_response(query, keys, row_key, preferred=JSON):
+    """Serve query as a JSON page or an NDJSON stream of as_dict() rows."""
+    mimetype = negotiate(preferred, NDJSON if preferred == JSON else JSON)
+    if mimetype == NDJSON:
+        rows = query.order_by(*keys).yield_per(STREAM_BATCH_SIZE)
+        lines = (json.dumps(row.as_dict(), default=json_default) + '\n' for row in rows)
+        return Response(stream_with_context(lines), mimetype=NDJSON)
+    cursor, limit = page_args()
+    page = keyset_page(query, keys, row_key, cursor, limit)
+    return json_response({
+        'data': [row.as_dict() for row in page.items],
+        'prev_cursor': page.prev_cursor,
+        'next_cursor': page.next_cursor
+    })
+
+
+def search_response(model):
+    cursor, limit = page_args()
+    count, page = search_page(model, request.args.get('search_term', ''), cursor, limit)
+    return json_response({
+        'count': count,
+        'data': [{'id': id, 'name': name, 'num_upcoming_shows': num_upcoming_shows} for id, name, num_upcoming_shows, _ in page.items],
+        'prev_cursor': page.prev_cursor,
+        'next_cursor': page.next_cursor
+    })
+
+
+def entity_response(model, id):
+    entity = model.query.get(id)
+    if entity is None:
+        abort(404)
+    negotiate(JSON)
+    entity_with_counts = entity.as_dict()
+    entity_with_counts['upcoming_shows_count'] = entity.upcoming_shows_count
+    entity_with_counts['past_shows_count'] = entity.past_shows_count
+    return json_response(entity_with_counts)
+
+
+@api.route('/venues')
+@read_only
+def api_venues():
+    query = filter_listing(Venue.query, Venue, request.args.get('genre') or None, request.args.get('state') or None)
+    return list_response(query, [Venue.state, Venue.city, Venue.name, Venue.id],
+                         lambda venue: (venue.state, venue.city, venue.name, venue.id))
+
+
+@api.route('/venues/near')
+@read_only
+def api_venues_near():
+    negotiate(JSON)
+    _, limit = page_args()
+    area = search_area()
+    if area is None:
+        raise InvalidLocation('lat and lng, or bbox, are required')
+    venues = nearby_venues(*area[:3], limit, area[3])
+    return json_response({'data': [venue._asdict() for venue in venues]})
+
+
+@api.route('/venues/<int:venue_id>/availability')
+@read_only
+def api_venue_availability(venue_id):
+    """The shows and free intervals of a venue between start and end.
+
+    Free intervals shorter than duration (minutes), if given, are left out.
+    """
+    negotiate(JSON)
+    try:
+        start = datetime.fromisoformat(request.args['start'])
+        end = datetime.fromisoformat(request.args['end'])
+    except (KeyError, ValueError):
+        raise InvalidWindow('start and end must be ISO 8601 date-times') from None
+    duration = request.args.get('duration', type=int)
+    if not start < end <= start + timedelta(days=app.config['AVAILABILITY_MAX_DAYS']):
+        raise InvalidWindow(f'end must be after start, by at most {app.config["AVAILABILITY_MAX_DAYS"]} days')
+    if Venue.query.with_entities(Venue.id).filter(Venue.id==venue_id).first() is None:
+        abort(404)
+    shows = overlapping_shows(Show.venue_id==venue_id, start, end) \
+        .with_entities(Show.id, Show.artist_id, Show.start_time, Show.end_time).all()
+    free = free_intervals(start, end, [(show.start_time, show.end_time) for show in shows],
+                          timedelta(minutes=duration) if duration else None)
+    return json_response({
+        'venue_id': venue_id,
+        'start': start,
+        'end': end,
+        'booked': [{'show_id': show.id, 'artist_id': show.artist_id, 'start_time': show.start_time,
+                    'end_time': show.end_time} for show in shows],
+        'free': [{'start_time': free_start, 'end_time': free_end} for free_start, free_end in free]
+    })
+
+
+@api.route('/venues/search')
+@read_only
+def api_search_venues():
+    return search_response(Venue)
+
+
+@api.route('/venues/<int:venue_id>')
+@read_only
+def api_venue(venue_id):
+    return entity_response(Venue, venue_id)
+
+
+@api.route('/artists')
+@read_only
+def api_artists():
+    query = filter_listing(Artist.query, Artist, request.args.get('genre') or None)
+    return list_response(query, [Artist.name, Artist.id], lambda artist: (artist.name, artist.id))
+
+
+@api.route('/artists/search')
+@read_only
+def api_search_artists():
+    return search_response(Artist)
+
+
+@api.route('/artists/<int:artist_id>')
+@read_only
+def api_artist(artist_id):
+    return entity_response(Artist, artist_id)
+
+
+@api.route('/shows')
+@read_only
+def api_shows():
+    # not the shows of deleted venues and artists waiting to be purged
+    query = Show.query \
+        .join(Venue, Show.venue_id==Venue.id) \
+        .join(Artist, Show.artist_id==Artist.id) \
+        .filter(Venue.deleted_at.is_(None), Artist.deleted_at.is_(None))
+    for column in (Show.venue_id, Show.artist_id):
+        value = request.args.get(column.key, type=int)
+        if value is not None:
+            query = query.filter(column==value)
+    return list_response(query, [Show.start_time, Show.id], lambda show: (show.start_time, show.id), preferred=NDJSON)
+
+
+@api.errorhandler(InvalidCursor)
+def api_invalid_cursor(error):
+    return json_response({'error': 'Invalid cursor.'}, 400)
+
+
+@api.errorhandler(UnknownGenre)
+def api_unknown_genre(error):
+    return json_response({'error': 'Unknown genre.'}, 400)
+
+
+@api.errorhandler(InvalidWindow)
+def api_invalid_window(error):
+    return json_response({'error': f'Invalid window: {error}.'}, 400)
+
+
+@api.errorhandler(InvalidLocation)
+def api_invalid_location(error):
+    return json_response({'error': f'Invalid location: {error}.'}, 400)
+
+
+@api.errorhandler(404)
+def api_not_found(error):
+    return json_response({'error': 'Not found.'}, 404)
+
+
+@api.errorhandler(406)
+def api_not_acceptable(error):
+    return json_response({'error': f'Acceptable types are {JSON} and {NDJSON}.'}, 406)
+
+
+app.register_blueprint(api)
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+fyyur_cli = AppGroup('fyyur', help='Fyyur maintenance commands.')
+
+
+@fyyur_cli.command('roll-over-shows')
+def roll_over_shows():
+    """Move started shows from upcoming to past counters. Run periodically."""
+    now = datetime.now()
+    for model in (Venue, Artist):
+        rolled = roll_over_show_counters(model, now)
+        click.echo(f'{model.__tablename__}: {rolled} rolled over')
+    db.session.commit()
+    page_cache.invalidate('venue-counts', 'artist-counts')
+
+
+@fyyur_cli.command('verify-show-counters')
+@click.option('--dry-run', is_flag=True, help='Report drift without rebuilding.')
+def verify_show_counters(dry_run):
+    """Report show counter drift and rebuild counters from scratch."""
+    now = datetime.now()
+    drift = 0
+    for model in (Venue, Artist):
+        for id, upcoming, past, next_show, actual_upcoming, actual_past, actual_next_show in show_counter_drift(model, now):
+            drift += 1
+            click.echo(f'{model.__tablename__} {id}: upcoming {upcoming} -> {actual_upcoming}, '
+                       f'past {past} -> {actual_past}, next show {next_show} -> {actual_next_show}')
+        if not dry_run:
+            rebuild_show_counters(model, now)
+    db.session.commit()
+    page_cache.invalidate('venue-counts', 'artist-counts')
+    click.echo(f'{drift} drifted rows' + ('' if dry_run else ' rebuilt'))
+
+
+@fyyur_cli.command('worker')
+@click.option('--once', is_flag=True, help='Exit once no job is due.')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds to wait while idle.')
+def worker(once, poll_interval):
+    """Run queued background jobs until stopped (SIGTERM or Ctrl-C)."""
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+
+    def report(name, error):
+        click.echo(f'{name}: ' + (f'failed: {error}' if error else 'done'), err=error is not None)
+
+    try:
+        ran = job_queue.work(poll_interval, once, lambda: stopping, report)
+    except KeyboardInterrupt:
+        return
+    click.echo(f'{ran} jobs run')
+
+
+@fyyur_cli.command('refresh-show-listings')
+def refresh_show_listings_command():
+    """Rebuild the show_listings read model from shows, venues and artists."""
+    refresh_show_listings()
+    db.session.commit()
+    page_cache.invalidate('shows', 'venue-counts', 'artist-counts')
+    click.echo(f'{ShowListing.query.count()} show listings')
+
+
+@fyyur_cli.command('geocode-venues')
+@click.argument('source', required=False, type=click.Path(exists=True, dir_okay=False))
+@click.option('--all', 'all_venues', is_flag=True, help='Also venues that already have coordinates.')
+@click.option('--batch-size', default=1000, show_default=True)
+def geocode_venues_command(source, all_venues, batch_size):
+    """Set venue coordinates from a gazetteer file (default GAZETTEER_PATH)."""
+    source = source or app.config['GAZETTEER_PATH']
+    if not source:
+        click.echo('Pass a gazetteer file or set GAZETTEER_PATH.', err=True)
+        sys.exit(1)
+    places = load_gazetteer(source)
+    query = Venue.query.with_entities(Venue.id)
+    if not all_venues:
+        query = query.filter(Venue.latitude.is_(None))
+    ids = [id for id, in query.order_by(Venue.id)]
+    missing = []
+    for batch in batches(ids, batch_size):
+        venues = Venue.query.filter(Venue.id.in_(batch)).all()
+        missing += [(venue.id, venue.city, venue.state) for venue in geocode_venues(venues, places)]
+        db.session.commit()
+    for id, city, state in missing[:20]:
+        click.echo(f'venue {id}: {city}, {state} is not in the gazetteer', err=True)
+    click.echo(f'{len(ids) - len(missing)} venues geocoded, {len(missing)} not found')
+
+
+# Import/export columns per kind; 'id' is optional on import
+BULK_KINDS = {
+    'venues': (Venue, VenueImportFields, ['id', 'name', 'city', 'state', 'address', 'phone', 'image_link', 'genres',
+                                          'facebook_link', 'website', 'seeking_talent', 'seeking_description',
+                                          'timezone', 'latitude', 'longitude']),
+    'artists': (Artist, ArtistFields, ['id', 'name', 'city', 'state', 'phone', 'image_link', 'genres',
+                                       'facebook_link', 'website', 'seeking_venue', 'seeking_description']),
+    'shows': (Show, ShowImportFields, ['id', 'artist_id', 'venue_id', 'start_time', 'end_time'])
+}
+
+
+def missing_show_references(rows):
+    """Return the errors for show rows naming venues or artists that don't exist."""
+    errors = {}
+    for model, column in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+        ids = {values[column] for _, values in rows}
+        found = {id for id, in model.query.with_entities(model.id).filter(model.id.in_(ids))}
+        for line, values in rows:
+            if values[column] not in found:
+                errors.setdefault(line, []).append(f'{column}: {model.__name__} {values[column]} not found')
+    return errors
+
+
+def reset_id_sequence(model):
+    """Move the id sequence of model past rows inserted with explicit ids."""
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text(f"SELECT setval(pg_get_serial_sequence('{model.__tablename__}', 'id'), "
+                                   f"coalesce(max(id), 0) + 1, false) FROM {model.__tablename__}"))
+
+
+def load_batch(kind, rows):
+    model = BULK_KINDS[kind][0]
+    if kind == 'venues':
+        # Core inserts skip set_geohash
+        for _, values in rows:
+            values['geohash'] = geohash_of(values.get('latitude'), values.get('longitude'))
+    db.session.execute(model.__table__.insert(), [values for _, values in rows])
+    pages = [kind]
+    if kind == 'shows':
+        now = datetime.now()
+        venue_ids = {values['venue_id'] for _, values in rows}
+        artist_ids = {values['artist_id'] for _, values in rows}
+        rebuild_show_counters(Venue, now, venue_ids)
+        rebuild_show_counters(Artist, now, artist_ids)
+        pages += ['venue-counts', 'artist-counts']
+        pages += [f'venue:{id}' for id in venue_ids] + [f'artist:{id}' for id in artist_ids]
+    db.session.commit()
+    page_cache.invalidate(*pages)
+
+
+@fyyur_cli.command('import')
+@click.argument('kind', type=click.Choice(list(BULK_KINDS)))
+@click.argument('source', type=click.File('r'))
+@click.option('--format', 'format_', type=click.Choice(FORMATS), help='Defaults to the file extension, else csv.')
+@click.option('--batch-size', default=1000, show_default=True)
+def import_rows(kind, source, format_, batch_size):
+    """Validate and load venues, artists or shows from a CSV or NDJSON file."""
+    model, fields_class, columns = BULK_KINDS[kind]
+    format_ = detect_format(source.name, format_)
+    loaded = failed = 0
+    explicit_ids = False
+
+    def report(line, errors):
+        for error in errors:
+            click.echo(f'line {line}: {error}', err=True)
+
+    def valid_rows():
+        nonlocal failed
+        for line, row in read_rows(source, format_):
+            values, errors = validate(fields_class, columns, row)
+            if errors:
+                failed += 1
+                report(line, errors)
+            else:
+                yield line, values
+
+    for batch in batches(valid_rows(), batch_size):
+        if kind == 'shows':
+            for _, values in batch:
+                values['end_time'] = values.get('end_time') or values['start_time'] + DEFAULT_DURATION
+            for check in (missing_show_references, conflicting_show_rows):
+                errors = check(batch) if batch else {}
+                for line, line_errors in errors.items():
+                    failed += 1
+                    report(line, line_errors)
+                batch = [(line, values) for line, values in batch if line not in errors]
+        if not batch:
+            continue
+        explicit_ids = explicit_ids or any('id' in values for _, values in batch)
+        try:
+            load_batch(kind, batch)
+            loaded += len(batch)
+        except Exception as error:
+            db.session.rollback()
+            failed += len(batch)
+            report(f'{batch[0][0]}-{batch[-1][0]}', [f'batch failed: {error}'])
+    if explicit_ids:
+        reset_id_sequence(model)
+        db.session.commit()
+    if kind == 'shows' and loaded:
+        sync_show_listings()
+        db.session.commit()
+    click.echo(f'{loaded} {kind} imported, {failed} rows rejected')
+
+
+@fyyur_cli.command('export')
+@click.argument('kind', type=click.Choice(list(BULK_KINDS)))
+@click.argument('target', type=click.File('w'))
+@click.option('--format', 'format_', type=click.Choice(FORMATS), help='Defaults to the file extension, else csv.')
+@click.option('--batch-size', default=1000, show_default=True)
+def export_rows(kind, target, format_, batch_size):
+    """Stream venues, artists or shows to a CSV or NDJSON file."""
+    model, _, columns = BULK_KINDS[kind]
+    rows = db.session.query(*[model.__table__.c[column] for column in columns]) \
+        .order_by(model.id) \
+        .yield_per(batch_size)
+    count = write_rows(target, detect_format(target.name, format_), columns, rows)
+    click.echo(f'{count} {kind} exported', err=True)
+
+
+@fyyur_cli.command('check-pool')
+@click.option('--workers', default=1, show_default=True, help='Serving processes sharing the database.')
+def check_pool(workers):
+    """Check that the connection pools of workers processes fit the database."""
+    try:
+        needed, available = check_pool_budget(db.engine, workers, app.config['SQLALCHEMY_ENGINE_OPTIONS'],
+                                              app.config['DB_RESERVED_CONNECTIONS'])
+    except PoolBudgetExceeded as error:
+        click.echo(error, err=True)
+        sys.exit(1)
+    click.echo(f'{needed} of {available} connections')
+
+
+@fyyur_cli.command('compile-templates')
+def compile_templates_command():
+    """Compile every template into the bytecode cache, so workers start warm."""
+    if app.jinja_env.bytecode_cache is None:
+        click.echo('TEMPLATE_BYTECODE_CACHE is off', err=True)
+        sys.exit(1)
+    click.echo(f'{len(compile_templates(app))} templates compiled')
+
+
+@fyyur_cli.command('check-replicas')
+def check_replicas():
+    """Report the health and lag of each read replica."""
+    replicas.check(force=True)
+    for replica in replicas.replicas:
+        state = f'lag {replica.lag:.1f}s' if replica.healthy else 'unreachable'
+        click.echo(f'{replica.engine.url!r}: {state}')
+    click.echo(f'{len(replicas.available())} of {len(replicas.replicas)} replicas in rotation')
+    if replicas.replicas and not replicas.available():
+        sys.exit(1)
+
+
+class LazyGroup(click.Group):
+    """A command group imported when first run, so serving never imports it."""
+
+    def __init__(self, name, import_name, **kwargs):
+        super().__init__(name, **kwargs)
+        self.import_name = import_name
+
+    def group(self):
+        return import_string(self.import_name)
+
+    def list_commands(self, ctx):
+        return self.group().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self.group().get_command(ctx, name)
+
+
+app.cli.add_command(fyyur_cli)
+app.cli.add_command(LazyGroup('bench', 'benchmarks.cli:bench_cli', help='Benchmark data, timings and load tests.'))
+
+
+@app.cli.command('db-advise')
+@click.option('--planner-default', is_flag=True, help='Allow seq scans the planner prefers on small tables.')
+def db_advise(planner_default):
+    """EXPLAIN the queries of each read route and flag sequential scans."""
+    urls = ['/venues', '/artists', '/shows', '/venues/search?search_term=a', '/artists/search?search_term=a',
+            '/venues/near?lat=37.77&lng=-122.42']
+    venue_id = db.session.query(db.func.min(Venue.id)).scalar()
+    artist_id = db.session.query(db.func.min(Artist.id)).scalar()
+    if venue_id is not None:
+        urls += [f'/venues/{venue_id}', f'/venues/{venue_id}/calendar', f'/venues/{venue_id}/calendar.ics']
+    if artist_id is not None:
+        urls += [f'/artists/{artist_id}', f'/artists/{artist_id}/calendar', f'/artists/{artist_id}/calendar.ics']
+    client = app.test_client()
+    flagged = 0
+    for url in urls:
+        with captured_statements(db.engine) as statements:
+            client.get(url)
+        for statement, relations in advise(db.engine, statements, force_index=not planner_default):
+            flagged += 1
+            click.echo(f'{url}: seq scan on {", ".join(relations)}')
+            click.echo(f'    {" ".join(statement.split())}')
+    click.echo(f'{flagged} queries with sequential scans')
+    sys.exit(1 if flagged else 0)
+
+
+# Most statements each read route may run, page cache disabled
+QUERY_BUDGETS = {
+    '/venues': 2,
+    '/venues/search?search_term=a': 3,
+    '/venues/near?lat=37.77&lng=-122.42': 1,
+    '/venues/{venue_id}': 5,
+    '/venues/{venue_id}/calendar?month=2030-01&day=2030-01-01': 4,
+    '/venues/{venue_id}/calendar.ics': 2,
+    '/artists': 2,
+    '/artists/search?search_term=a': 3,
+    '/artists/{artist_id}': 5,
+    '/artists/{artist_id}/calendar?month=2030-01&day=2030-01-01': 4,
+    '/artists/{artist_id}/calendar.ics': 2,
+    '/shows': 2,
+    '/api/v1/venues': 1,
+    '/api/v1/venues/search?search_term=a': 2,
+    '/api/v1/venues/near?lat=37.77&lng=-122.42': 1,
+    '/api/v1/venues/{venue_id}': 1,
+    '/api/v1/venues/{venue_id}/availability?start=2030-01-01T00:00&end=2030-02-01T00:00': 2,
+    '/api/v1/artists': 1,
+    '/api/v1/artists/search?search_term=a': 2,
+    '/api/v1/artists/{artist_id}': 1,
+    '/api/v1/shows': 1,
+}
+
+
+@app.cli.command('check-query-budgets')
+def check_query_budgets():
+    """Request each read route and check its query budget and for N+1 queries."""
+    ids = {
+        'venue_id': db.session.query(db.func.min(Venue.id)).scalar(),
+        'artist_id': db.session.query(db.func.min(Artist.id)).scalar()
+    }
+    client = app.test_client()
+    backend, page_cache.backend = page_cache.backend, None
+    failed = 0
+    try:
+        for url, budget in QUERY_BUDGETS.items():
+            url = url.format(**ids)
+            try:
+                with query_budget(budget, app.config['QUERY_REPEAT_THRESHOLD'], app.root_path) as log:
+                    status = client.get(url).status_code
+            except QueryBudgetExceeded as error:
+                failed += 1
+                click.echo(f'{url}: {error}')
+            else:
+                click.echo(f'{url}: {status}, {log.count} of {budget} queries')
+    finally:
+        page_cache.backend = backend
+    sys.exit(1 if failed else 0)
+
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
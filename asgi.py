@@ -0,0 +1,137 @@
+"""ASGI entry point: the app on an asyncio event loop.
+
+    $ FYYUR_CONFIG=production uvicorn --workers 4 asgi:application
+
+Each request runs the Flask app in its own greenlet, with the database on
+asyncpg (or aiosqlite): while a request waits on the database, the worker
+serves others (asyncdb.py). A process runs at most DB_POOL_SIZE +
+DB_MAX_OVERFLOW requests at once, one pooled connection each; later ones
+wait for a turn without holding a thread or a connection. Pages fan their
+queries out over spare connections only, so nothing waits on the pool.
+Bodies are streamed from the same greenlet, so streamed responses keep
+their request context.
+
+Run `flask fyyur check-pool --workers N` first, as for any server other
+than gunicorn.
+"""
+
+import io
+import os
+import sys
+
+os.environ.setdefault('FYYUR_CONFIG', 'production')
+os.environ['FYYUR_SERVING'] = '1'
+os.environ['FYYUR_ASYNC_IO'] = '1'
+
+from sqlalchemy.util import await_only, greenlet_spawn
+
+from app import app, db
+from asyncdb import limit_connections
+
+
+engine_options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+connections = limit_connections(engine_options.get('pool_size', 5) + engine_options.get('max_overflow', 10))
+
+
+def wsgi_environ(scope, body):
+    """The WSGI environ of an ASGI HTTP request."""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope["http_version"]}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+        value = value.decode('latin-1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return bytes(body)
+
+
+def respond(environ, send):
+    """Run the app on environ and send its response (in the request's greenlet)."""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+    def send_start():
+        await_only(send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']}))
+
+    body = app(environ, start_response)
+    sent_start = False
+    try:
+        for chunk in body:
+            if chunk:
+                if not sent_start:
+                    send_start()
+                    sent_start = True
+                await_only(send({'type': 'http.response.body', 'body': chunk, 'more_body': True}))
+    finally:
+        close = getattr(body, 'close', None)
+        if close is not None:
+            close()
+    if not sent_start:
+        send_start()
+    await_only(send({'type': 'http.response.body', 'body': b''}))
+
+
+def dispose_engines():
+    db.get_engine(app).dispose()
+    for replica in app.extensions['replicas'].replicas:
+        replica.engine.dispose()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await greenlet_spawn(dispose_engines)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def reject_websocket(receive, send):
+    # No websocket endpoints: closing before accepting answers the handshake with 403
+    message = await receive()
+    if message['type'] == 'websocket.connect':
+        await send({'type': 'websocket.close'})
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'websocket':
+        return await reject_websocket(receive, send)
+    if scope['type'] != 'http':
+        # other protocols a server may add are not served
+        return
+    body = await read_body(receive)
+    async with connections:
+        await greenlet_spawn(respond, wsgi_environ(scope, body), send)
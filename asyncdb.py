@@ -0,0 +1,152 @@
+"""Database access on an asyncio event loop.
+
+Under asgi.py every request runs in its own greenlet on the event loop,
+and the database URLs use asyncio drivers (asyncpg, or aiosqlite for
+SQLite). Views keep their ordinary ORM code: SQLAlchemy suspends the
+request's greenlet while it waits on the database, so a worker process
+serves as many requests at once as it has connections, not threads.
+Flask and Flask-SQLAlchemy keep their contexts and sessions per greenlet.
+
+fan_out() runs the independent queries of a page at once, each in its own
+AsyncSession on its own connection, instead of one after the other. Each
+query is its own transaction, so the results are not one consistent
+snapshot: a write committing meanwhile can show in some and not others
+(e.g. a show count and the list of shows). Use it only for results a page
+can show slightly out of step. Out of the event loop (WSGI servers, the CLI,
+tests) it runs them in turn on the current session.
+
+asgi.py hands out the pool's connections through a ConnectionBudget: a
+request takes one to run at all, and a fan-out runs at once only when it
+can take one more for each query without waiting, else in turn on the
+request's session. A process thus never needs more connections than its
+pool holds, and never waits on the pool.
+"""
+
+import asyncio
+import shlex
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.util import await_only
+
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+
+def async_url(url):
+    """url with the asyncio driver of its database."""
+    scheme, rest = url.split('://', 1)
+    dialect = scheme.split('+')[0]
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError(f'no asyncio driver for {scheme} databases')
+    return f'{ASYNC_DRIVERS[dialect]}://{rest}'
+
+
+def async_engine_options(url, options):
+    """Engine options for an asyncio url.
+
+    libpq's ``-c name=value`` connection options become asyncpg server
+    settings.
+    """
+    options = dict(options)
+    connect_args = dict(options.get('connect_args', {}))
+    if url.startswith('postgresql') and 'options' in connect_args:
+        words = shlex.split(connect_args.pop('options'))
+        connect_args['server_settings'] = dict(
+            setting.split('=', 1) for flag, setting in zip(words[::2], words[1::2]) if flag == '-c')
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+def use_asyncio(config):
+    """Switch the database settings of an app config to asyncio drivers."""
+    url = config['SQLALCHEMY_DATABASE_URI'] = async_url(config['SQLALCHEMY_DATABASE_URI'])
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = async_engine_options(url, config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    config['SQLALCHEMY_REPLICA_URIS'] = [async_url(uri) for uri in config.get('SQLALCHEMY_REPLICA_URIS', [])]
+
+
+class ConnectionBudget:
+    """The pooled connections of a process, shared by the requests and
+    fan-outs of its event loop (one thread, so counting needs no locks)."""
+
+    def __init__(self, size):
+        self.free = size
+        self.waiting = 0
+        self.changed = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.changed:
+            self.waiting += 1
+            try:
+                await self.changed.wait_for(lambda: self.free > 0)
+            finally:
+                self.waiting -= 1
+            self.free -= 1
+
+    async def __aexit__(self, *exc_info):
+        await self.release(1)
+
+    def take(self, count):
+        """Take count connections if they are free and no request waits for one."""
+        if self.waiting or self.free < count:
+            return False
+        self.free -= count
+        return True
+
+    async def release(self, count):
+        async with self.changed:
+            self.free += count
+            self.changed.notify(count)
+
+
+# Set by asgi.py; None leaves fan-outs unlimited
+budget = None
+
+
+def limit_connections(size):
+    global budget
+    budget = ConnectionBudget(size)
+    return budget
+
+
+async_engines = {}
+
+
+def async_engine(engine):
+    engine_proxy = async_engines.get(engine)
+    if engine_proxy is None:
+        engine_proxy = async_engines[engine] = AsyncEngine(engine)
+    return engine_proxy
+
+
+def on_event_loop(engine):
+    return engine.dialect.is_async
+
+
+async def fetch(engine, query, session_events):
+    session = AsyncSession(bind=async_engine(engine))
+    for identifier, listener in session_events:
+        event.listen(session.sync_session, identifier, listener)
+    try:
+        return await session.run_sync(lambda sync_session: query.with_session(sync_session).all())
+    finally:
+        await session.close()
+
+
+def fan_out(session, *queries, session_events=()):
+    """The results (lists, as Query.all()) of queries, run at once when the
+    connection budget allows, each in its own transaction.
+
+    session is the request's session, whose bind the queries use; its
+    session_events, (identifier, listener) pairs, are listened to on the
+    sessions they run in.
+    """
+    engine = session.get_bind()
+    if len(queries) < 2 or not on_event_loop(engine) or (budget is not None and not budget.take(len(queries))):
+        return [query.all() for query in queries]
+    try:
+        return await_only(asyncio.gather(*[fetch(engine, query, session_events) for query in queries]))
+    finally:
+        if budget is not None:
+            await_only(budget.release(len(queries)))
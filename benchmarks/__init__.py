@@ -0,0 +1,9 @@
+"""Benchmarks: synthetic data, per-controller timings and a load scenario.
+
+    $ flask bench generate --scale 10k --reset
+    $ flask bench run --output results.json
+    $ flask bench compare baseline.json results.json
+    $ flask bench load http://localhost:8000 --users 20 --duration 60
+
+Results from ``run`` and ``load`` share the JSON format in ``results``.
+"""
@@ -0,0 +1,81 @@
+"""Cost of checking a booking as show history grows.
+
+One venue and one artist get ``size`` past shows, back to back, then the
+conflict check of show creation (``booking_conflicts``) and the insert
+(which Postgres checks against its exclusion constraints) are timed for
+bookings around the end of that history, about half of them conflicting.
+Each size adds shows to the previous one; everything is rolled back at the
+end, so any database will do.
+"""
+
+from datetime import datetime, timedelta
+import random
+import time
+
+from sqlalchemy.exc import IntegrityError
+
+from benchmarks.results import summarize
+from bulk import batches
+
+
+SIZES = (1000, 10000, 100000)
+ANCHOR = datetime(2030, 1, 1, 20, 0)
+SPACING = timedelta(hours=3)
+
+
+def history(venue_id, artist_id, start, stop):
+    for number in range(start, stop):
+        start_time = ANCHOR - (number + 1) * SPACING
+        yield {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start_time,
+               'end_time': start_time + timedelta(hours=2)}
+
+
+def timed(function):
+    started = time.perf_counter()
+    function()
+    return time.perf_counter() - started
+
+
+def try_insert(db, Show, values):
+    # in a savepoint rolled back at once; rejected by the exclusion
+    # constraints when it conflicts, which is timed too
+    savepoint = db.session.begin_nested()
+    try:
+        db.session.execute(Show.__table__.insert(), values)
+    except IntegrityError:
+        pass
+    savepoint.rollback()
+
+
+def run(fyyur, sizes=SIZES, checks=200, seed=0):
+    """Time checks and inserts at each history size, returning {case: summary}."""
+    db, Show = fyyur.db, fyyur.Show
+    rng = random.Random(seed)
+    venue = fyyur.Venue(name='Bench Venue', city='Springfield', state='CA', address='1 Main Street',
+                        phone='555-555-5555', genres=['Jazz'], image_link='https://images.example.com/bench.jpg')
+    artist = fyyur.Artist(name='Bench Artist', city='Springfield', state='CA', phone='555-555-5555',
+                          genres=['Jazz'], image_link='https://images.example.com/bench.jpg')
+    results = {}
+    try:
+        db.session.add_all([venue, artist])
+        db.session.flush()
+        loaded = 0
+        for size in sorted(sizes):
+            for batch in batches(history(venue.id, artist.id, loaded, size), 5000):
+                db.session.execute(Show.__table__.insert(), batch)
+            loaded = size
+            if db.engine.dialect.name == 'postgresql':
+                db.session.execute('ANALYZE shows')
+            check_durations, insert_durations = [], []
+            for _ in range(checks):
+                start_time = ANCHOR + timedelta(minutes=30 * rng.randint(-12, 12))
+                end_time = start_time + timedelta(hours=2)
+                check_durations.append(timed(
+                    lambda: fyyur.booking_conflicts(venue.id, artist.id, start_time, end_time)))
+                insert_durations.append(timed(lambda: try_insert(db, Show, {
+                    'venue_id': venue.id, 'artist_id': artist.id, 'start_time': start_time, 'end_time': end_time})))
+            results[f'check_{size}'] = summarize(check_durations)
+            results[f'insert_{size}'] = summarize(insert_durations)
+    finally:
+        db.session.rollback()
+    return results
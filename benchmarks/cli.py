@@ -0,0 +1,175 @@
+"""`flask bench` commands."""
+
+from datetime import datetime
+from importlib import import_module
+import sys
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func
+
+from benchmarks import bookings, datagen, formatting, load, micro, results, servers
+from bulk import batches
+
+
+bench_cli = AppGroup('bench', help='Benchmark data, timings and load tests.')
+
+
+def fyyur_module():
+    # commands run after app.py is imported, so this never imports it twice
+    return import_module(current_app.import_name)
+
+
+def scale_of(fyyur):
+    return {kind: fyyur.db.session.query(func.count(model.id)).scalar()
+            for kind, model in (('venues', fyyur.Venue), ('artists', fyyur.Artist), ('shows', fyyur.Show))}
+
+
+@bench_cli.command('generate')
+@click.option('--scale', default='1k', show_default=True,
+              help=f'Shows to generate: {", ".join(datagen.SCALES)} or a number.')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--reset', is_flag=True, help='Delete every venue, artist and show first.')
+@click.option('--batch-size', default=5000, show_default=True)
+def generate(scale, seed, reset, batch_size):
+    """Fill the database with deterministic synthetic data."""
+    fyyur = fyyur_module()
+    db = fyyur.db
+    models = {'venues': fyyur.Venue, 'artists': fyyur.Artist, 'shows': fyyur.Show}
+    db.create_all()
+    if reset:
+        for model in (fyyur.ShowListing, fyyur.Show, fyyur.Venue, fyyur.Artist):
+            db.session.query(model).delete(synchronize_session=False)
+    elif any(scale_of(fyyur).values()):
+        click.echo('The database has data; pass --reset to replace it.', err=True)
+        sys.exit(1)
+    for kind, rows in datagen.generate(scale, seed).items():
+        count = 0
+        for batch in batches(rows, batch_size):
+            db.session.execute(models[kind].__table__.insert(), batch)
+            count += len(batch)
+        fyyur.reset_id_sequence(models[kind])
+        click.echo(f'{count} {kind}')
+    now = datetime.now()
+    fyyur.rebuild_show_counters(fyyur.Venue, now)
+    fyyur.rebuild_show_counters(fyyur.Artist, now)
+    fyyur.refresh_show_listings()
+    db.session.commit()
+    fyyur.page_cache.invalidate('venues', 'artists', 'shows', 'venue-counts', 'artist-counts')
+
+
+@bench_cli.command('run')
+@click.option('--case', 'cases', multiple=True, help='Only these cases (repeatable).')
+@click.option('--iterations', default=50, show_default=True)
+@click.option('--warmup', default=5, show_default=True)
+@click.option('--seed', default=0, show_default=True)
+@click.option('--cache', is_flag=True, help='Keep the page cache on.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Write results as JSON.')
+def run(cases, iterations, warmup, seed, cache, output):
+    """Time every controller through the test client."""
+    fyyur = fyyur_module()
+    scale = scale_of(fyyur)
+    timings = micro.run(fyyur, set(cases), iterations, warmup, seed, cache)
+    click.echo(f'{"case":<26} {"median ms":>10} {"p95 ms":>10} {"queries":>8} {"errors":>7}')
+    for case, summary in timings.items():
+        click.echo(f'{case:<26} {summary["median_ms"]:>10.2f} {summary["p95_ms"]:>10.2f} '
+                   f'{summary["queries"]:>8} {summary["errors"]:>7}')
+    if output:
+        settings = {'iterations': iterations, 'warmup': warmup, 'seed': seed, 'cache': cache}
+        results.write(output, results.document('run', timings, fyyur.db.engine.dialect.name, scale, settings))
+
+
+@bench_cli.command('load')
+@click.argument('base_url')
+@click.option('--users', default=10, show_default=True)
+@click.option('--duration', default=30, show_default=True, help='Seconds.')
+@click.option('--think-time', default=0.5, show_default=True, help='Mean seconds between a user\'s requests.')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--reads-only', is_flag=True, help='Only the read tasks.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Write results as JSON.')
+def load_test(base_url, users, duration, think_time, seed, reads_only, output):
+    """Run the mixed read/write load scenario against a running server."""
+    timings, overall = load.run(base_url, users, duration, think_time, seed, reads_only)
+    click.echo(f'{"task":<16} {"count":>7} {"rps":>7} {"median ms":>10} {"p95 ms":>10} {"errors":>7}')
+    for task, summary in list(timings.items()) + [('overall', overall)]:
+        click.echo(f'{task:<16} {summary["count"]:>7} {summary["rps"]:>7} {summary.get("median_ms", 0):>10.2f} '
+                   f'{summary.get("p95_ms", 0):>10.2f} {summary["errors"]:>7}')
+    if output:
+        settings = {'base_url': base_url, 'users': users, 'duration': duration, 'think_time': think_time, 'seed': seed,
+                    'reads_only': reads_only}
+        results.write(output, results.document('load', {**timings, 'overall': overall}, settings=settings))
+
+
+@bench_cli.command('servers')
+@click.option('--server', 'names', multiple=True, type=click.Choice(['wsgi', 'asgi']),
+              help='Only these servers (repeatable).')
+@click.option('--port', default=8100, show_default=True)
+@click.option('--workers', default=2, show_default=True, help='Processes per server.')
+@click.option('--users', default=50, show_default=True)
+@click.option('--duration', default=30, show_default=True, help='Seconds per server.')
+@click.option('--think-time', default=0.0, show_default=True, help='Mean seconds between a user\'s requests.')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False), help='Write results as JSON.')
+def servers_run(names, port, workers, users, duration, think_time, seed, output):
+    """Compare read throughput of gunicorn (sync) and uvicorn (asyncio)."""
+    timings = servers.run(names or ('wsgi', 'asgi'), port, workers, users, duration, think_time, seed)
+    click.echo(f'{"server":<8} {"count":>7} {"rps":>8} {"median ms":>10} {"p95 ms":>10} {"errors":>7}')
+    for name, summary in timings.items():
+        click.echo(f'{name:<8} {summary["count"]:>7} {summary["rps"]:>8} {summary.get("median_ms", 0):>10.2f} '
+                   f'{summary.get("p95_ms", 0):>10.2f} {summary["errors"]:>7}')
+    if output:
+        settings = {'workers': workers, 'users': users, 'duration': duration, 'think_time': think_time, 'seed': seed}
+        results.write(output, results.document('load', timings, settings=settings))
+
+
+@bench_cli.command('formatting')
+@click.option('--samples', default=20, show_default=True)
+@click.option('--batch', default=1000, show_default=True, help='Calls per sample.')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False), help='Write results as JSON.')
+def formatting_run(samples, batch, seed, output):
+    """Time the datetime filter per call, old path against new."""
+    timings = formatting.run(samples, batch, seed)
+    click.echo(f'{"case":<14} {"median us":>10} {"p95 us":>10}')
+    for case, summary in timings.items():
+        click.echo(f'{case:<14} {summary["median_ms"] * 1000 / batch:>10.2f} {summary["p95_ms"] * 1000 / batch:>10.2f}')
+    if output:
+        settings = {'samples': samples, 'batch': batch, 'seed': seed}
+        results.write(output, results.document('formatting', timings, settings=settings))
+
+
+@bench_cli.command('bookings')
+@click.option('--sizes', default=','.join(map(str, bookings.SIZES)), show_default=True,
+              help='Show history sizes, comma separated.')
+@click.option('--checks', default=200, show_default=True, help='Bookings timed per size.')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False), help='Write results as JSON.')
+def bookings_run(sizes, checks, seed, output):
+    """Time booking conflict checks and inserts as show history grows."""
+    fyyur = fyyur_module()
+    sizes = [int(size) for size in sizes.split(',')]
+    timings = bookings.run(fyyur, sizes, checks, seed)
+    click.echo(f'{"case":<16} {"median ms":>10} {"p95 ms":>10}')
+    for case, summary in timings.items():
+        click.echo(f'{case:<16} {summary["median_ms"]:>10.3f} {summary["p95_ms"]:>10.3f}')
+    if output:
+        settings = {'sizes': sizes, 'checks': checks, 'seed': seed}
+        results.write(output, results.document('bookings', timings, fyyur.db.engine.dialect.name, settings=settings))
+
+
+@bench_cli.command('compare')
+@click.argument('baseline', type=click.Path(exists=True, dir_okay=False))
+@click.argument('current', type=click.Path(exists=True, dir_okay=False))
+@click.option('--tolerance', default=0.2, show_default=True, help='Allowed slowdown, as a fraction.')
+@click.option('--metric', default='median_ms', show_default=True, type=click.Choice(['median_ms', 'p95_ms', 'mean_ms']))
+def compare(baseline, current, tolerance, metric):
+    """Compare two result files; exit non-zero on any regression."""
+    regressions = 0
+    for case, before, after, regressed in results.compare(results.read(baseline), results.read(current), tolerance, metric):
+        regressions += regressed
+        change = (after[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0
+        click.echo(f'{"REGRESSED" if regressed else "ok":<10} {case:<26} {before[metric]:>9.2f} -> {after[metric]:>9.2f} ms '
+                   f'({change:+.0f}%), queries {before.get("queries", "-")} -> {after.get("queries", "-")}')
+    click.echo(f'{regressions} regressions')
+    sys.exit(1 if regressions else 0)
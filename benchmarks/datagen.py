@@ -0,0 +1,154 @@
+"""Deterministic synthetic venues, artists and shows.
+
+The same seed, scale and anchor always produce the same rows. Shows are
+spread a year either side of the anchor (midnight today by default), so
+listings always hold a realistic mix of past and upcoming shows.
+"""
+
+from datetime import datetime, timedelta
+import random
+
+from forms import Genre, State
+import geo
+
+
+# Shows per scale; venues and artists grow with them
+SCALES = {
+    '1k': 1000,
+    '10k': 10000,
+    '100k': 100000,
+    '1m': 1000000
+}
+SHOWS_PER_VENUE = 20
+SHOWS_PER_ARTIST = 10
+
+WORDS = ['Blue', 'Red', 'Golden', 'Silver', 'Electric', 'Velvet', 'Neon', 'Iron', 'Crystal', 'Midnight',
+         'Echo', 'Harbor', 'Garden', 'Lantern', 'Pioneer', 'Union', 'Royal', 'Wild', 'Lucky', 'Paper']
+VENUE_KINDS = ['Hall', 'Club', 'Lounge', 'Theatre', 'Room', 'Bar', 'Arena', 'House', 'Cellar', 'Stage']
+ARTIST_KINDS = ['Band', 'Quartet', 'Collective', 'Orchestra', 'Trio', 'Project', 'Ensemble', 'Brothers', 'Sisters', 'Crew']
+CITIES = ['Springfield', 'Riverside', 'Franklin', 'Greenville', 'Bristol', 'Clinton', 'Fairview', 'Salem',
+          'Madison', 'Georgetown', 'Arlington', 'Ashland', 'Dover', 'Oxford', 'Jackson', 'Milton']
+GENRES = [genre.value for genre in Genre]
+STATES = [state.value for state in State]
+
+SHOW_SPREAD = timedelta(days=365)
+SHOW_DURATION = timedelta(hours=2)
+SLOT_ATTEMPTS = 3
+# Places lie in the contiguous US; venues within a few km of theirs
+PLACES = 400
+PLACE_BOUNDS = ((25.0, 49.0), (-124.0, -67.0))
+VENUE_SPREAD_DEGREES = 0.05
+
+
+def counts(scale):
+    shows = SCALES[scale] if scale in SCALES else int(scale)
+    return {
+        'venues': max(shows // SHOWS_PER_VENUE, 1),
+        'artists': max(shows // SHOWS_PER_ARTIST, 1),
+        'shows': shows
+    }
+
+
+def default_anchor():
+    return datetime.combine(datetime.today(), datetime.min.time())
+
+
+def name(rng, kinds, number):
+    # the number keeps names unique, so keyset orderings are stable
+    return f'{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.choice(kinds)} {number}'
+
+
+def phone(rng):
+    return f'{rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(0, 9999):04d}'
+
+
+def place(number):
+    # a few hundred city/state pairs, so the venue listing has real groups
+    return {'city': CITIES[number % len(CITIES)], 'state': STATES[(number // len(CITIES)) % len(STATES)]}
+
+
+def place_location(number):
+    rng = random.Random(f'place:{number}')
+    (south, north), (west, east) = PLACE_BOUNDS
+    return rng.uniform(south, north), rng.uniform(west, east)
+
+
+def venue_location(rng, number):
+    latitude, longitude = place_location(number)
+    latitude += rng.gauss(0, VENUE_SPREAD_DEGREES)
+    longitude += rng.gauss(0, VENUE_SPREAD_DEGREES)
+    return {'latitude': latitude, 'longitude': longitude, 'geohash': geo.encode(latitude, longitude)}
+
+
+def venues(rng, count):
+    for number in range(1, count + 1):
+        place_number = rng.randrange(PLACES)
+        yield {
+            'id': number,
+            'name': name(rng, VENUE_KINDS, number),
+            **place(place_number),
+            **venue_location(rng, place_number),
+            'address': f'{rng.randint(1, 9999)} {rng.choice(WORDS)} Street',
+            'phone': phone(rng),
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'image_link': f'https://images.example.com/venues/{number}.jpg',
+            'facebook_link': f'https://www.facebook.com/venue{number}',
+            'website': f'https://venue{number}.example.com',
+            'seeking_talent': rng.random() < 0.3,
+            'seeking_description': 'Looking for local acts.' if rng.random() < 0.3 else None
+        }
+
+
+def artists(rng, count):
+    for number in range(1, count + 1):
+        yield {
+            'id': number,
+            'name': name(rng, ARTIST_KINDS, number),
+            **place(rng.randrange(PLACES)),
+            'phone': phone(rng),
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'image_link': f'https://images.example.com/artists/{number}.jpg',
+            'facebook_link': f'https://www.facebook.com/artist{number}',
+            'website': f'https://artist{number}.example.com',
+            'seeking_venue': rng.random() < 0.3,
+            'seeking_description': 'Touring next season.' if rng.random() < 0.3 else None
+        }
+
+
+def shows(rng, count, venue_count, artist_count, anchor):
+    # Shows fill slots of SHOW_DURATION, so they overlap exactly when they
+    # share a slot; no venue or artist is booked twice in one
+    slots = SHOW_SPREAD // SHOW_DURATION
+    booked = set()
+    for number in range(1, count + 1):
+        # popular venues and artists get more shows, like real listings
+        venue_id = min(int(rng.paretovariate(1.2)), venue_count) if rng.random() < 0.2 else rng.randint(1, venue_count)
+        artist_id = rng.randint(1, artist_count)
+        slot = rng.randrange(-slots, slots)
+        attempts = 1
+        while (venue_id, slot) in booked or (-artist_id, slot) in booked:
+            if attempts >= SLOT_ATTEMPTS:
+                # booked solid: take another venue and artist
+                venue_id, artist_id = rng.randint(1, venue_count), rng.randint(1, artist_count)
+            slot = rng.randrange(-slots, slots)
+            attempts += 1
+        booked.update(((venue_id, slot), (-artist_id, slot)))
+        start_time = anchor + slot * SHOW_DURATION
+        yield {
+            'id': number,
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'start_time': start_time,
+            'end_time': start_time + SHOW_DURATION
+        }
+
+
+def generate(scale='1k', seed=0, anchor=None):
+    """Return {kind: row iterator} for scale (a SCALES key or a show count)."""
+    sizes = counts(scale)
+    anchor = anchor or default_anchor()
+    return {
+        'venues': venues(random.Random(f'{seed}:venues'), sizes['venues']),
+        'artists': artists(random.Random(f'{seed}:artists'), sizes['artists']),
+        'shows': shows(random.Random(f'{seed}:shows'), sizes['shows'], sizes['venues'], sizes['artists'], anchor)
+    }
@@ -0,0 +1,57 @@
+"""Per-call cost of the datetime filter, before and after dates.py.
+
+``babel_string`` is the old path of /shows: the view stringified each
+start time and the filter parsed it back with dateutil, then had Babel
+interpret the pattern. ``babel`` skips the round trip. The other cases
+are the dates.py paths: the compiled pattern alone, the filter on values
+it has not seen (``cold``) and has (``warm``), and the filter rendering
+warm values in a venue's timezone.
+
+Each sample times ``batch`` calls, so milliseconds per sample read as
+microseconds per call when batch is 1000.
+"""
+
+from datetime import datetime, timedelta
+import random
+import time
+
+from babel.dates import format_datetime as babel_format_datetime
+import dateutil.parser
+
+from benchmarks.results import summarize
+import dates
+
+
+def cases():
+    pattern = dates.PATTERNS['full']
+    compiled = dates.formatter('full')
+    return [
+        ('babel_string', lambda value: babel_format_datetime(
+            dateutil.parser.parse(value.strftime('%Y-%m-%dT%H:%M')), pattern, locale='en')),
+        ('babel', lambda value: babel_format_datetime(value, pattern, locale='en')),
+        ('compiled', compiled),
+        ('cold', lambda value: dates.format_datetime(value, 'full')),
+        ('warm', lambda value: dates.format_datetime(value, 'full')),
+        ('timezone', lambda value: dates.format_datetime(value, 'full', 'America/New_York')),
+    ]
+
+
+def run(samples=20, batch=1000, seed=0):
+    """Time each case, returning {case: summary}."""
+    rng = random.Random(seed)
+    start = datetime(2030, 1, 1, 20, 0)
+    results = {}
+    for name, function in cases():
+        durations = []
+        for sample in range(samples):
+            values = [start + timedelta(minutes=30 * rng.randint(0, 10 ** 6)) for _ in range(batch)]
+            dates.format_in_zone.cache_clear()
+            if name in ('warm', 'timezone'):
+                for value in values:
+                    function(value)
+            started = time.perf_counter()
+            for value in values:
+                function(value)
+            durations.append(time.perf_counter() - started)
+        results[name] = summarize(durations)
+    return results
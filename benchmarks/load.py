@@ -0,0 +1,152 @@
+"""Load scenario: virtual users mixing reads and writes against a server.
+
+Each user is a thread with its own cookie jar. It repeatedly picks a
+task by weight, then waits a random think time. Writes go through the
+real forms: the user fetches the form for its CSRF token, then posts it.
+Run the server as in production (gunicorn) on generated data.
+"""
+
+from collections import defaultdict
+from http.cookiejar import CookieJar
+import json
+import random
+import re
+import threading
+import time
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from benchmarks.datagen import GENRES, STATES, WORDS
+from benchmarks.results import summarize
+
+
+CSRF_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+# (task, weight): mostly browsing, some searching, a few bookings
+TASKS = [
+    ('venues', 15),
+    ('show_venue', 20),
+    ('search_venues', 10),
+    ('artists', 10),
+    ('show_artist', 15),
+    ('search_artists', 5),
+    ('shows', 10),
+    ('api_shows', 5),
+    ('create_show', 6),
+    ('edit_artist', 3),
+    ('create_venue', 1),
+]
+WRITE_TASKS = {'create_show', 'edit_artist', 'create_venue'}
+READ_TASKS = [(task, weight) for task, weight in TASKS if task not in WRITE_TASKS]
+
+
+class User:
+
+    def __init__(self, base_url, rng, ids):
+        self.base_url = base_url.rstrip('/')
+        self.rng = rng
+        self.ids = ids
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+
+    def open(self, path, form=None):
+        data = urlencode(form, doseq=True).encode() if form is not None else None
+        with self.opener.open(Request(self.base_url + path, data=data), timeout=30) as response:
+            return response.read().decode()
+
+    def submit(self, form_path, post_path, form):
+        token = CSRF_TOKEN.search(self.open(form_path))
+        return self.open(post_path, {**form, 'csrf_token': token.group(1) if token else ''})
+
+    def venue_id(self):
+        return self.rng.choice(self.ids['venues'])
+
+    def artist_id(self):
+        return self.rng.choice(self.ids['artists'])
+
+    def profile(self, name):
+        return {
+            'name': name,
+            'city': 'Springfield',
+            'state': self.rng.choice(STATES),
+            'phone': '555-555-5555',
+            'image_link': 'https://images.example.com/load.jpg',
+            'genres': self.rng.sample(GENRES, 2)
+        }
+
+    def run(self, task):
+        rng = self.rng
+        if task == 'venues':
+            self.open('/venues')
+        elif task == 'show_venue':
+            self.open(f'/venues/{self.venue_id()}')
+        elif task == 'search_venues':
+            self.open('/venues/search', {'search_term': rng.choice(WORDS)})
+        elif task == 'artists':
+            self.open('/artists')
+        elif task == 'show_artist':
+            self.open(f'/artists/{self.artist_id()}')
+        elif task == 'search_artists':
+            self.open('/artists/search', {'search_term': rng.choice(WORDS)})
+        elif task == 'shows':
+            self.open('/shows')
+        elif task == 'api_shows':
+            self.open(f'/api/v1/shows?venue_id={self.venue_id()}')
+        elif task == 'create_show':
+            self.submit('/shows/create', '/shows/create', {
+                'venue_id': self.venue_id(),
+                'artist_id': self.artist_id(),
+                'start_time': f'2030-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 20:00'
+            })
+        elif task == 'edit_artist':
+            artist_id = self.artist_id()
+            self.submit(f'/artists/{artist_id}/edit', f'/artists/{artist_id}/edit', self.profile(f'Load Artist {artist_id}'))
+        elif task == 'create_venue':
+            self.submit('/venues/create', '/venues/create', {**self.profile('Load Venue'), 'address': '1 Main Street'})
+
+
+def entity_ids(base_url, kind, limit=100):
+    request = Request(f'{base_url.rstrip("/")}/api/v1/{kind}?limit={limit}', headers={'Accept': 'application/json'})
+    with build_opener().open(request, timeout=30) as response:
+        return [row['id'] for row in json.load(response)['data']]
+
+
+def run(base_url, users=10, duration=30, think_time=0.5, seed=0, reads_only=False):
+    """Run the scenario, returning ({task: summary}, overall summary)."""
+    ids = {'venues': entity_ids(base_url, 'venues'), 'artists': entity_ids(base_url, 'artists')}
+    tasks, weights = zip(*(READ_TASKS if reads_only else TASKS))
+    durations = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def user_loop(number):
+        user = User(base_url, random.Random(f'{seed}:{number}'), ids)
+        while time.monotonic() < deadline:
+            task = user.rng.choices(tasks, weights)[0]
+            started = time.perf_counter()
+            try:
+                user.run(task)
+                failed = False
+            except (HTTPError, URLError, OSError):
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                if failed:
+                    errors[task] += 1
+                else:
+                    durations[task].append(elapsed)
+            time.sleep(user.rng.uniform(0, 2 * think_time))
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=user_loop, args=(number,)) for number in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    results = {task: summarize(durations[task], errors[task], rps=round(len(durations[task]) / elapsed, 2))
+               for task in tasks}
+    every = [value for values in durations.values() for value in values]
+    overall = summarize(every, sum(errors.values()), rps=round(len(every) / elapsed, 2))
+    return results, overall
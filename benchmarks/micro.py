@@ -0,0 +1,189 @@
+"""Per-controller microbenchmarks through the Flask test client.
+
+Every controller in app.py (HTML and API) has a case. A case picks its
+request from the generated data with a seeded RNG; cases needing a row to
+delete create it first, untimed. Write cases change the database, so run
+them against generated data rather than anything you want to keep.
+"""
+
+from contextlib import contextmanager
+from datetime import timedelta
+import random
+import time
+
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+
+from benchmarks.datagen import GENRES, PLACES, STATES, WORDS, default_anchor, place_location
+from benchmarks.results import summarize
+
+
+class Case:
+
+    def __init__(self, name, request, setup=None):
+        self.name = name
+        self.request = request
+        self.setup = setup
+
+
+def venue_form(rng, name):
+    return {
+        'name': name,
+        'city': 'Springfield',
+        'state': rng.choice(STATES),
+        'address': '1 Main Street',
+        'phone': '555-555-5555',
+        'image_link': 'https://images.example.com/bench.jpg',
+        'genres': rng.sample(GENRES, 2),
+        'facebook_link': '',
+        'website_link': '',
+        'seeking_description': ''
+    }
+
+
+def artist_form(rng, name):
+    form = venue_form(rng, name)
+    del form['address']
+    return form
+
+
+def show_form(rng, ids):
+    return {
+        'venue_id': rng.randint(1, ids['venues']),
+        'artist_id': rng.randint(1, ids['artists']),
+        'start_time': f'2030-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 20:00',
+        'end_time': ''
+    }
+
+
+def near(rng):
+    latitude, longitude = place_location(rng.randrange(PLACES))
+    return f'lat={latitude:.4f}&lng={longitude:.4f}'
+
+
+def availability(rng, ids):
+    # the month after the anchor of generated shows
+    start = default_anchor()
+    return (f'/api/v1/venues/{rng.randint(1, ids["venues"])}/availability'
+            f'?start={start.isoformat()}&end={(start + timedelta(days=30)).isoformat()}')
+
+
+def calendar_month(rng):
+    # a month of generated shows
+    return (default_anchor() + timedelta(days=rng.randint(-60, 60))).strftime('%Y-%m')
+
+
+def cases(fyyur):
+    """The benchmark cases, reading ids from the fyyur app module."""
+    db, Venue, Artist, Show = fyyur.db, fyyur.Venue, fyyur.Artist, fyyur.Show
+
+    def max_id(model):
+        return db.session.query(func.max(model.id)).scalar() or 1
+
+    def created(model, path, form):
+        # untimed setup for the delete cases, through the real write path
+        def setup(client, rng, ids):
+            client.post(path, data=form(rng, ids))
+            return max_id(model)
+        return setup
+
+    return [
+        Case('index', lambda rng, ids, _: ('GET', '/', None)),
+        Case('venues', lambda rng, ids, _: ('GET', '/venues', None)),
+        Case('venues_near', lambda rng, ids, _: ('GET', f'/venues/near?{near(rng)}', None)),
+        Case('search_venues', lambda rng, ids, _: ('POST', '/venues/search', {'search_term': rng.choice(WORDS)})),
+        Case('show_venue', lambda rng, ids, _: ('GET', f'/venues/{rng.randint(1, ids["venues"])}', None)),
+        Case('venue_calendar', lambda rng, ids, _: (
+            'GET', f'/venues/{rng.randint(1, ids["venues"])}/calendar?month={calendar_month(rng)}', None)),
+        Case('venue_calendar_feed', lambda rng, ids, _: ('GET', f'/venues/{rng.randint(1, ids["venues"])}/calendar.ics', None)),
+        Case('create_venue_form', lambda rng, ids, _: ('GET', '/venues/create', None)),
+        Case('create_venue_submission', lambda rng, ids, _: ('POST', '/venues/create', venue_form(rng, 'Bench Venue'))),
+        Case('edit_venue', lambda rng, ids, _: ('GET', f'/venues/{rng.randint(1, ids["venues"])}/edit', None)),
+        Case('edit_venue_submission', lambda rng, ids, _: (
+            'POST', f'/venues/{rng.randint(1, ids["venues"])}/edit', venue_form(rng, 'Bench Venue'))),
+        Case('delete_venue', lambda rng, ids, venue_id: ('DELETE', f'/venues/{venue_id}', None),
+             created(Venue, '/venues/create', lambda rng, ids: venue_form(rng, 'Bench Venue'))),
+        Case('artists', lambda rng, ids, _: ('GET', '/artists', None)),
+        Case('search_artists', lambda rng, ids, _: ('POST', '/artists/search', {'search_term': rng.choice(WORDS)})),
+        Case('show_artist', lambda rng, ids, _: ('GET', f'/artists/{rng.randint(1, ids["artists"])}', None)),
+        Case('artist_calendar', lambda rng, ids, _: (
+            'GET', f'/artists/{rng.randint(1, ids["artists"])}/calendar?month={calendar_month(rng)}', None)),
+        Case('artist_calendar_feed', lambda rng, ids, _: ('GET', f'/artists/{rng.randint(1, ids["artists"])}/calendar.ics', None)),
+        Case('create_artist_form', lambda rng, ids, _: ('GET', '/artists/create', None)),
+        Case('create_artist_submission', lambda rng, ids, _: ('POST', '/artists/create', artist_form(rng, 'Bench Artist'))),
+        Case('edit_artist', lambda rng, ids, _: ('GET', f'/artists/{rng.randint(1, ids["artists"])}/edit', None)),
+        Case('edit_artist_submission', lambda rng, ids, _: (
+            'POST', f'/artists/{rng.randint(1, ids["artists"])}/edit', artist_form(rng, 'Bench Artist'))),
+        Case('delete_artist', lambda rng, ids, artist_id: ('DELETE', f'/artists/{artist_id}', None),
+             created(Artist, '/artists/create', lambda rng, ids: artist_form(rng, 'Bench Artist'))),
+        Case('shows', lambda rng, ids, _: ('GET', '/shows', None)),
+        Case('create_shows', lambda rng, ids, _: ('GET', '/shows/create', None)),
+        Case('create_show_submission', lambda rng, ids, _: ('POST', '/shows/create', show_form(rng, ids))),
+        Case('delete_show', lambda rng, ids, show_id: ('DELETE', f'/shows/{show_id}', None),
+             created(Show, '/shows/create', show_form)),
+        Case('api_venues', lambda rng, ids, _: ('GET', '/api/v1/venues', None)),
+        Case('api_venues_near', lambda rng, ids, _: ('GET', f'/api/v1/venues/near?{near(rng)}', None)),
+        Case('api_venue_availability', lambda rng, ids, _: ('GET', availability(rng, ids), None)),
+        Case('api_search_venues', lambda rng, ids, _: ('GET', f'/api/v1/venues/search?search_term={rng.choice(WORDS)}', None)),
+        Case('api_venue', lambda rng, ids, _: ('GET', f'/api/v1/venues/{rng.randint(1, ids["venues"])}', None)),
+        Case('api_artists', lambda rng, ids, _: ('GET', '/api/v1/artists', None)),
+        Case('api_search_artists', lambda rng, ids, _: ('GET', f'/api/v1/artists/search?search_term={rng.choice(WORDS)}', None)),
+        Case('api_artist', lambda rng, ids, _: ('GET', f'/api/v1/artists/{rng.randint(1, ids["artists"])}', None)),
+        Case('api_shows', lambda rng, ids, _: ('GET', f'/api/v1/shows?venue_id={rng.randint(1, ids["venues"])}', None)),
+    ]
+
+
+@contextmanager
+def counted_statements():
+    counter = [0]
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        counter[0] += 1
+
+    event.listen(Engine, 'before_cursor_execute', count)
+    try:
+        yield counter
+    finally:
+        event.remove(Engine, 'before_cursor_execute', count)
+
+
+def run(fyyur, names=None, iterations=50, warmup=5, seed=0, cache=False):
+    """Time each case, returning {case: summary}."""
+    app, db = fyyur.app, fyyur.db
+    ids = {
+        'venues': db.session.query(func.max(fyyur.Venue.id)).scalar() or 1,
+        'artists': db.session.query(func.max(fyyur.Artist.id)).scalar() or 1
+    }
+    csrf, app.config['WTF_CSRF_ENABLED'] = app.config.get('WTF_CSRF_ENABLED', True), False
+    backend = fyyur.page_cache.backend
+    if not cache:
+        fyyur.page_cache.backend = None
+    results = {}
+    try:
+        for case in cases(fyyur):
+            if names and case.name not in names:
+                continue
+            rng = random.Random(f'{seed}:{case.name}')
+            # no cookies, so flashed messages never pile up in a session
+            client = app.test_client(use_cookies=False)
+            durations, queries, errors = [], [], 0
+            for iteration in range(warmup + iterations):
+                argument = case.setup(client, rng, ids) if case.setup else None
+                db.session.remove()
+                method, url, data = case.request(rng, ids, argument)
+                with counted_statements() as counter:
+                    started = time.perf_counter()
+                    response = client.open(url, method=method, data=data)
+                    response.get_data()
+                    duration = time.perf_counter() - started
+                if iteration < warmup:
+                    continue
+                durations.append(duration)
+                queries.append(counter[0])
+                errors += response.status_code >= 400
+            queries.sort()
+            results[case.name] = summarize(durations, errors, queries=queries[len(queries) // 2])
+    finally:
+        app.config['WTF_CSRF_ENABLED'] = csrf
+        fyyur.page_cache.backend = backend
+    return results
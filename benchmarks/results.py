@@ -0,0 +1,99 @@
+"""Benchmark results as JSON, and comparisons between runs.
+
+    {
+      "format": 1,
+      "kind": "run" or "load",
+      "created": "2026-10-18T03:20:00",
+      "git": "<commit>",
+      "database": "postgresql",
+      "scale": {"venues": 500, "artists": 1000, "shows": 10000},
+      "settings": {...},
+      "results": {
+        "<case>": {"count": 50, "errors": 0, "min_ms": .., "median_ms": ..,
+                   "p95_ms": .., "max_ms": .., "mean_ms": .., "queries": ..}
+      }
+    }
+
+``queries`` (statements per request) is only recorded by ``run``; ``load``
+adds ``rps`` per case and overall.
+"""
+
+from datetime import datetime
+import json
+import statistics
+import subprocess
+
+FORMAT = 1
+
+
+def percentile(sorted_values, fraction):
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(durations, errors=0, **extra):
+    """Summarize request durations in seconds."""
+    values = sorted(duration * 1000 for duration in durations)
+    if not values:
+        return {'count': 0, 'errors': errors, **extra}
+    return {
+        'count': len(values),
+        'errors': errors,
+        'min_ms': round(values[0], 3),
+        'median_ms': round(statistics.median(values), 3),
+        'p95_ms': round(percentile(values, 0.95), 3),
+        'max_ms': round(values[-1], 3),
+        'mean_ms': round(statistics.fmean(values), 3),
+        **extra
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def document(kind, results, database=None, scale=None, settings=None):
+    return {
+        'format': FORMAT,
+        'kind': kind,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'git': git_commit(),
+        'database': database,
+        'scale': scale,
+        'settings': settings or {},
+        'results': results
+    }
+
+
+def write(path, doc):
+    with open(path, 'w') as file:
+        json.dump(doc, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def read(path):
+    with open(path) as file:
+        doc = json.load(file)
+    if doc.get('format') != FORMAT:
+        raise ValueError(f'{path}: unsupported results format {doc.get("format")}')
+    return doc
+
+
+def compare(baseline, current, tolerance=0.2, metric='median_ms'):
+    """Yield (case, baseline result, current result, regressed) for shared cases.
+
+    A case regresses when metric grows by more than tolerance (a fraction),
+    when it runs more queries, or when it starts failing.
+    """
+    for case, before in sorted(baseline['results'].items()):
+        after = current['results'].get(case)
+        if after is None or before.get(metric) is None or after.get(metric) is None:
+            continue
+        regressed = (after[metric] > before[metric] * (1 + tolerance)
+                     or after.get('queries', 0) > before.get('queries', 0)
+                     or after.get('errors', 0) > before.get('errors', 0))
+        yield case, before, after, regressed
@@ -0,0 +1,60 @@
+"""Server scenario: the read mix of the load scenario on each server.
+
+The same database, workers and users are run against gunicorn (the sync
+WSGI path, a thread per pooled connection) and uvicorn with asgi.py (the
+asyncio path, asyncdb.py), one server at a time, to compare throughput.
+Servers run in the current environment, so set SECRET_KEY, DATABASE_URL
+and the pool as for production.
+"""
+
+from contextlib import contextmanager
+import os
+import subprocess
+import time
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from benchmarks import load
+
+
+def commands(port, workers):
+    return {
+        'wsgi': ['gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+                 'wsgi:application'],
+        'asgi': ['uvicorn', '--port', str(port), '--workers', str(workers), '--no-access-log', 'asgi:application'],
+    }
+
+
+def wait_until_up(base_url, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urlopen(f'{base_url}/api/v1/venues?limit=1', timeout=5):
+                return
+        except (URLError, OSError):
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+
+@contextmanager
+def serving(command, base_url, startup_timeout=30):
+    """Run command, a server, until the block exits."""
+    server = subprocess.Popen(command, env={**os.environ, 'FYYUR_CONFIG': os.environ.get('FYYUR_CONFIG', 'production')},
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(base_url, startup_timeout)
+        yield
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def run(servers, port=8100, workers=2, users=50, duration=30, think_time=0, seed=0):
+    """Run the read mix on each server, returning {server: overall summary}."""
+    base_url = f'http://127.0.0.1:{port}'
+    results = {}
+    for name in servers:
+        with serving(commands(port, workers)[name], base_url):
+            results[name] = load.run(base_url, users, duration, think_time, seed, reads_only=True)[1]
+    return results
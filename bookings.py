@@ -0,0 +1,58 @@
+"""Show bookings.
+
+A show books its venue and its artist for [start_time, end_time), and
+neither may be booked twice at once. On Postgres, exclusion constraints
+(GiST indexes over ``tsrange(start_time, end_time)``, with btree_gist for
+the ids) reject overlapping bookings however rows are written. Views check
+first, to report conflicts instead of failing: shows last at most
+MAX_DURATION, so a booking can only overlap shows starting less than that
+before it ends, a range scan on the (venue_id, start_time) and (artist_id,
+start_time) indexes whose cost doesn't grow with past shows.
+"""
+
+from datetime import timedelta
+
+from sqlalchemy import DDL
+
+
+DEFAULT_DURATION = timedelta(hours=2)
+MAX_DURATION = timedelta(hours=24)
+
+
+class InvalidWindow(ValueError):
+    pass
+
+
+def booking_constraints_ddl():
+    """DDL for the duration check and exclusion constraints of shows (Postgres)."""
+    hours = int(MAX_DURATION.total_seconds() // 3600)
+    return DDL(f'''
+        CREATE EXTENSION IF NOT EXISTS btree_gist;
+        ALTER TABLE shows
+            ADD CONSTRAINT ck_shows_duration
+                CHECK (end_time > start_time AND end_time <= start_time + interval '{hours} hours'),
+            ADD CONSTRAINT ex_shows_venue_booking
+                EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&),
+            ADD CONSTRAINT ex_shows_artist_booking
+                EXCLUDE USING gist (artist_id WITH =, tsrange(start_time, end_time) WITH &&)
+    ''').execute_if(dialect='postgresql')
+
+
+def free_intervals(start, end, booked, min_duration=None):
+    """The gaps in [start, end) between booked (start, end) intervals.
+
+    booked must be sorted by start; gaps shorter than min_duration are left
+    out.
+    """
+    free = []
+    cursor = start
+    for booked_start, booked_end in booked:
+        if booked_start > cursor:
+            free.append((cursor, min(booked_start, end)))
+        cursor = max(cursor, booked_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        free.append((cursor, end))
+    return [(gap_start, gap_end) for gap_start, gap_end in free
+            if gap_end > gap_start and (min_duration is None or gap_end - gap_start >= min_duration)]
@@ -0,0 +1,142 @@
+"""Bulk import and export of venues, artists and shows as CSV or NDJSON.
+
+Rows are validated with the request-free ``*Fields`` forms, so imported
+data obeys the same rules as the web forms.
+"""
+
+import csv
+from datetime import datetime
+from itertools import islice
+import json
+
+from werkzeug.datastructures import MultiDict
+
+
+FORMATS = ('csv', 'ndjson')
+
+# Columns whose form field is named differently
+FIELD_NAMES = {'website': 'website_link'}
+
+# Multi-valued columns, comma separated in CSV
+LIST_COLUMNS = ('genres',)
+
+# Boolean columns, written as true/false. BooleanField reads any value but
+# 'false' and '' as true, so imported values are normalized first.
+BOOLEAN_COLUMNS = ('seeking_talent', 'seeking_venue')
+TRUE_VALUES = ('true', 't', 'yes', 'y', '1', 'on')
+FALSE_VALUES = ('false', 'f', 'no', 'n', '0', 'off', '')
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def detect_format(filename, format=None):
+    if format is not None:
+        return format
+    if filename.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return 'csv'
+
+
+def read_rows(file, format):
+    """Yield (line number, row dict) pairs from a CSV or NDJSON file."""
+    if format == 'ndjson':
+        for number, line in enumerate(file, start=1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except ValueError as error:
+                    yield number, error
+        return
+    reader = csv.DictReader(file)
+    for row in reader:
+        for column in LIST_COLUMNS:
+            if isinstance(row.get(column), str):
+                row[column] = [value.strip() for value in row[column].split(',') if value.strip()]
+        yield reader.line_num, row
+
+
+def form_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def boolean_value(value):
+    """'true' or 'false' for a boolean column value, None if it is not one."""
+    if isinstance(value, bool):
+        return form_value(value)
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return 'true'
+    if value in FALSE_VALUES:
+        return 'false'
+    return None
+
+
+def validate(fields_class, columns, row):
+    """Return (column values, errors) for one imported row."""
+    if not isinstance(row, dict):
+        return None, [f'unreadable row: {row}']
+    errors = []
+    formdata = MultiDict()
+    for column, value in row.items():
+        field = FIELD_NAMES.get(column, column)
+        if column in BOOLEAN_COLUMNS and value is not None:
+            value = boolean_value(value)
+            if value is None:
+                errors.append(f'{column}: Not a valid boolean value')
+                continue
+        for item in value if isinstance(value, list) else [value]:
+            if item is not None:
+                formdata.add(field, form_value(item))
+    form = fields_class(formdata)
+    if not form.validate():
+        errors += [f'{field}: {"; ".join(messages)}' for field, messages in form.errors.items()]
+    values = {}
+    if row.get('id') not in (None, ''):
+        try:
+            values['id'] = int(row['id'])
+        except (TypeError, ValueError):
+            errors.append('id: Not a valid integer value')
+    if errors:
+        return None, errors
+    for column in columns:
+        field = FIELD_NAMES.get(column, column)
+        if column != 'id' and field in form.data:
+            values[column] = form.data[field]
+    return values, []
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def export_value(value, format):
+    if format == 'csv' and isinstance(value, bool):
+        return form_value(value)
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    if format == 'csv' and isinstance(value, list):
+        return ','.join(value)
+    return value
+
+
+def write_rows(file, format, columns, rows):
+    """Write rows of column values to file, returning how many were written."""
+    count = 0
+    if format == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(columns)
+    for row in rows:
+        values = [export_value(value, format) for value in row]
+        if format == 'csv':
+            writer.writerow(values)
+        else:
+            file.write(json.dumps(dict(zip(columns, values))) + '\n')
+        count += 1
+    return count
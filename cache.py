@@ -0,0 +1,135 @@
+"""Rendered page cache.
+
+Pages are stored under keys that embed the current version of every tag
+they depend on (e.g. ``venue:3``, ``shows``). Invalidating a tag bumps its
+version, so every page built from it becomes unreachable at once and ages
+out of the backend; no tag-to-key bookkeeping is needed, which keeps the
+in-process and Redis backends interchangeable.
+"""
+
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+import time
+
+from flask import request
+
+
+class MemoryBackend:
+    """Thread-safe in-process LRU with per-entry TTL and a size bound.
+
+    Counters live outside the LRU so evicting pages never resets them.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def counters(self, keys):
+        with self.lock:
+            return [self.versions.get(key, 0) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def incr(self, key):
+        with self.lock:
+            self.versions[key] = self.versions.get(key, 0) + 1
+            return self.versions[key]
+
+
+class RedisBackend:
+    """Redis (or a local Redis-compatible server) as the cache store."""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return None if value is None else value.decode()
+
+    def counters(self, keys):
+        return [int(value or 0) for value in self.client.mget(keys)]
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=ttl or None)
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+
+class PageCache:
+
+    def __init__(self, backend, ttl=60, prefix='fyyur:page', bypass=lambda: False):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.bypass = bypass
+
+    def key(self, tags, path):
+        versions = self.backend.counters([f'{self.prefix}:tag:{tag}' for tag in tags])
+        tagged = ','.join(f'{tag}@{version}' for tag, version in zip(tags, versions))
+        return f'{self.prefix}:{tagged}:{path}'
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, page):
+        self.backend.set(key, page, self.ttl)
+
+    def invalidate(self, *tags):
+        if self.backend is None:
+            return
+        for tag in set(tags):
+            self.backend.incr(f'{self.prefix}:tag:{tag}')
+
+    def cached(self, *tags):
+        """Cache the pages a view renders under tags.
+
+        Tags are formatted with the view arguments, e.g. 'venue:{venue_id}'.
+        Views returning anything other than a rendered page are not cached,
+        nor are requests for which bypass() is true.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.backend is None or request.method != 'GET' or self.bypass():
+                    return view(*args, **kwargs)
+                key = self.key([tag.format(**kwargs) for tag in tags], request.full_path)
+                page = self.get(key)
+                if page is None:
+                    page = view(*args, **kwargs)
+                    if isinstance(page, str):
+                        self.set(key, page)
+                return page
+            return wrapper
+        return decorator
+
+
+def make_backend(config):
+    backend = config.get('PAGE_CACHE_BACKEND', 'memory')
+    if backend == 'redis':
+        return RedisBackend(config['PAGE_CACHE_REDIS_URL'])
+    if backend == 'memory':
+        return MemoryBackend(config.get('PAGE_CACHE_MAX_ENTRIES', 1024))
+    return None
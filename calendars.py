@@ -0,0 +1,155 @@
+"""Show calendars: month grids of show counts and iCalendar feeds.
+
+Calendar pages count the shows of a venue or artist per day of the weeks
+a month spans, in one GROUP BY over the (venue_id, start_time) or
+(artist_id, start_time) index of show_listings; week totals are summed
+from the days. Feeds (RFC 5545) are written one event at a time, so the
+shows behind them can be streamed from the database.
+
+Show times are wall-clock times at their venue. Feeds give them in UTC
+when the venue has a timezone, and as floating times otherwise.
+"""
+
+import calendar
+from collections import namedtuple
+from datetime import date, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+
+FIRST_WEEKDAY = calendar.SUNDAY
+# Longest content line, continuation lines included, in octets
+LINE_OCTETS = 75
+PRODID = '-//Fyyur//Show calendar//EN'
+ICALENDAR = 'text/calendar'
+# Years whose grids, and the months and days around them, are all dates
+MIN_YEAR = date.min.year + 1
+MAX_YEAR = date.max.year - 1
+
+Day = namedtuple('Day', 'date count in_month')
+Week = namedtuple('Week', 'days count')
+
+
+class InvalidMonth(ValueError):
+    pass
+
+
+def parse_month(value, today):
+    """The first day of 'YYYY-MM', or of today's month if value is empty."""
+    if not value:
+        return today.replace(day=1)
+    try:
+        year, month = map(int, value.split('-'))
+        return in_range(date(year, month, 1))
+    except ValueError:
+        raise InvalidMonth(f'bad month {value!r}') from None
+
+
+def parse_day(value):
+    try:
+        return in_range(date.fromisoformat(value))
+    except ValueError:
+        raise InvalidMonth(f'bad day {value!r}') from None
+
+
+def in_range(day):
+    if not MIN_YEAR <= day.year <= MAX_YEAR:
+        raise ValueError(f'year outside {MIN_YEAR}-{MAX_YEAR}')
+    return day
+
+
+def add_months(month, count):
+    """The first day of the month count months after month."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_weeks(month):
+    """The weeks (lists of seven dates) month spans, from FIRST_WEEKDAY."""
+    return calendar.Calendar(FIRST_WEEKDAY).monthdatescalendar(month.year, month.month)
+
+
+def weeks_bounds(weeks):
+    """[start, end) dates of weeks."""
+    return weeks[0][0], weeks[-1][-1] + timedelta(days=1)
+
+
+def as_date(value):
+    # SQLite's date() returns strings
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def month_grid(month, weeks, counts):
+    """Weeks of Days of month from (day, show count) rows."""
+    counts = {as_date(day): count for day, count in counts}
+    grid = []
+    for week in weeks:
+        days = [Day(day, counts.get(day, 0), day.month == month.month) for day in week]
+        grid.append(Week(days, sum(day.count for day in days)))
+    return grid
+
+
+def escape_text(value):
+    return value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,') \
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def fold(line):
+    """Split line into LINE_OCTETS long lines, never inside a UTF-8 character."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= LINE_OCTETS:
+        return line
+    parts, start, limit = [], 0, LINE_OCTETS
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode('utf-8'))
+        # continuation lines start with a space
+        start, limit = end, LINE_OCTETS - 1
+    return '\r\n '.join(parts)
+
+
+def content_lines(*properties):
+    return ''.join(fold(f'{name}:{value}') + '\r\n' for name, value in properties if value is not None)
+
+
+@lru_cache(maxsize=None)
+def zone(name):
+    return ZoneInfo(name)
+
+
+def format_time(value, tz=None):
+    """A DATE-TIME value: UTC if the wall-clock time value is in zone tz, else floating."""
+    if tz:
+        return value.replace(tzinfo=zone(tz)).astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def ical_event(uid, stamp, start, end, summary, tz=None, location=None, url=None):
+    """A VEVENT; stamp is an aware datetime."""
+    return content_lines(
+        ('BEGIN', 'VEVENT'),
+        ('UID', uid),
+        ('DTSTAMP', stamp.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')),
+        ('DTSTART', format_time(start, tz)),
+        ('DTEND', format_time(end, tz)),
+        ('SUMMARY', escape_text(summary)),
+        ('LOCATION', escape_text(location) if location else None),
+        ('URL', url),
+        ('END', 'VEVENT'),
+    )
+
+
+def ical_feed(name, events):
+    """Yield a VCALENDAR named name around events, one string per event."""
+    yield content_lines(
+        ('BEGIN', 'VCALENDAR'),
+        ('VERSION', '2.0'),
+        ('PRODID', PRODID),
+        ('CALSCALE', 'GREGORIAN'),
+        ('METHOD', 'PUBLISH'),
+        ('X-WR-CALNAME', escape_text(name)),
+    )
+    yield from events
+    yield content_lines(('END', 'VCALENDAR'))
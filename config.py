@@ -1,11 +1,135 @@
 import os
-SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
 
-# Connect to the database
-SQLALCHEMY_DATABASE_URI = 'postgresql://postgres@localhost:5432/fyyurapp'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY') or os.urandom(32)
+    DEBUG = False
+
+    # Connect to the database
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://postgres@localhost:5432/fyyurapp')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Set by the web server entry points (gunicorn.conf.py, wsgi.py, asgi.py).
+    # Only their connections get DB_STATEMENT_TIMEOUT_MS; migrations and
+    # `flask` commands run long statements and keep the server's default.
+    SERVING = os.environ.get('FYYUR_SERVING') == '1'
+
+    # Connection pool of each process. A gthread worker serves at most
+    # `threads` requests at once, one connection each, so threads should
+    # equal pool_size; max_overflow absorbs CLI work and bursts. Every
+    # process can hold pool_size + max_overflow connections.
+    # (Postgres only; SQLite keeps its defaults.)
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': env_int('DB_POOL_SIZE', 5),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 2),
+        'pool_timeout': env_int('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True,
+        **({'connect_args': {
+            'options': f'-c statement_timeout={env_int("DB_STATEMENT_TIMEOUT_MS", 5000)}'
+        }} if SERVING else {})
+    } if SQLALCHEMY_DATABASE_URI.startswith('postgresql') else {}
+    # Connections left free for migrations, cron jobs and psql sessions
+    DB_RESERVED_CONNECTIONS = env_int('DB_RESERVED_CONNECTIONS', 5)
+
+    # Set by asgi.py: requests run on an asyncio event loop and the database
+    # URLs use asyncio drivers (asyncdb.py). Each in-flight request holds a
+    # connection, so pool_size + max_overflow bounds the requests a process
+    # serves at once; pages fan queries out over connections left spare.
+    ASYNC_IO = os.environ.get('FYYUR_ASYNC_IO') == '1'
+
+    # Read replicas (comma separated URLs) for read-only views. Replicas more
+    # than REPLICA_MAX_LAG_SECONDS behind are skipped until they catch up;
+    # users read from the primary for READ_YOUR_WRITES_SECONDS after a write.
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri]
+    REPLICA_MAX_LAG_SECONDS = env_int('REPLICA_MAX_LAG_SECONDS', 5)
+    REPLICA_CHECK_SECONDS = 10
+    READ_YOUR_WRITES_SECONDS = env_int('READ_YOUR_WRITES_SECONDS', 10)
+
+    # Rows per page of listings and search results
+    PAGE_SIZE = 30
+    MAX_PAGE_SIZE = 100
+
+    # Nearby venue searches: default and largest radius in km. Venues are
+    # geocoded from GAZETTEER_PATH, a CSV of city, state, latitude, longitude
+    NEARBY_RADIUS_KM = 25
+    NEARBY_MAX_RADIUS_KM = 500
+    GAZETTEER_PATH = os.environ.get('GAZETTEER_PATH')
+
+    # Longest window /api/v1/venues/<id>/availability answers for
+    AVAILABILITY_MAX_DAYS = 366
+    # Calendar feeds list shows from this many days ago on
+    CALENDAR_FEED_PAST_DAYS = 90
+
+    # Rendered page cache: 'memory' (per process), 'redis' or None to disable
+    PAGE_CACHE_BACKEND = 'memory'
+    PAGE_CACHE_REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    PAGE_CACHE_MAX_ENTRIES = 1024
+    PAGE_CACHE_TTL = 60
+
+    # Compiled templates are kept on disk (TEMPLATE_CACHE_DIR, default a
+    # private temporary directory) so new workers skip compiling them.
+    # Fragments ({% cache %} blocks) are kept in a per-process LRU.
+    TEMPLATE_BYTECODE_CACHE = True
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')
+    FRAGMENT_CACHE_MAX_ENTRIES = 10000
+
+    # Background jobs: 'database' queues them for `flask fyyur worker`,
+    # 'inline' runs them at once inside the enqueuing transaction
+    JOBS_EXECUTOR = os.environ.get('JOBS_EXECUTOR', 'database')
+    JOBS_MAX_ATTEMPTS = 5
+    JOBS_BACKOFF_SECONDS = 5
+    JOBS_MAX_BACKOFF_SECONDS = 3600
+    # Shows deleted per purge job of a deleted venue or artist
+    PURGE_BATCH_SIZE = 1000
+
+    # Request instrumentation: Server-Timing headers, /metrics and a log of
+    # requests slower than SLOW_REQUEST_MS (None to disable) with their
+    # slowest SLOW_REQUEST_STATEMENTS statements
+    SERVER_TIMING = True
+    SERVER_TIMING_STATEMENTS = False
+    SLOW_REQUEST_MS = env_int('SLOW_REQUEST_MS', 500)
+    SLOW_REQUEST_STATEMENTS = 20
+
+    # N+1 detection: flag statement shapes a request runs more than
+    # QUERY_REPEAT_THRESHOLD times, raising instead of logging when
+    # FYYUR_STRICT_QUERIES is set
+    QUERY_DETECTOR = False
+    QUERY_REPEAT_THRESHOLD = 3
+    STRICT_QUERIES = os.environ.get('FYYUR_STRICT_QUERIES', '') not in ('', '0')
+
+    # Cache-Control of read pages by endpoint; pages revalidate with ETags
+    CACHE_CONTROL_DEFAULT = 'public, no-cache'
+    CACHE_CONTROL = {
+        'search_venues': 'private, no-cache',
+        'search_artists': 'private, no-cache'
+    }
+
+
+class DevelopmentConfig(Config):
+    # Enable debug mode.
+    DEBUG = True
+    # List the slowest statements in Server-Timing too
+    SERVER_TIMING_STATEMENTS = True
+    QUERY_DETECTOR = True
+
+
+class ProductionConfig(Config):
+    # Every worker must sign sessions and CSRF tokens with the same key
+    SECRET_KEY = os.environ.get('SECRET_KEY')
+    # Each worker process has its own memory cache and sees only its own
+    # invalidations; use 'redis' to share pages between workers
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'memory')
+
+
+# Selected with the FYYUR_CONFIG environment variable
+CONFIGS = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig
+}
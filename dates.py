@@ -0,0 +1,106 @@
+"""Date and time formatting.
+
+Listings format the start time of every show they render, so the
+``datetime`` filter keeps this cheap: Babel patterns are compiled once per
+(format, locale) into plain functions, and formatted values are memoized.
+Start times stay datetimes from the query to the template; strings are
+still accepted and parsed.
+
+Naive datetimes are wall-clock times. Given a timezone (an IANA name, e.g.
+a venue's), they are shown as times in that zone, followed by its
+abbreviation on that date (EDT or EST); aware datetimes are converted to
+it first.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+import re
+from zoneinfo import ZoneInfo
+
+import babel
+from babel.dates import format_datetime as babel_format_datetime, parse_pattern
+import dateutil.parser
+
+
+# The app's named formats; other names are Babel's own or a Babel pattern
+PATTERNS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma"
+}
+BABEL_FORMATS = ('full', 'long', 'medium', 'short')
+
+FIELD = re.compile(r'%\((\w+)\)s')
+
+
+def datetime_fields(locale):
+    """Getters for the pattern fields compile_datetime_pattern supports."""
+    days = locale.days['format']
+    months = locale.months['format']
+    periods = locale.day_periods['format']['abbreviated']
+    return {
+        'EEEE': lambda value: days['wide'][value.weekday()],
+        'E': lambda value: days['abbreviated'][value.weekday()],
+        'EE': lambda value: days['abbreviated'][value.weekday()],
+        'EEE': lambda value: days['abbreviated'][value.weekday()],
+        'MMMM': lambda value: months['wide'][value.month],
+        'MMM': lambda value: months['abbreviated'][value.month],
+        'MM': lambda value: f'{value.month:02d}',
+        'M': lambda value: str(value.month),
+        'dd': lambda value: f'{value.day:02d}',
+        'd': lambda value: str(value.day),
+        'y': lambda value: str(value.year),
+        'h': lambda value: str(value.hour % 12 or 12),
+        'H': lambda value: str(value.hour),
+        'HH': lambda value: f'{value.hour:02d}',
+        'mm': lambda value: f'{value.minute:02d}',
+        'a': lambda value: periods['pm' if value.hour >= 12 else 'am'],
+    }
+
+
+def compile_datetime_pattern(pattern, locale):
+    """A function formatting a datetime as Babel formats pattern in locale.
+
+    Returns None for patterns using fields not in datetime_fields().
+    """
+    fields = datetime_fields(locale)
+    template = parse_pattern(pattern).format
+    names = FIELD.findall(template)
+    if any(name not in fields for name in names):
+        return None
+    getters = [(name, fields[name]) for name in names]
+    return lambda value: template % {name: get(value) for name, get in getters}
+
+
+@lru_cache(maxsize=None)
+def formatter(format, locale='en'):
+    """The function formatting datetimes as format in locale."""
+    locale = babel.Locale.parse(locale)
+    pattern = PATTERNS.get(format, format)
+    compiled = None if pattern in BABEL_FORMATS else compile_datetime_pattern(pattern, locale)
+    return compiled or (lambda value: babel_format_datetime(value, pattern, locale=locale))
+
+
+def parse_datetime(value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return dateutil.parser.parse(value)
+
+
+@lru_cache(maxsize=4096)
+def format_in_zone(value, format, tz, locale):
+    if tz is None:
+        return formatter(format, locale)(value)
+    zone = ZoneInfo(tz)
+    value = value.astimezone(zone) if value.tzinfo is not None else value.replace(tzinfo=zone)
+    return f'{formatter(format, locale)(value)} {value.tzname()}'
+
+
+def format_datetime(value, format='medium', tz=None, locale='en'):
+    """Format value ('full', 'medium', a Babel format or pattern), in zone tz."""
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if not tz and value.tzinfo is not None:
+        # equal instants in different zones must not share a memoized result
+        return formatter(format, locale)(value)
+    return format_in_zone(value, format, tz or None, locale)
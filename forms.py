@@ -1,8 +1,10 @@
+from bookings import MAX_DURATION
 from datetime import datetime
 from enum import Enum
 from flask_wtf import FlaskForm
-from wtforms import BooleanField, DateTimeField, IntegerField, SelectField, SelectMultipleField, StringField
-from wtforms.validators import DataRequired, NumberRange, Optional, Regexp, URL
+from wtforms import Form, BooleanField, DateTimeField, FloatField, IntegerField, SelectField, SelectMultipleField, StringField
+from wtforms.validators import DataRequired, NumberRange, Optional, Regexp, URL, ValidationError
+from zoneinfo import available_timezones
 
 
 class Genre(Enum):
@@ -89,13 +91,57 @@ class State(Enum):
         return [(c.value, c.value) for c in cls]
 
 
-class ShowForm(FlaskForm):
+TIMEZONES = [(name, name) for name in sorted(available_timezones()) if '/' in name and not name.startswith('Etc/')]
+
+
+# The *Fields forms hold the fields and validation rules and need no request
+# context, so bulk imports validate rows exactly like the web forms do.
+
+class ShowFields(Form):
     artist_id = IntegerField('artist_id', validators=[DataRequired(), NumberRange(min=0, max=999999999999)])
     venue_id = IntegerField('venue_id', validators=[DataRequired(), NumberRange(min=0, max=999999999999)])
     start_time = DateTimeField('start_time', validators=[DataRequired()], format="%Y-%m-%d %H:%M", default=datetime.today)
+    # blank for DEFAULT_DURATION after the start
+    end_time = DateTimeField('end_time', validators=[Optional()], format="%Y-%m-%d %H:%M")
+
+    def validate_end_time(form, field):
+        if form.start_time.data is None:
+            return
+        if not form.start_time.data < field.data <= form.start_time.data + MAX_DURATION:
+            raise ValidationError(f'Must be after the start time, by at most {MAX_DURATION.total_seconds() // 3600:.0f} hours')
+
+
+class ShowForm(FlaskForm, ShowFields):
+    pass
+
+
+class DateTimesField(DateTimeField):
+    """A DateTimeField reading any of several formats and showing the first."""
+
+    def __init__(self, label=None, validators=None, formats=('%Y-%m-%d %H:%M:%S',), **kwargs):
+        super().__init__(label, validators, format=formats[0], **kwargs)
+        self.formats = formats
 
+    def process_formdata(self, valuelist):
+        if valuelist:
+            value = ' '.join(valuelist)
+            for format in self.formats:
+                try:
+                    self.data = datetime.strptime(value, format)
+                    return
+                except ValueError:
+                    pass
+            self.data = None
+            raise ValueError(self.gettext('Not a valid datetime value'))
 
-class VenueForm(FlaskForm):
+
+class ShowImportFields(ShowFields):
+    # exports carry seconds, older ones don't; a missing start is an error, not now
+    start_time = DateTimesField('start_time', validators=[DataRequired()], formats=('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'))
+    end_time = DateTimesField('end_time', validators=[Optional()], formats=('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'))
+
+
+class VenueFields(Form):
     name = StringField('name', validators=[DataRequired()])
     city = StringField('city', validators=[DataRequired()])
     state = SelectField('state', validators=[DataRequired()], choices=State.list())
@@ -107,9 +153,21 @@ class VenueForm(FlaskForm):
     website_link = StringField('website_link', validators=[Optional(), URL()])
     seeking_talent = BooleanField('seeking_talent')
     seeking_description = StringField('seeking_description')
+    timezone = SelectField('timezone', validators=[Optional()], choices=[('', 'Not set')] + TIMEZONES,
+                           filters=[lambda value: value or None])
+
+
+class VenueForm(FlaskForm, VenueFields):
+    pass
 
 
-class ArtistForm(FlaskForm):
+class VenueImportFields(VenueFields):
+    # set by geocoding rather than the venue forms
+    latitude = FloatField('latitude', validators=[Optional(), NumberRange(-90, 90)])
+    longitude = FloatField('longitude', validators=[Optional(), NumberRange(-180, 180)])
+
+
+class ArtistFields(Form):
     name = StringField('name', validators=[DataRequired()])
     city = StringField('city', validators=[DataRequired()])
     state = SelectField('state', validators=[DataRequired()], choices=State.list())
@@ -120,3 +178,7 @@ class ArtistForm(FlaskForm):
     website_link = StringField('website_link', validators=[Optional(), URL()])
     seeking_venue = BooleanField('seeking_venue')
     seeking_description = StringField('seeking_description')
+
+
+class ArtistForm(FlaskForm, ArtistFields):
+    pass
@@ -0,0 +1,74 @@
+"""Genre storage.
+
+Venues and artists store their genres as ``smallint[]`` codes, each the
+position of the genre in ``forms.Genre`` (from 1), with a GIN index for
+containment (``genres @> '{11}'``). The ``GenreList`` column type converts
+to and from the display names, so models, forms, imports and the API
+keep handling names.
+
+Codes are positions: add new genres at the end of ``forms.Genre``, never
+reorder or remove them, and recreate ``genre_names()`` (used by the
+search trigger) in the migration adding them.
+"""
+
+from sqlalchemy import DDL, JSON, SmallInteger, cast, column, exists, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import TypeDecorator
+
+from forms import Genre
+
+
+GENRE_NAMES = [genre.value for genre in Genre]
+GENRE_CODES = {name: code for code, name in enumerate(GENRE_NAMES, 1)}
+
+
+class UnknownGenre(ValueError):
+    pass
+
+
+def genre_code(name):
+    try:
+        return GENRE_CODES[name]
+    except KeyError:
+        raise UnknownGenre(f'unknown genre {name!r}') from None
+
+
+class GenreList(TypeDecorator):
+    """Genre names, stored as smallint[] codes (JSON codes on SQLite)."""
+
+    impl = ARRAY(SmallInteger)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(ARRAY(SmallInteger))
+        return dialect.type_descriptor(JSON())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return [genre_code(name) for name in value]
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return [GENRE_NAMES[code - 1] for code in value]
+
+
+def genre_filter(model, name, dialect):
+    """Clause matching rows of model listing genre name."""
+    code = genre_code(name)
+    if dialect == 'postgresql':
+        return model.genres.op('@>')(cast([code], ARRAY(SmallInteger)))
+    codes = func.json_each(model.genres).table_valued('value')
+    return exists(select([1]).select_from(codes).where(column('value')==code))
+
+
+def genre_names_ddl():
+    """DDL for genre_names(smallint[]), the names of codes joined by spaces."""
+    names = ', '.join("'" + name.replace("'", "''") + "'" for name in GENRE_NAMES)
+    return DDL(f'''
+        CREATE OR REPLACE FUNCTION genre_names(codes smallint[]) RETURNS text AS $$
+            SELECT array_to_string(ARRAY(SELECT (ARRAY[{names}])[code] FROM unnest(codes) AS code), ' ')
+        $$ LANGUAGE sql IMMUTABLE
+    ''').execute_if(dialect='postgresql')
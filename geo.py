@@ -0,0 +1,192 @@
+"""Venue coordinates and nearby search.
+
+Venues carry a latitude, a longitude and the geohash of that point, filled
+offline from a gazetteer (``flask fyyur geocode-venues``). Points close to
+each other share geohash prefixes, so "venues near here" is a handful of
+B-tree range scans: ``geohash_clause()`` covers the search box with at
+most MAX_CELLS geohash cells, and exact distances are only computed for
+the venues in them. No PostGIS is needed, and SQLite works the same way.
+
+Geohash order is byte order, so on Postgres the column uses the "C"
+collation for range scans to follow it.
+"""
+
+from collections import namedtuple
+import csv
+from math import asin, cos, degrees, floor, radians, sin, sqrt
+
+from sqlalchemy import and_, or_
+
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 12
+EARTH_RADIUS_KM = 6371.0088
+# Most geohash cells a search box is covered with
+MAX_CELLS = 16
+
+# west > east for boxes crossing the antimeridian
+Box = namedtuple('Box', 'south west north east')
+
+
+class InvalidLocation(ValueError):
+    pass
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """The geohash of a point."""
+    ranges = [[-180.0, 180.0], [-90.0, 90.0]]
+    values = [longitude, latitude]
+    chars, code = [], 0
+    for bit in range(precision * 5):
+        bounds, value = ranges[bit % 2], values[bit % 2]
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >= middle:
+            code = code * 2 + 1
+            bounds[0] = middle
+        else:
+            code *= 2
+            bounds[1] = middle
+        if bit % 5 == 4:
+            chars.append(BASE32[code])
+            code = 0
+    return ''.join(chars)
+
+
+def geohash_of(latitude, longitude):
+    if latitude is None or longitude is None:
+        return None
+    return encode(latitude, longitude)
+
+
+def distance_km(latitude, longitude, other_latitude, other_longitude):
+    """Great-circle (haversine) distance between two points."""
+    latitude, other_latitude = radians(latitude), radians(other_latitude)
+    half_lat = (other_latitude - latitude) / 2
+    half_lng = radians(other_longitude - longitude) / 2
+    a = sin(half_lat) ** 2 + cos(latitude) * cos(other_latitude) * sin(half_lng) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+
+def check_point(latitude, longitude):
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise InvalidLocation(f'no such point {latitude}, {longitude}')
+
+
+def radius_box(latitude, longitude, radius_km):
+    """The smallest box containing every point within radius_km of a point."""
+    check_point(latitude, longitude)
+    if not radius_km > 0:
+        raise InvalidLocation('the radius must be positive')
+    angle = radius_km / EARTH_RADIUS_KM
+    south, north = latitude - degrees(angle), latitude + degrees(angle)
+    if south <= -90 or north >= 90 or sin(angle) >= cos(radians(latitude)):
+        # the circle reaches a pole: every longitude
+        return Box(max(south, -90.0), -180.0, min(north, 90.0), 180.0)
+    spread = degrees(asin(sin(angle) / cos(radians(latitude))))
+    west, east = longitude - spread, longitude + spread
+    return Box(south, west + 360 if west < -180 else west, north, east - 360 if east > 180 else east)
+
+
+def parse_box(value):
+    """A Box from 'south,west,north,east'."""
+    try:
+        south, west, north, east = map(float, value.split(','))
+    except ValueError:
+        raise InvalidLocation(f'bad box {value!r}') from None
+    check_point(south, west)
+    check_point(north, east)
+    if south > north:
+        raise InvalidLocation('the south edge of the box is north of its north edge')
+    return Box(south, west, north, east)
+
+
+def box_center(box):
+    east = box.east if box.west <= box.east else box.east + 360
+    longitude = (box.west + east) / 2
+    return (box.south + box.north) / 2, longitude - 360 if longitude > 180 else longitude
+
+
+def in_box(box, latitude, longitude):
+    if not box.south <= latitude <= box.north:
+        return False
+    if box.west <= box.east:
+        return box.west <= longitude <= box.east
+    return longitude >= box.west or longitude <= box.east
+
+
+def cell_size(precision):
+    """(height, width) in degrees of the geohash cells of a precision."""
+    bits = precision * 5
+    return 180 / 2 ** (bits // 2), 360 / 2 ** ((bits + 1) // 2)
+
+
+def cells(box, precision):
+    """Geohashes of the cells of a precision overlapping box."""
+    height, width = cell_size(precision)
+    rows = round(180 / height)
+    columns = round(360 / width)
+    east = box.east if box.west <= box.east else box.east + 360
+    first_column = floor((box.west + 180) / width)
+    column_count = min(floor((east + 180) / width) - first_column + 1, columns)
+    for row in range(floor((box.south + 90) / height), min(floor((box.north + 90) / height), rows - 1) + 1):
+        for column in range(first_column, first_column + column_count):
+            yield encode(-90 + (row + 0.5) * height, -180 + (column % columns + 0.5) * width, precision)
+
+
+def cell_count(box, precision):
+    height, width = cell_size(precision)
+    east = box.east if box.west <= box.east else box.east + 360
+    rows = min(floor((box.north + 90) / height), round(180 / height) - 1) - floor((box.south + 90) / height) + 1
+    columns = min(floor((east + 180) / width) - floor((box.west + 180) / width) + 1, round(360 / width))
+    return rows * columns
+
+
+def successor(prefix):
+    """The least geohash after every geohash starting with prefix, or None."""
+    prefix = prefix.rstrip('z')
+    if not prefix:
+        return None
+    return prefix[:-1] + BASE32[BASE32.index(prefix[-1]) + 1]
+
+
+def cover(box):
+    """Geohash ranges [low, high) covering box, high None when unbounded.
+
+    Uses the finest precision needing at most MAX_CELLS cells, and merges
+    cells that are consecutive in geohash order.
+    """
+    precision = next((precision for precision in range(PRECISION, 0, -1)
+                      if cell_count(box, precision) <= MAX_CELLS), 1)
+    ranges = []
+    for prefix in sorted(set(cells(box, precision))):
+        if ranges and ranges[-1][1] is not None and prefix.rstrip('0') <= ranges[-1][1]:
+            ranges[-1][1] = successor(prefix)
+        else:
+            ranges.append([prefix, successor(prefix)])
+    return [tuple(bounds) for bounds in ranges]
+
+
+def geohash_clause(column, box):
+    """Clause keeping rows whose geohash column is in a cell covering box."""
+    return or_(*[and_(column >= low, column < high) if high is not None else column >= low
+                 for low, high in cover(box)])
+
+
+def load_gazetteer(path):
+    """{(city, state): (latitude, longitude)} from a CSV gazetteer.
+
+    The file has a header row and city, state (two-letter code), latitude
+    and longitude columns; other columns are ignored. Cities are matched
+    case-insensitively.
+    """
+    places = {}
+    with open(path, newline='', encoding='utf-8') as source:
+        for row in csv.DictReader(source):
+            latitude, longitude = float(row['latitude']), float(row['longitude'])
+            check_point(latitude, longitude)
+            places[place_key(row['city'], row['state'])] = (latitude, longitude)
+    return places
+
+
+def place_key(city, state):
+    return ' '.join(city.split()).casefold(), state.strip().upper()
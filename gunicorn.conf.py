@@ -0,0 +1,36 @@
+# Production server: gunicorn -c gunicorn.conf.py wsgi:application
+import multiprocessing
+import os
+
+os.environ.setdefault('FYYUR_CONFIG', 'production')
+os.environ['FYYUR_SERVING'] = '1'
+
+from config import CONFIGS
+from serving import check_config_budget
+
+app_config = CONFIGS[os.environ['FYYUR_CONFIG']]
+
+bind = os.environ.get('BIND', f'0.0.0.0:{os.environ.get("PORT", 8000)}')
+
+# Processes for CPU, threads for waiting on the database. Each thread
+# holds at most one connection, so threads match the pool and no request
+# waits on it; the budget check below bounds the number of workers.
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('THREADS', app_config.SQLALCHEMY_ENGINE_OPTIONS.get('pool_size', 5)))
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to bound memory growth
+max_requests = 1000
+max_requests_jitter = 100
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    # Fail fast, before forking, if the pools cannot all connect
+    needed, available = check_config_budget(app_config, server.cfg.workers)
+    server.log.info('Connection budget: %s of %s connections', needed, available)
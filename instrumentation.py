@@ -0,0 +1,216 @@
+"""Per-request query and timing instrumentation.
+
+Every request records its SQL statements with their durations and the
+time spent rendering templates. The totals are sent back in a
+``Server-Timing`` header, aggregated into route-labelled Prometheus
+histograms served at ``/metrics``, and requests slower than
+``SLOW_REQUEST_MS`` are logged with their statements.
+
+Metrics are kept per process; scrape every worker or aggregate upstream.
+Streamed responses are measured up to the start of the stream.
+"""
+
+from bisect import bisect_left
+from threading import Lock
+import time
+
+from flask import Response, g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+PROMETHEUS = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Prometheus histogram with labels, safe to share between threads."""
+
+    def __init__(self, name, help, labels, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+        self.lock = Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                # per-bucket counts (plus +Inf), sum, count
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = sorted((labels, [list(counts), total, count]) for labels, (counts, total, count) in self.series.items())
+        for label_values, (counts, total, count) in series:
+            labels = ','.join(f'{name}="{escape(value)}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        self.lock = Lock()
+
+    def inc(self, *label_values):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self.lock:
+            values = sorted(self.values.items())
+        for label_values, value in values:
+            labels = ','.join(f'{name}="{escape(value)}"' for name, value in zip(self.labels, label_values))
+            lines.append(f'{self.name}{{{labels}}} {value}')
+        return lines
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestStats:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = []
+        self.db_time = 0.0
+        self.render_time = 0.0
+
+    def slowest(self, count):
+        return sorted(self.statements, key=lambda statement: statement[1], reverse=True)[:count]
+
+
+def current_stats():
+    if has_request_context():
+        return g.get('request_stats')
+    return None
+
+
+class TimedTemplate(Template):
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            stats = current_stats()
+            if stats is not None:
+                stats.render_time += time.perf_counter() - started
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['query_started'].pop()
+    # queries run out of the request's context (asyncdb.fan_out) carry its stats
+    stats = current_stats() or (context.execution_options.get('request_stats') if context is not None else None)
+    if stats is not None:
+        stats.statements.append((statement, duration))
+        stats.db_time += duration
+
+
+def handle_error(context):
+    # the failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get('query_started'):
+        context.connection.info['query_started'].pop()
+
+
+class RequestMetrics:
+    """Instrument the requests of app.
+
+    Config: SERVER_TIMING (send the header), SERVER_TIMING_STATEMENTS (also
+    list the slowest statements in it, which exposes SQL to clients),
+    SLOW_REQUEST_MS (log slower requests) and SLOW_REQUEST_STATEMENTS.
+    """
+
+    def __init__(self, app=None):
+        self.requests = Counter('fyyur_requests_total', 'Requests served.', ('endpoint', 'method', 'status'))
+        self.duration = Histogram('fyyur_request_duration_seconds', 'Time to build the response.', ('endpoint', 'method'))
+        self.db_duration = Histogram('fyyur_request_db_seconds', 'Time spent in SQL statements.', ('endpoint', 'method'))
+        self.render_duration = Histogram('fyyur_request_render_seconds', 'Time spent rendering templates.', ('endpoint', 'method'))
+        self.queries = Histogram('fyyur_request_queries', 'SQL statements run.', ('endpoint', 'method'), QUERY_BUCKETS)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.jinja_env.template_class = TimedTemplate
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.add_url_rule('/metrics', 'metrics', self.expose)
+        if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+            event.listen(Engine, 'handle_error', handle_error)
+
+    def before_request(self):
+        g.request_stats = RequestStats()
+
+    def after_request(self, response):
+        stats = current_stats()
+        if stats is None or request.endpoint in ('metrics', 'static'):
+            return response
+        total = time.perf_counter() - stats.started
+        labels = (request.endpoint or 'unmatched', request.method)
+        self.requests.inc(*labels, response.status_code)
+        self.duration.observe(total, *labels)
+        self.db_duration.observe(stats.db_time, *labels)
+        self.render_duration.observe(stats.render_time, *labels)
+        self.queries.observe(len(stats.statements), *labels)
+        config = self.app.config
+        if config.get('SERVER_TIMING', True):
+            response.headers['Server-Timing'] = self.server_timing(stats, total)
+        threshold = config.get('SLOW_REQUEST_MS')
+        if threshold is not None and total * 1000 >= threshold:
+            self.log_slow_request(stats, total, response.status_code)
+        return response
+
+    def server_timing(self, stats, total):
+        metrics = [
+            f'db;dur={stats.db_time * 1000:.1f};desc="{len(stats.statements)} queries"',
+            f'render;dur={stats.render_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}'
+        ]
+        if self.app.config.get('SERVER_TIMING_STATEMENTS'):
+            for number, (statement, duration) in enumerate(stats.slowest(3), start=1):
+                summary = ' '.join(statement.split())[:80].replace('\\', '').replace('"', "'")
+                metrics.append(f'sql-{number};dur={duration * 1000:.1f};desc="{summary}"')
+        return ', '.join(metrics)
+
+    def log_slow_request(self, stats, total, status):
+        statements = '\n'.join(
+            f'    {duration * 1000:8.1f} ms  {" ".join(statement.split())}'
+            for statement, duration in stats.slowest(self.app.config.get('SLOW_REQUEST_STATEMENTS', 20)))
+        self.app.logger.warning(
+            'Slow request %s %s -> %s: %.0f ms, %d queries in %.0f ms, render %.0f ms\n%s',
+            request.method, request.full_path.rstrip('?'), status, total * 1000, len(stats.statements),
+            stats.db_time * 1000, stats.render_time * 1000, statements)
+
+    def expose(self):
+        lines = []
+        for metric in (self.requests, self.duration, self.db_duration, self.render_duration, self.queries):
+            lines += metric.expose()
+        return Response('\n'.join(lines) + '\n', content_type=PROMETHEUS)
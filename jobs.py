@@ -0,0 +1,99 @@
+"""Database-backed background jobs.
+
+Handlers commit their primary change and enqueue follow-up work in the
+same transaction, so a job exists exactly when the change it follows up
+does. ``flask fyyur worker`` claims due jobs with ``FOR UPDATE SKIP
+LOCKED``, so any number of workers share the queue without blocking
+each other. A job that raises is retried with exponential backoff, and
+is marked failed after ``JOBS_MAX_ATTEMPTS`` attempts.
+
+With ``JOBS_EXECUTOR = 'inline'`` (tests, one-off scripts) jobs run as
+soon as they are enqueued, inside the caller's transaction.
+
+Tasks must not commit: the worker runs each in a savepoint and commits
+it together with the job's removal from the queue.
+"""
+
+from datetime import datetime, timedelta
+import time
+import traceback
+
+
+class JobQueue:
+
+    def __init__(self, db, model, config, after_commit=lambda result: None):
+        """after_commit(result) runs with each task's return value once it commits."""
+        self.db = db
+        self.model = model
+        self.config = config
+        self.after_commit = after_commit
+        self.tasks = {}
+
+    def task(self, name):
+        def decorator(function):
+            self.tasks[name] = function
+            return function
+        return decorator
+
+    def enqueue(self, name, delay=0, **payload):
+        """Add a job to the current transaction; it runs once that commits."""
+        if name not in self.tasks:
+            raise KeyError(f'unknown job {name}')
+        if self.config.get('JOBS_EXECUTOR', 'database') == 'inline':
+            self.after_commit(self.tasks[name](**payload))
+            return None
+        job = self.model(name=name, payload=payload, run_at=datetime.utcnow() + timedelta(seconds=delay))
+        self.db.session.add(job)
+        return job
+
+    def claim(self):
+        """Lock the next due job, skipping jobs other workers hold."""
+        model = self.model
+        return model.query \
+            .filter(model.status=='queued', model.run_at<=datetime.utcnow()) \
+            .order_by(model.run_at, model.id) \
+            .with_for_update(skip_locked=True) \
+            .first()
+
+    def backoff(self, attempts):
+        base = self.config.get('JOBS_BACKOFF_SECONDS', 5)
+        return timedelta(seconds=min(base * 2 ** (attempts - 1), self.config.get('JOBS_MAX_BACKOFF_SECONDS', 3600)))
+
+    def run_once(self):
+        """Run the next due job. Returns (job name, error or None), or None when idle."""
+        session = self.db.session
+        job = self.claim()
+        if job is None:
+            session.rollback()
+            return None
+        name = job.name
+        try:
+            with session.begin_nested():
+                result = self.tasks[name](**job.payload)
+        except Exception as error:
+            job.attempts += 1
+            job.last_error = ''.join(traceback.format_exception_only(type(error), error)).strip()
+            if job.attempts >= self.config.get('JOBS_MAX_ATTEMPTS', 5):
+                job.status = 'failed'
+            else:
+                job.run_at = datetime.utcnow() + self.backoff(job.attempts)
+            session.commit()
+            return name, error
+        session.delete(job)
+        session.commit()
+        self.after_commit(result)
+        return name, None
+
+    def work(self, poll_interval=1.0, until_idle=False, should_stop=lambda: False, report=lambda name, error: None):
+        """Run jobs until should_stop(), or no job is due with until_idle."""
+        ran = 0
+        while not should_stop():
+            outcome = self.run_once()
+            if outcome is None:
+                if until_idle:
+                    break
+                time.sleep(poll_interval)
+                continue
+            ran += 1
+            report(*outcome)
+        return ran
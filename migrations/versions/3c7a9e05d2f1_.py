@@ -0,0 +1,26 @@
+"""add venue time zones, copied into show listings
+
+Revision ID: 3c7a9e05d2f1
+Revises: b58e1d3f9a72
+Create Date: 2026-10-18 21:36:09.511842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c7a9e05d2f1'
+down_revision = 'b58e1d3f9a72'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venues', sa.Column('timezone', sa.String(length=64), nullable=True))
+    op.add_column('show_listings', sa.Column('venue_timezone', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    op.drop_column('show_listings', 'venue_timezone')
+    op.drop_column('venues', 'timezone')
@@ -0,0 +1,39 @@
+"""add end_time to show_listings for calendar feeds
+
+Revision ID: 4a8d2f6e1c57
+Revises: e7b3c9d14a82
+Create Date: 2026-10-19 18:22:37.905164
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a8d2f6e1c57'
+down_revision = 'e7b3c9d14a82'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+COPY_END_TIME = '''UPDATE show_listings SET end_time = shows.end_time FROM shows
+                   WHERE shows.id = show_listings.show_id'''
+
+
+def upgrade():
+    op.add_column('show_listings', sa.Column('end_time', sa.DateTime(), nullable=True))
+    bind = op.get_bind()
+    update = sa.text(f'{COPY_END_TIME} AND show_listings.show_id >= :low AND show_listings.show_id < :high')
+    with op.get_context().autocommit_block():
+        low, high = bind.execute(sa.text('SELECT min(show_id), max(show_id) FROM show_listings')).one()
+        if low is not None:
+            for start in range(low, high + 1, BATCH_SIZE):
+                bind.execute(update, {'low': start, 'high': start + BATCH_SIZE})
+    # listings added during the batches
+    bind.execute(sa.text(f'{COPY_END_TIME} AND show_listings.end_time IS NULL'))
+    op.alter_column('show_listings', 'end_time', nullable=False)
+
+
+def downgrade():
+    op.drop_column('show_listings', 'end_time')
@@ -0,0 +1,32 @@
+"""add indexes for show, venue and artist listings
+
+Revision ID: 5e8a03b6d914
+Revises: c41d9e7f2a60
+Create Date: 2026-10-18 14:26:53.880417
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8a03b6d914'
+down_revision = 'c41d9e7f2a60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Trailing id columns let keyset pages on (..., id) read straight off the index
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time', 'id'], unique=False)
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time', 'id'], unique=False)
+    op.create_index('ix_shows_start_time', 'shows', ['start_time', 'id'], unique=False)
+    op.create_index('ix_venues_state_city_name_id', 'venues', ['state', 'city', 'name', 'id'], unique=False)
+    op.create_index('ix_artists_name_id', 'artists', ['name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_artists_name_id', table_name='artists')
+    op.drop_index('ix_venues_state_city_name_id', table_name='venues')
+    op.drop_index('ix_shows_start_time', table_name='shows')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
@@ -0,0 +1,115 @@
+"""store genres as smallint codes with GIN indexes
+
+Revision ID: 6b1f4d8e2c95
+Revises: 3c7a9e05d2f1
+Create Date: 2026-10-18 22:18:44.073512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '6b1f4d8e2c95'
+down_revision = '3c7a9e05d2f1'
+branch_labels = None
+depends_on = None
+
+# forms.Genre as of this revision; a genre's code is its position, from 1
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Heavy Metal', 'Hip-Hop',
+          'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul', 'Other']
+OTHER = GENRES.index('Other') + 1
+
+BATCH_SIZE = 5000
+
+# Arrays of names mapped to codes (unknown names become Other) and back,
+# given the GENRES array and the array to map
+TO_CODES = f'''ARRAY(
+    SELECT coalesce(array_position({{names}}, name), {OTHER})::smallint
+    FROM unnest({{genres}}) WITH ORDINALITY AS g(name, position) ORDER BY position)'''
+TO_NAMES = '''ARRAY(
+    SELECT ({names})[code]
+    FROM unnest({genres}) WITH ORDINALITY AS g(code, position) ORDER BY position)'''
+GENRES_PARAMETER = 'CAST(:genres AS text[])'
+GENRES_LITERAL = 'ARRAY[' + ', '.join("'" + name.replace("'", "''") + "'" for name in GENRES) + ']::text[]'
+
+
+def search_trigger(table, genres_text):
+    op.execute(f'''
+        CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')), 'B') ||
+                setweight(to_tsvector('simple', coalesce({genres_text}, '')), 'C');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    op.execute(f'''
+        CREATE TRIGGER {table}_search_vector_update
+            BEFORE INSERT OR UPDATE OF name, city, state, genres ON {table}
+            FOR EACH ROW EXECUTE PROCEDURE {table}_search_vector_update()
+    ''')
+
+
+def convert(table, column_type, expression):
+    """Fill table.new_genres from genres, committing every BATCH_SIZE ids.
+
+    The table stays writable meanwhile: a trigger converts the genres of
+    every row inserted or updated from before the first batch, so rows
+    already converted never go stale. The columns are swapped with the
+    table locked.
+    """
+    op.add_column(table, sa.Column('new_genres', column_type, nullable=True))
+    op.execute(f'''
+        CREATE FUNCTION {table}_new_genres_sync() RETURNS trigger AS $$
+        BEGIN
+            NEW.new_genres := {expression.format(names=GENRES_LITERAL, genres='NEW.genres')};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    op.execute(f'''
+        CREATE TRIGGER {table}_new_genres_sync
+            BEFORE INSERT OR UPDATE OF genres ON {table}
+            FOR EACH ROW EXECUTE PROCEDURE {table}_new_genres_sync()
+    ''')
+    bind = op.get_bind()
+    converted = expression.format(names=GENRES_PARAMETER, genres='genres')
+    update = sa.text(f'UPDATE {table} SET new_genres = {converted} WHERE id >= :low AND id < :high')
+    with op.get_context().autocommit_block():
+        low, high = bind.execute(sa.text(f'SELECT min(id), max(id) FROM {table}')).one()
+        if low is not None:
+            for start in range(low, high + 1, BATCH_SIZE):
+                bind.execute(update, {'genres': GENRES, 'low': start, 'high': start + BATCH_SIZE})
+    op.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+    # nothing should be left between the trigger and the batches; make sure
+    bind.execute(sa.text(f'UPDATE {table} SET new_genres = {converted} WHERE new_genres IS NULL'), {'genres': GENRES})
+    op.execute(f'DROP TRIGGER {table}_new_genres_sync ON {table}')
+    op.execute(f'DROP FUNCTION {table}_new_genres_sync()')
+    op.execute(f'DROP TRIGGER {table}_search_vector_update ON {table}')
+    op.drop_column(table, 'genres')
+    op.alter_column(table, 'new_genres', new_column_name='genres', nullable=False)
+
+
+def upgrade():
+    names = ', '.join("'" + name.replace("'", "''") + "'" for name in GENRES)
+    op.execute(f'''
+        CREATE OR REPLACE FUNCTION genre_names(codes smallint[]) RETURNS text AS $$
+            SELECT array_to_string(ARRAY(SELECT (ARRAY[{names}])[code] FROM unnest(codes) AS code), ' ')
+        $$ LANGUAGE sql IMMUTABLE
+    ''')
+    for table in ('venues', 'artists'):
+        convert(table, postgresql.ARRAY(sa.SmallInteger()), TO_CODES)
+        search_trigger(table, 'genre_names(NEW.genres)')
+        op.create_index(f'ix_{table}_genres', table, ['genres'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    for table in ('artists', 'venues'):
+        op.drop_index(f'ix_{table}_genres', table_name=table)
+        convert(table, postgresql.ARRAY(sa.String()), TO_NAMES)
+        search_trigger(table, "array_to_string(NEW.genres, ' ')")
+    op.execute('DROP FUNCTION genre_names(smallint[])')
@@ -0,0 +1,42 @@
+"""add show counters to venues and artists
+
+Revision ID: 8f2c4e1a7b3d
+Revises: 35b969e02ad9
+Create Date: 2026-10-18 09:12:41.118204
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f2c4e1a7b3d'
+down_revision = '35b969e02ad9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app counts against its own naive local clock, not the database's
+    now = datetime.now()
+    for table, foreign_key in (('venues', 'venue_id'), ('artists', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('next_show_time', sa.DateTime(), nullable=True))
+        op.create_index(op.f(f'ix_{table}_next_show_time'), table, ['next_show_time'], unique=False)
+        op.execute(sa.text(f'''
+            UPDATE {table} SET
+                upcoming_shows_count = (SELECT count(*) FROM shows WHERE shows.{foreign_key} = {table}.id AND shows.start_time >= :now),
+                past_shows_count = (SELECT count(*) FROM shows WHERE shows.{foreign_key} = {table}.id AND shows.start_time < :now),
+                next_show_time = (SELECT min(start_time) FROM shows WHERE shows.{foreign_key} = {table}.id AND shows.start_time >= :now)
+        ''').bindparams(now=now))
+
+
+def downgrade():
+    for table in ('artists', 'venues'):
+        op.drop_index(op.f(f'ix_{table}_next_show_time'), table_name=table)
+        op.drop_column(table, 'next_show_time')
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
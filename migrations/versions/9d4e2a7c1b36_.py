@@ -0,0 +1,31 @@
+"""add venue coordinates and geohash index
+
+Revision ID: 9d4e2a7c1b36
+Revises: 6b1f4d8e2c95
+Create Date: 2026-10-19 10:12:47.208531
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4e2a7c1b36'
+down_revision = '6b1f4d8e2c95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # venues stay without coordinates until `flask fyyur geocode-venues`
+    op.add_column('venues', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('venues', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('venues', sa.Column('geohash', sa.String(length=12, collation='C'), nullable=True))
+    op.create_index('ix_venues_geohash', 'venues', ['geohash'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_venues_geohash', table_name='venues')
+    op.drop_column('venues', 'geohash')
+    op.drop_column('venues', 'longitude')
+    op.drop_column('venues', 'latitude')
@@ -0,0 +1,30 @@
+"""add updated_at to venues, artists and shows
+
+Revision ID: a7c5f1e9d208
+Revises: 5e8a03b6d914
+Create Date: 2026-10-18 16:02:19.447631
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c5f1e9d208'
+down_revision = '5e8a03b6d914'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venues', 'artists', 'shows'):
+        # The server default backfills existing rows; the app sets it from then on
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), server_default=sa.text("timezone('utc', now())"), nullable=False))
+        op.alter_column(table, 'updated_at', server_default=None)
+        op.create_index(op.f(f'ix_{table}_updated_at'), table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in ('shows', 'artists', 'venues'):
+        op.drop_index(op.f(f'ix_{table}_updated_at'), table_name=table)
+        op.drop_column(table, 'updated_at')
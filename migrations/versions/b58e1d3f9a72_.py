@@ -0,0 +1,34 @@
+"""soft-delete venues and artists, cascading shows in the database
+
+Revision ID: b58e1d3f9a72
+Revises: f2a6c8d40b17
+Create Date: 2026-10-18 20:04:51.226190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b58e1d3f9a72'
+down_revision = 'f2a6c8d40b17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('venues', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.add_column('artists', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.drop_constraint('shows_venue_id_fkey', 'shows', type_='foreignkey')
+    op.drop_constraint('shows_artist_id_fkey', 'shows', type_='foreignkey')
+    op.create_foreign_key('shows_venue_id_fkey', 'shows', 'venues', ['venue_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('shows_artist_id_fkey', 'shows', 'artists', ['artist_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    op.drop_constraint('shows_artist_id_fkey', 'shows', type_='foreignkey')
+    op.drop_constraint('shows_venue_id_fkey', 'shows', type_='foreignkey')
+    op.create_foreign_key('shows_artist_id_fkey', 'shows', 'artists', ['artist_id'], ['id'])
+    op.create_foreign_key('shows_venue_id_fkey', 'shows', 'venues', ['venue_id'], ['id'])
+    op.drop_column('artists', 'deleted_at')
+    op.drop_column('venues', 'deleted_at')
@@ -0,0 +1,52 @@
+"""add full-text and trigram search indexes
+
+Revision ID: c41d9e7f2a60
+Revises: 8f2c4e1a7b3d
+Create Date: 2026-10-18 11:40:07.532918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d9e7f2a60'
+down_revision = '8f2c4e1a7b3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        op.execute(f'''
+            CREATE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector :=
+                    setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+                    setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')), 'B') ||
+                    setweight(to_tsvector('simple', coalesce(array_to_string(NEW.genres, ' '), '')), 'C');
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        ''')
+        op.execute(f'''
+            CREATE TRIGGER {table}_search_vector_update
+                BEFORE INSERT OR UPDATE OF name, city, state, genres ON {table}
+                FOR EACH ROW EXECUTE PROCEDURE {table}_search_vector_update()
+        ''')
+        # Fire the trigger once for every existing row
+        op.execute(f'UPDATE {table} SET name = name')
+        op.create_index(f'ix_{table}_search_vector', table, ['search_vector'], unique=False, postgresql_using='gin')
+        op.create_index(f'ix_{table}_name_trgm', table, ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in ('artists', 'venues'):
+        op.drop_index(f'ix_{table}_name_trgm', table_name=table)
+        op.drop_index(f'ix_{table}_search_vector', table_name=table)
+        op.execute(f'DROP TRIGGER {table}_search_vector_update ON {table}')
+        op.execute(f'DROP FUNCTION {table}_search_vector_update()')
+        op.drop_column(table, 'search_vector')
@@ -0,0 +1,52 @@
+"""add the show_listings read model
+
+Revision ID: d93b27e4c815
+Revises: a7c5f1e9d208
+Create Date: 2026-10-18 17:40:52.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93b27e4c815'
+down_revision = 'a7c5f1e9d208'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('show_listings',
+    sa.Column('show_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('venue_name', sa.String(length=120), nullable=False),
+    sa.Column('venue_city', sa.String(length=120), nullable=False),
+    sa.Column('venue_state', sa.String(length=120), nullable=False),
+    sa.Column('venue_image_link', sa.String(length=500), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('artist_name', sa.String(length=120), nullable=False),
+    sa.Column('artist_image_link', sa.String(length=500), nullable=False),
+    sa.ForeignKeyConstraint(['show_id'], ['shows.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('show_id')
+    )
+    op.execute('''
+        INSERT INTO show_listings (show_id, start_time, venue_id, venue_name, venue_city, venue_state,
+                                   venue_image_link, artist_id, artist_name, artist_image_link)
+        SELECT shows.id, shows.start_time, venues.id, venues.name, venues.city, venues.state,
+               venues.image_link, artists.id, artists.name, artists.image_link
+        FROM shows
+        JOIN venues ON venues.id = shows.venue_id
+        JOIN artists ON artists.id = shows.artist_id
+    ''')
+    op.create_index('ix_show_listings_start_time', 'show_listings', ['start_time', 'show_id'], unique=False)
+    op.create_index('ix_show_listings_venue_id_start_time', 'show_listings', ['venue_id', 'start_time', 'show_id'], unique=False)
+    op.create_index('ix_show_listings_artist_id_start_time', 'show_listings', ['artist_id', 'start_time', 'show_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_listings_artist_id_start_time', table_name='show_listings')
+    op.drop_index('ix_show_listings_venue_id_start_time', table_name='show_listings')
+    op.drop_index('ix_show_listings_start_time', table_name='show_listings')
+    op.drop_table('show_listings')
@@ -0,0 +1,72 @@
+"""add show end times and exclusion constraints against double booking
+
+Revision ID: e7b3c9d14a82
+Revises: 9d4e2a7c1b36
+Create Date: 2026-10-19 13:41:05.617294
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3c9d14a82'
+down_revision = '9d4e2a7c1b36'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+# bookings.DEFAULT_DURATION and MAX_DURATION as of this revision
+DEFAULT_DURATION = "interval '2 hours'"
+MAX_DURATION = "interval '24 hours'"
+
+# Existing shows last DEFAULT_DURATION, or until the next show of their
+# venue or artist starts, so they never overlap
+END_TIME = f'''LEAST(
+    shows.start_time + {DEFAULT_DURATION},
+    (SELECT min(other.start_time) FROM shows other
+     WHERE other.venue_id = shows.venue_id AND other.start_time > shows.start_time),
+    (SELECT min(other.start_time) FROM shows other
+     WHERE other.artist_id = shows.artist_id AND other.start_time > shows.start_time))'''
+
+DOUBLE_BOOKINGS = '''
+    SELECT first.id, second.id, 'venue' FROM shows first JOIN shows second
+        ON second.venue_id = first.venue_id AND second.start_time = first.start_time AND second.id > first.id
+    UNION ALL
+    SELECT first.id, second.id, 'artist' FROM shows first JOIN shows second
+        ON second.artist_id = first.artist_id AND second.start_time = first.start_time AND second.id > first.id
+    LIMIT 20'''
+
+
+def upgrade():
+    bind = op.get_bind()
+    # shows starting together at one venue or with one artist can't be trimmed apart
+    doubles = bind.execute(sa.text(DOUBLE_BOOKINGS)).all()
+    if doubles:
+        pairs = '; '.join(f'shows {first} and {second} ({kind})' for first, second, kind in doubles)
+        raise RuntimeError(f'Double-booked shows start at the same time: {pairs}. Move or delete them first.')
+    op.add_column('shows', sa.Column('end_time', sa.DateTime(), nullable=True))
+    update = sa.text(f'UPDATE shows SET end_time = {END_TIME} WHERE id >= :low AND id < :high')
+    with op.get_context().autocommit_block():
+        low, high = bind.execute(sa.text('SELECT min(id), max(id) FROM shows')).one()
+        if low is not None:
+            for start in range(low, high + 1, BATCH_SIZE):
+                bind.execute(update, {'low': start, 'high': start + BATCH_SIZE})
+    # shows added during the batches
+    bind.execute(sa.text(f'UPDATE shows SET end_time = {END_TIME} WHERE end_time IS NULL'))
+    op.alter_column('shows', 'end_time', nullable=False)
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.create_check_constraint('ck_shows_duration', 'shows',
+                               f'end_time > start_time AND end_time <= start_time + {MAX_DURATION}')
+    op.execute('''ALTER TABLE shows ADD CONSTRAINT ex_shows_venue_booking
+                  EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)''')
+    op.execute('''ALTER TABLE shows ADD CONSTRAINT ex_shows_artist_booking
+                  EXCLUDE USING gist (artist_id WITH =, tsrange(start_time, end_time) WITH &&)''')
+
+
+def downgrade():
+    op.drop_constraint('ex_shows_artist_booking', 'shows')
+    op.drop_constraint('ex_shows_venue_booking', 'shows')
+    op.drop_constraint('ck_shows_duration', 'shows')
+    op.drop_column('shows', 'end_time')
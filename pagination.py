@@ -0,0 +1,109 @@
+"""Keyset pagination.
+
+Pages are ordered by a unique ascending key (e.g. ``(start_time, id)``) and
+addressed by opaque cursors holding the key of the row at the page edge,
+so fetching any page is an index range scan and rows inserted meanwhile
+never shift or duplicate the rows of other pages.
+"""
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+import json
+
+from sqlalchemy import tuple_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class Page:
+
+    def __init__(self, items, prev_cursor=None, next_cursor=None):
+        self.items = items
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def encode_cursor(direction, key):
+    payload = json.dumps([direction, [_encode_value(value) for value in key]], separators=(',', ':'))
+    return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, key = json.loads(urlsafe_b64decode(padded.encode()))
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return direction, tuple(_decode_value(value) for value in key)
+    except (TypeError, ValueError) as error:
+        raise InvalidCursor(cursor) from error
+
+
+def _page(rows, direction, has_cursor, limit, row_key):
+    # rows were fetched in the cursor's direction, one past the limit
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == 'prev':
+        rows.reverse()
+    if not rows:
+        return Page(rows)
+    first, last = row_key(rows[0]), row_key(rows[-1])
+    if direction == 'next':
+        return Page(rows,
+                    encode_cursor('prev', first) if has_cursor else None,
+                    encode_cursor('next', last) if has_more else None)
+    return Page(rows,
+                encode_cursor('prev', first) if has_more else None,
+                encode_cursor('next', last))
+
+
+def keyset_pager(query, keys, row_key, cursor=None, limit=20, descending=False):
+    """keyset_page in two steps: the query of the page, and the function
+    making the Page from its rows, for pages fetched along other queries.
+    """
+    direction, key = decode_cursor(cursor) if cursor else ('next', None)
+    ascending = (direction == 'next') != descending
+    if key is not None:
+        if len(key) != len(keys):
+            raise InvalidCursor(cursor)
+        bound = tuple_(*keys)
+        query = query.filter(bound > tuple_(*key) if ascending else bound < tuple_(*key))
+    order = keys if ascending else [column.desc() for column in keys]
+    return query.order_by(*order).limit(limit + 1), lambda rows: _page(rows, direction, cursor is not None, limit, row_key)
+
+
+def keyset_page(query, keys, row_key, cursor=None, limit=20, descending=False):
+    """Fetch one page of query ordered by the unique keys.
+
+    row_key(row) must return the values of keys for a result row.
+    """
+    query, page = keyset_pager(query, keys, row_key, cursor, limit, descending)
+    return page(query.all())
+
+
+def keyset_slice(rows, row_key, cursor=None, limit=20):
+    """Same as keyset_page for a list of rows sorted by row_key."""
+    direction, key = decode_cursor(cursor) if cursor else ('next', None)
+    keys = [row_key(row) for row in rows]
+    if direction == 'next':
+        start = 0 if key is None else bisect_right(keys, key)
+        selected = rows[start:start + limit + 1]
+    else:
+        end = bisect_left(keys, key)
+        selected = rows[max(end - limit - 1, 0):end][::-1]
+    return _page(selected, direction, cursor is not None, limit, row_key)
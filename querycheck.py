@@ -0,0 +1,172 @@
+"""N+1 query detection.
+
+Statements are fingerprinted by replacing literals and bound parameters
+with ``?``, so ``WHERE shows.venue_id = 1`` and ``= 2`` share a shape.
+A request running one shape more than ``QUERY_REPEAT_THRESHOLD`` times
+is almost always loading rows one at a time in a loop; the detector logs
+each such shape with the application lines (Python or template) that ran
+it, and raises ``RepeatedQueries`` instead when ``STRICT_QUERIES`` is set
+(``FYYUR_STRICT_QUERIES=1``).
+
+``query_budget`` asserts the same thing, plus a statement budget, around
+any block of code, e.g. a test client request.
+"""
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+import os
+import re
+import traceback
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+PARAMETER = re.compile(r'%\(\w+\)s|\?|:\w+')
+IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+SPACE = re.compile(r'\s+')
+
+HERE = os.path.abspath(__file__)
+
+
+class RepeatedQueries(RuntimeError):
+    pass
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(statement):
+    """Normalize statement so statements differing only in values match."""
+    shape = STRING.sub('?', statement)
+    shape = PARAMETER.sub('?', shape)
+    shape = NUMBER.sub('?', shape)
+    shape = IN_LIST.sub('IN (?)', shape)
+    return SPACE.sub(' ', shape).strip()
+
+
+def call_site(root):
+    """The innermost application frame (module or template) on the stack."""
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith('<'):
+            continue
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(root) and filename != HERE and 'site-packages' not in filename:
+            return f'{os.path.relpath(filename, root)}:{frame.lineno} in {frame.name}'
+    return 'unknown'
+
+
+class StatementLog:
+    """Shapes run, with the call sites running each."""
+
+    def __init__(self, root):
+        self.root = root
+        self.count = 0
+        self.shapes = Counter()
+        self.sites = defaultdict(Counter)
+
+    def add(self, statement):
+        shape = fingerprint(statement)
+        self.count += 1
+        self.shapes[shape] += 1
+        self.sites[shape][call_site(self.root)] += 1
+
+    def repeated(self, threshold):
+        """(shape, times run, sites by count) for shapes run over threshold times."""
+        return [(shape, count, self.sites[shape].most_common())
+                for shape, count in self.shapes.most_common() if count > threshold]
+
+    def report(self, threshold):
+        lines = []
+        for shape, count, sites in self.repeated(threshold):
+            lines.append(f'  {count} x {shape}')
+            lines += [f'      {times} x from {site}' for site, times in sites]
+        return '\n'.join(lines)
+
+
+# Logs being filled by query_budget blocks, outside any request
+_budget_logs = []
+
+
+def current_log():
+    if has_request_context():
+        return g.get('statement_log')
+    return None
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    log = current_log()
+    if log is not None:
+        log.add(statement)
+    for budget_log in _budget_logs:
+        budget_log.add(statement)
+
+
+class QueryDetector:
+    """Flag repeated statement shapes in the requests of app.
+
+    Config: QUERY_DETECTOR (enable; walking the stack on every statement
+    makes it a development tool), QUERY_REPEAT_THRESHOLD and
+    STRICT_QUERIES (raise instead of logging; implies QUERY_DETECTOR).
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+
+    @property
+    def enabled(self):
+        return self.app.config.get('QUERY_DETECTOR') or self.app.config.get('STRICT_QUERIES')
+
+    def before_request(self):
+        if self.enabled:
+            g.statement_log = StatementLog(self.app.root_path)
+
+    def after_request(self, response):
+        log = current_log()
+        if log is None:
+            return response
+        threshold = self.app.config.get('QUERY_REPEAT_THRESHOLD', 3)
+        if not log.repeated(threshold):
+            return response
+        message = f'Repeated queries in {request.method} {request.full_path.rstrip("?")}:\n{log.report(threshold)}'
+        if self.app.config.get('STRICT_QUERIES'):
+            raise RepeatedQueries(message)
+        self.app.logger.warning(message)
+        return response
+
+
+@contextmanager
+def query_budget(max_queries, threshold=3, root=None):
+    """Fail unless the block runs at most max_queries statements and no
+    statement shape more than threshold times.
+
+        with query_budget(4):
+            client.get('/venues/1')
+    """
+    log = StatementLog(root or os.path.dirname(HERE))
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    _budget_logs.append(log)
+    try:
+        yield log
+    finally:
+        _budget_logs.remove(log)
+    problems = []
+    if log.count > max_queries:
+        problems.append(f'{log.count} queries, budget {max_queries}')
+    if log.repeated(threshold):
+        problems.append(f'repeated queries:\n{log.report(threshold)}')
+    if problems:
+        raise QueryBudgetExceeded('; '.join(problems))
@@ -0,0 +1,157 @@
+"""Read replica routing.
+
+Views marked ``@read_only`` run their queries on a read replica, chosen
+round-robin per request among the replicas whose last health check
+succeeded with a replication lag of at most ``REPLICA_MAX_LAG_SECONDS``.
+With no such replica they fall back to the primary, as does everything
+else: writes, unmarked views, CLI commands and jobs.
+
+A request that commits pins its user (through the Flask session) to the
+primary for ``READ_YOUR_WRITES_SECONDS``, so the page a write redirects
+to, e.g. ``show_venue`` after ``edit_venue_submission``, shows the write
+even when the replicas have not replayed it yet.
+
+Replicas are checked at most every ``REPLICA_CHECK_SECONDS`` per
+process, by the first request due, and are taken out of rotation at once
+when a connection to them breaks.
+"""
+
+from itertools import count
+from threading import Lock
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import create_engine, event, orm, text
+
+
+# Seconds the replica is behind: zero when it has replayed all it received,
+# otherwise the age of the last transaction it replayed
+POSTGRES_LAG = text(
+    'SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END')
+
+PINNED_KEY = 'read_primary_until'
+
+
+def read_only(view):
+    """Mark a view as only reading, so its queries may run on a replica."""
+    view.replica_reads = True
+    return view
+
+
+class Replica:
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.healthy = True
+        self.lag = 0.0
+        event.listen(engine, 'handle_error', self.handle_error)
+
+    def __repr__(self):
+        return f'<Replica {self.engine.url!r} healthy={self.healthy} lag={self.lag}>'
+
+    def handle_error(self, context):
+        if context.is_disconnect:
+            self.healthy = False
+
+    def check(self):
+        try:
+            with self.engine.connect() as connection:
+                if connection.dialect.name == 'postgresql':
+                    self.lag = float(connection.execute(POSTGRES_LAG).scalar() or 0)
+                else:
+                    connection.execute(text('SELECT 1'))
+                    self.lag = 0.0
+            self.healthy = True
+        except Exception:
+            self.healthy = False
+
+
+class ReplicaRouter:
+    """Route the queries of read-only views of app to replicas.
+
+    Config: SQLALCHEMY_REPLICA_URIS, REPLICA_MAX_LAG_SECONDS,
+    REPLICA_CHECK_SECONDS and READ_YOUR_WRITES_SECONDS. The session of db
+    must be a RoutingSession (see RoutingSQLAlchemy).
+    """
+
+    def __init__(self, app=None, db=None):
+        self.replicas = []
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.app = app
+        options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+        self.replicas = [Replica(create_engine(uri, **options)) for uri in app.config.get('SQLALCHEMY_REPLICA_URIS', [])]
+        self.turns = count()
+        self.checked_at = None
+        self.check_lock = Lock()
+        app.extensions['replicas'] = self
+        app.after_request(self.after_request)
+        event.listen(db.session, 'after_commit', self.after_commit)
+
+    def check(self, force=False):
+        """Refresh replica health if due; only one thread checks at a time."""
+        interval = self.app.config.get('REPLICA_CHECK_SECONDS', 10)
+        if not force and self.checked_at is not None and time.monotonic() - self.checked_at < interval:
+            return
+        if not self.check_lock.acquire(blocking=False):
+            return
+        try:
+            for replica in self.replicas:
+                replica.check()
+            self.checked_at = time.monotonic()
+        finally:
+            self.check_lock.release()
+
+    def available(self):
+        max_lag = self.app.config.get('REPLICA_MAX_LAG_SECONDS', 5)
+        return [replica for replica in self.replicas if replica.healthy and replica.lag <= max_lag]
+
+    def choose(self):
+        self.check()
+        replicas = self.available()
+        return replicas[next(self.turns) % len(replicas)] if replicas else None
+
+    def pinned(self):
+        """Whether the current user reads from the primary after a write."""
+        return bool(self.replicas) and session.get(PINNED_KEY, 0) > time.time()
+
+    def read_engine(self):
+        """The replica engine for the current request, or None for the primary."""
+        if not self.replicas or not has_request_context():
+            return None
+        if 'db_replica' not in g:
+            view = current_app.view_functions.get(request.endpoint)
+            reads = getattr(view, 'replica_reads', False)
+            g.db_replica = self.choose() if reads and not self.pinned() else None
+        return g.db_replica.engine if g.db_replica is not None else None
+
+    def after_commit(self, db_session):
+        if has_request_context():
+            g.db_committed = True
+
+    def after_request(self, response):
+        if self.replicas and g.get('db_committed'):
+            session[PINNED_KEY] = time.time() + self.app.config.get('READ_YOUR_WRITES_SECONDS', 10)
+        return response
+
+
+class RoutingSession(SignallingSession):
+    """Session binding reads to the replica picked for the request."""
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        router = self.app.extensions.get('replicas')
+        if router is not None and not self._flushing:
+            engine = router.read_engine()
+            if engine is not None:
+                return engine
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
@@ -0,0 +1,156 @@
+"""Venue and artist search.
+
+On Postgres, venues and artists carry a trigger-maintained ``search_vector``
+tsvector (name, city, state, genres) with a GIN index, and a pg_trgm GIN
+index on ``name`` that serves fuzzy and partial-name matches. Other
+databases (SQLite in tests) use ``InMemorySearchIndex``, which ranks the
+same way in pure Python.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import islice
+import re
+
+from sqlalchemy import DDL, Float, cast, func, literal, literal_column, or_
+
+
+WORD = re.compile(r'\w+')
+
+# Weights of the tsvector sections, mirrored by the in-memory index
+NAME_WEIGHT = 1.0
+PLACE_WEIGHT = 0.4
+GENRE_WEIGHT = 0.2
+
+# pg_trgm's default similarity threshold for the % operator
+SIMILARITY_THRESHOLD = 0.3
+
+
+def words(text):
+    return WORD.findall(text.lower())
+
+
+def prefix_tsquery(term):
+    """Build a tsquery matching every word of term as a prefix."""
+    return ' & '.join(f'{word}:*' for word in words(term))
+
+
+def to_tsquery(tsquery):
+    # asyncpg sends a 'simple' parameter as varchar, which to_tsquery() doesn't take
+    return func.to_tsquery(literal_column("'simple'::regconfig"), tsquery)
+
+
+def search_vector_ddl(table):
+    """DDL for the trigger maintaining table.search_vector on Postgres.
+
+    Needs genre_names() (genres.genre_names_ddl) to exist.
+    """
+    return DDL(f'''
+        CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')), 'B') ||
+                setweight(to_tsvector('simple', coalesce(genre_names(NEW.genres), '')), 'C');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+        CREATE TRIGGER {table}_search_vector_update
+            BEFORE INSERT OR UPDATE OF name, city, state, genres ON {table}
+            FOR EACH ROW EXECUTE PROCEDURE {table}_search_vector_update();
+    ''').execute_if(dialect='postgresql')
+
+
+def pg_trgm_ddl():
+    return DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+
+
+def search_filter(model, term):
+    """Clause matching rows of model for term, or None to match every row."""
+    tsquery = prefix_tsquery(term)
+    if not tsquery:
+        return None
+    return or_(
+        model.search_vector.op('@@')(to_tsquery(tsquery)),
+        model.name.op('%')(term),
+        model.name.ilike(f'%{term}%'))
+
+
+def search_rank(model, term):
+    """Relevance of rows of model for term, higher is better."""
+    tsquery = prefix_tsquery(term)
+    if not tsquery:
+        # A bare constant is not allowed in ORDER BY
+        return cast(literal(0.0), Float)
+    rank = func.ts_rank(model.search_vector, to_tsquery(tsquery)) + func.similarity(model.name, term)
+    # Double precision so ranks round-trip exactly through page cursors
+    return cast(rank, Float)
+
+
+def trigrams(text):
+    # Same padding rules as pg_trgm: two spaces before, one after each word
+    grams = set()
+    for word in words(text):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    a, b = trigrams(a), trigrams(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class InMemorySearchIndex:
+    """Pure-Python stand-in for the Postgres search indexes.
+
+    Keeps a sorted vocabulary for prefix lookups and falls back to a scan
+    of names for substring and trigram matches.
+    """
+
+    def __init__(self, rows=()):
+        self.names = {}
+        self.postings = defaultdict(dict)
+        for row in rows:
+            self._add(*row)
+        self.vocabulary = sorted(self.postings)
+
+    def _add(self, id, name, city, state, genres):
+        self.names[id] = name
+        sections = ((name, NAME_WEIGHT), (f'{city} {state}', PLACE_WEIGHT), (' '.join(genres or []), GENRE_WEIGHT))
+        for text, weight in sections:
+            for word in words(text):
+                postings = self.postings[word]
+                postings[id] = max(postings.get(id, 0.0), weight)
+
+    def prefix_matches(self, prefix):
+        start = bisect_left(self.vocabulary, prefix)
+        for word in islice(self.vocabulary, start, None):
+            if not word.startswith(prefix):
+                break
+            yield self.postings[word]
+
+    def search(self, term):
+        """Return (id, rank) pairs for the ids matching term."""
+        query_words = words(term)
+        if not query_words:
+            return [(id, 0.0) for id in self.names]
+        scores = None
+        for word in query_words:
+            word_scores = defaultdict(float)
+            for postings in self.prefix_matches(word):
+                for id, weight in postings.items():
+                    word_scores[id] = max(word_scores[id], weight)
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {id: score + word_scores[id] for id, score in scores.items() if id in word_scores}
+        ranked = {}
+        lowered = term.lower()
+        for id, name in self.names.items():
+            name_similarity = similarity(name, term)
+            if id in scores or name_similarity >= SIMILARITY_THRESHOLD or lowered in name.lower():
+                ranked[id] = scores.get(id, 0.0) + name_similarity
+        return list(ranked.items())
@@ -0,0 +1,58 @@
+"""Connection budget of a production deployment.
+
+Every serving process keeps its own pool, so a deployment can open up to
+workers * (pool_size + max_overflow) connections. Starting more than the
+database accepts only shows up under load, as connection errors from
+whichever worker is unlucky, so servers check the budget before forking.
+"""
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+
+class PoolBudgetExceeded(RuntimeError):
+    pass
+
+
+def pool_capacity(engine_options):
+    """Connections one process can hold open at once."""
+    return engine_options.get('pool_size', 5) + engine_options.get('max_overflow', 10)
+
+
+def connection_limit(engine):
+    """Connections the database accepts from non-superusers."""
+    with engine.connect() as connection:
+        max_connections = int(connection.exec_driver_sql('SHOW max_connections').scalar())
+        reserved = int(connection.exec_driver_sql('SHOW superuser_reserved_connections').scalar())
+    return max_connections - reserved
+
+
+def max_workers(limit, engine_options, reserved=0):
+    return max((limit - reserved) // pool_capacity(engine_options), 0)
+
+
+def check_pool_budget(engine, workers, engine_options, reserved=0):
+    """Raise PoolBudgetExceeded unless workers pools fit the database.
+
+    reserved connections are left over for migrations, cron jobs and
+    interactive sessions. Returns (connections needed, connections available).
+    """
+    needed = workers * pool_capacity(engine_options)
+    limit = connection_limit(engine)
+    available = limit - reserved
+    if needed > available:
+        raise PoolBudgetExceeded(
+            f'{workers} workers x {pool_capacity(engine_options)} connections = {needed}, '
+            f'but the database accepts {available} ({limit} minus {reserved} reserved); '
+            f'run at most {max_workers(limit, engine_options, reserved)} workers or shrink the pool')
+    return needed, available
+
+
+def check_config_budget(config, workers):
+    """check_pool_budget for a config object, on a throwaway engine."""
+    engine = create_engine(config.SQLALCHEMY_DATABASE_URI, poolclass=NullPool,
+                           connect_args=config.SQLALCHEMY_ENGINE_OPTIONS.get('connect_args', {}))
+    try:
+        return check_pool_budget(engine, workers, config.SQLALCHEMY_ENGINE_OPTIONS, config.DB_RESERVED_CONNECTIONS)
+    finally:
+        engine.dispose()
@@ -0,0 +1,70 @@
+"""Template compilation and fragment caching.
+
+Compiled templates are kept in a bytecode cache on disk, keyed by the
+checksum of their source, so a new worker loads them instead of
+compiling them again; ``flask fyyur compile-templates`` fills it ahead of
+a deploy.
+
+``{% cache key, ... %}...{% endcache %}`` stores the markup of a block
+under its key parts in an in-process LRU. Keys must change whenever the
+markup would, e.g. a row's id and ``updated_at``:
+
+    {% cache 'venue-tile', venue.id, venue.updated_at %}...{% endcache %}
+"""
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from cache import MemoryBackend
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method('_cached', [nodes.List(parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _cached(self, parts, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        key = 'fragment:' + ':'.join(map(str, parts))
+        markup = cache.get(key)
+        if markup is None:
+            markup = caller()
+            cache.set(key, markup)
+        return Markup(markup)
+
+
+def init_templates(app):
+    """Configure the Jinja environment of app.
+
+    Config: TEMPLATE_BYTECODE_CACHE (enable), TEMPLATE_CACHE_DIR (default a
+    private directory under the system temporary directory) and
+    FRAGMENT_CACHE_MAX_ENTRIES (None disables fragment caching).
+    """
+    env = app.jinja_env
+    if app.config.get('TEMPLATE_BYTECODE_CACHE'):
+        env.bytecode_cache = FileSystemBytecodeCache(app.config.get('TEMPLATE_CACHE_DIR'))
+    env.add_extension(FragmentCacheExtension)
+    max_entries = app.config.get('FRAGMENT_CACHE_MAX_ENTRIES')
+    env.fragment_cache = MemoryBackend(max_entries) if max_entries else None
+
+
+def compile_templates(app):
+    """Load every HTML template of app, filling the bytecode cache."""
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
@@ -0,0 +1,108 @@
+"""Fixtures: the app on a scratch database.
+
+Tests create their own tables in TEST_DATABASE_URL (default: the local
+fyyur_test Postgres database) and empty them after each test; they never
+touch DATABASE_URL.
+"""
+
+from datetime import datetime, timedelta
+import os
+
+import pytest
+from sqlalchemy import event
+
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', 'postgresql://postgres@localhost:5432/fyyur_test')
+os.environ.setdefault('FYYUR_CONFIG', 'development')
+
+import app as fyyur  # noqa: E402
+from querycheck import query_budget as budget  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    fyyur.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    # every request reaches the controllers and the database
+    fyyur.page_cache.backend = None
+    fyyur.db.drop_all()
+    fyyur.db.create_all()
+    yield fyyur.app
+    fyyur.db.session.remove()
+    fyyur.db.drop_all()
+
+
+def empty_tables():
+    fyyur.db.session.rollback()
+    for table in reversed(fyyur.db.metadata.sorted_tables):
+        fyyur.db.session.execute(table.delete())
+    # ids start from 1 again, as the benchmark cases expect
+    for model in (fyyur.Venue, fyyur.Artist, fyyur.Show):
+        fyyur.reset_id_sequence(model)
+    fyyur.db.session.commit()
+    fyyur.db.session.remove()
+
+
+@pytest.fixture
+def db(app):
+    yield fyyur.db
+    empty_tables()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client(use_cookies=False)
+
+
+@pytest.fixture
+def populate(db):
+    """Add venues, artists and shows (half past, half upcoming); return their ids."""
+
+    def populate(venues=3, artists=3, shows=6, city='San Francisco'):
+        venue_rows = [fyyur.Venue(name=f'Venue {number}', city=f'{city} {number % 2}', state='CA', address='1 Main St',
+                                  phone='555-555-5555', genres=['Jazz'], image_link='https://example.com/venue.png')
+                      for number in range(venues)]
+        artist_rows = [fyyur.Artist(name=f'Artist {number}', city=city, state='CA', phone='555-555-5555',
+                                    genres=['Rock n Roll'], image_link='https://example.com/artist.png')
+                       for number in range(artists)]
+        db.session.add_all(venue_rows + artist_rows)
+        db.session.flush()
+        now = datetime.now()
+        for number in range(shows):
+            start_time = now + timedelta(days=number - shows // 2, hours=number)
+            db.session.add(fyyur.Show(venue_id=venue_rows[number % venues].id, artist_id=artist_rows[number % artists].id,
+                                      start_time=start_time, end_time=start_time + timedelta(hours=1)))
+        db.session.commit()
+        return [venue.id for venue in venue_rows], [artist.id for artist in artist_rows]
+
+    return populate
+
+
+@pytest.fixture
+def count_statements(app):
+    """Run a request, returning (response, statements it executed)."""
+
+    def count_statements(client, url):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = fyyur.db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            response = client.get(url)
+            response.get_data()
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        return response, len(statements)
+
+    return count_statements
+
+
+@pytest.fixture
+def query_budget(app):
+    """query_budget(max_queries): fail the block over budget or on N+1 queries."""
+
+    def query_budget(max_queries):
+        return budget(max_queries, app.config['QUERY_REPEAT_THRESHOLD'], app.root_path)
+
+    return query_budget
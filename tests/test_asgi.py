@@ -0,0 +1,37 @@
+import asyncio
+import importlib
+
+import pytest
+
+import asyncdb
+
+
+@pytest.fixture
+def asgi(app, monkeypatch):
+    # asgi sets these on import; keep them from leaking into other tests
+    monkeypatch.setenv('FYYUR_SERVING', '1')
+    monkeypatch.setenv('FYYUR_ASYNC_IO', '1')
+    monkeypatch.setattr(asyncdb, 'budget', asyncdb.budget)
+    return importlib.import_module('asgi')
+
+
+def run(asgi, scope, messages):
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.application(scope, receive, send))
+    return sent
+
+
+def test_websocket_handshakes_are_closed(asgi):
+    sent = run(asgi, {'type': 'websocket', 'path': '/'}, [{'type': 'websocket.connect'}])
+    assert sent == [{'type': 'websocket.close'}]
+
+
+def test_other_scopes_are_ignored(asgi):
+    assert run(asgi, {'type': 'telepathy'}, []) == []
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.util import greenlet_spawn
+
+import asyncdb
+from asyncdb import ConnectionBudget, fan_out
+
+pytest.importorskip('aiosqlite')
+
+
+def test_budget_takes_only_spare_connections():
+
+    async def scenario():
+        budget = ConnectionBudget(3)
+        async with budget:
+            assert budget.take(2)
+            assert not budget.take(1)
+            await budget.release(2)
+            assert budget.take(2)
+            await budget.release(2)
+        assert budget.free == 3
+
+    asyncio.run(scenario())
+
+
+def test_budget_keeps_connections_for_waiting_requests():
+
+    async def scenario():
+        budget = ConnectionBudget(1)
+        entered = asyncio.Event()
+
+        async def request():
+            async with budget:
+                entered.set()
+
+        async with budget:
+            waiter = asyncio.create_task(request())
+            await asyncio.sleep(0)
+            assert budget.waiting == 1
+        # released to the waiting request, not to a fan-out
+        assert not budget.take(1)
+        await waiter
+        assert entered.is_set() and budget.free == 1
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize('size, concurrent', [(1, False), (3, True)])
+def test_fan_out_runs_at_once_only_on_spare_connections(tmp_path, monkeypatch, size, concurrent):
+    engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path}/fan_out.db')
+    numbers = sa.table('numbers', sa.column('value'))
+    budget = ConnectionBudget(size)
+    monkeypatch.setattr(asyncdb, 'budget', budget)
+    fetched = []
+    fetch = asyncdb.fetch
+
+    def counted_fetch(*args):
+        fetched.append(args)
+        return fetch(*args)
+
+    monkeypatch.setattr(asyncdb, 'fetch', counted_fetch)
+
+    def work():
+        session = Session(bind=engine.sync_engine)
+        session.execute(sa.text('CREATE TABLE numbers (value INTEGER)'))
+        session.execute(sa.text('INSERT INTO numbers VALUES (1), (2), (3)'))
+        session.commit()
+        queries = [session.query(numbers.c.value).filter(numbers.c.value <= limit).order_by(numbers.c.value)
+                   for limit in (1, 3)]
+        try:
+            return fan_out(session, *queries)
+        finally:
+            session.close()
+
+    async def scenario():
+        try:
+            return await greenlet_spawn(work)
+        finally:
+            await engine.dispose()
+
+    results = asyncio.run(scenario())
+    assert [[value for value, in rows] for rows in results] == [[1], [1, 2, 3]]
+    assert bool(fetched) is concurrent
+    assert budget.free == size
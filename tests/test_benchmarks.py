@@ -0,0 +1,55 @@
+"""Per-controller benchmarks (pytest-benchmark) on generated data.
+
+    $ python -m pytest tests/test_benchmarks.py --benchmark-autosave
+    $ python -m pytest tests/test_benchmarks.py --benchmark-compare --benchmark-compare-fail=median:20%
+
+The cases are those of `flask bench run` (benchmarks/micro.py); each
+records its statements per request in extra_info.
+"""
+
+import random
+
+import pytest
+
+import app as fyyur
+from benchmarks import micro
+from tests.conftest import empty_tables
+
+pytest.importorskip('pytest_benchmark')
+
+ROUNDS = 20
+WARMUP_ROUNDS = 2
+
+
+@pytest.fixture(scope='module')
+def generated(app):
+    result = app.test_cli_runner().invoke(args=['bench', 'generate', '--scale', '1k'])
+    assert result.exit_code == 0, result.output
+    yield {
+        'venues': fyyur.db.session.query(fyyur.db.func.max(fyyur.Venue.id)).scalar(),
+        'artists': fyyur.db.session.query(fyyur.db.func.max(fyyur.Artist.id)).scalar()
+    }
+    empty_tables()
+
+
+@pytest.mark.parametrize('case', micro.cases(fyyur), ids=lambda case: case.name)
+def test_controller(benchmark, app, generated, case):
+    rng = random.Random(case.name)
+    client = app.test_client(use_cookies=False)
+    queries = []
+
+    def setup():
+        argument = case.setup(client, rng, generated) if case.setup else None
+        fyyur.db.session.remove()
+        return case.request(rng, generated, argument), {}
+
+    def request(method, url, data):
+        with micro.counted_statements() as counter:
+            response = client.open(url, method=method, data=data)
+            response.get_data()
+        queries.append(counter[0])
+        return response
+
+    response = benchmark.pedantic(request, setup=setup, rounds=ROUNDS, warmup_rounds=WARMUP_ROUNDS)
+    benchmark.extra_info['queries'] = sorted(queries)[len(queries) // 2]
+    assert response.status_code < 400
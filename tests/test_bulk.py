@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import pytest
+
+import app as fyyur
+from bulk import validate
+
+
+@pytest.mark.parametrize('format_', ['csv', 'ndjson'])
+@pytest.mark.parametrize('model, column', [(fyyur.Venue, 'seeking_talent'), (fyyur.Artist, 'seeking_venue')])
+def test_export_import_round_trip_keeps_booleans(app, db, populate, tmp_path, format_, model, column):
+    populate(venues=4, artists=4, shows=0)
+    for row in model.query.filter(model.id % 2 == 0):
+        setattr(row, column, True)
+    db.session.commit()
+    before = dict(db.session.query(model.id, getattr(model, column)))
+    kind = model.__tablename__
+    path = str(tmp_path / f'{kind}.{format_}')
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['fyyur', 'export', kind, path])
+    assert result.exit_code == 0, result.output
+    db.session.query(model).delete()
+    db.session.commit()
+    result = runner.invoke(args=['fyyur', 'import', kind, path])
+    assert result.exit_code == 0, result.output
+
+    assert dict(db.session.query(model.id, getattr(model, column))) == before
+    assert set(before.values()) == {True, False}
+
+
+@pytest.mark.parametrize('value, expected', [('False', False), ('false', False), ('', False), ('no', False),
+                                             ('True', True), ('TRUE', True), ('1', True)])
+def test_import_normalizes_booleans(value, expected):
+    row = {'name': 'Venue', 'city': 'Springfield', 'state': 'CA', 'address': '1 Main St', 'phone': '555-555-5555',
+           'image_link': 'https://example.com/venue.png', 'genres': ['Jazz'], 'seeking_talent': value}
+    values, errors = validate(*fyyur.BULK_KINDS['venues'][1:], row)
+    assert errors == []
+    assert values['seeking_talent'] is expected
+
+
+def test_import_rejects_unknown_booleans():
+    row = {'name': 'Artist', 'city': 'Springfield', 'state': 'CA', 'phone': '555-555-5555',
+           'image_link': 'https://example.com/artist.png', 'genres': ['Jazz'], 'seeking_venue': 'maybe'}
+    values, errors = validate(*fyyur.BULK_KINDS['artists'][1:], row)
+    assert values is None
+    assert errors == ['seeking_venue: Not a valid boolean value']
+
+
+def test_import_reports_a_show_without_start_time():
+    values, errors = validate(*fyyur.BULK_KINDS['shows'][1:], {'artist_id': '1', 'venue_id': '1'})
+    assert values is None
+    assert errors == ['start_time: This field is required.']
+
+
+@pytest.mark.parametrize('start_time, expected', [('2030-05-01 20:15:30', datetime(2030, 5, 1, 20, 15, 30)),
+                                                  ('2030-05-01 20:15', datetime(2030, 5, 1, 20, 15))])
+def test_import_reads_show_times_with_and_without_seconds(start_time, expected):
+    values, errors = validate(*fyyur.BULK_KINDS['shows'][1:], {'artist_id': '1', 'venue_id': '1', 'start_time': start_time})
+    assert errors == []
+    assert values['start_time'] == expected
+
+
+@pytest.mark.parametrize('format_', ['csv', 'ndjson'])
+def test_export_import_round_trip_keeps_show_times(app, db, populate, tmp_path, format_):
+    populate(venues=2, artists=2, shows=4)
+    before = dict(db.session.query(fyyur.Show.id, fyyur.Show.start_time))
+    path = str(tmp_path / f'shows.{format_}')
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['fyyur', 'export', 'shows', path])
+    assert result.exit_code == 0, result.output
+    fyyur.Show.query.delete()
+    db.session.commit()
+    result = runner.invoke(args=['fyyur', 'import', 'shows', path])
+    assert result.exit_code == 0, result.output
+
+    after = dict(db.session.query(fyyur.Show.id, fyyur.Show.start_time))
+    assert after == {id: start_time.replace(microsecond=0) for id, start_time in before.items()}
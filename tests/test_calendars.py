@@ -0,0 +1,16 @@
+import pytest
+
+
+@pytest.mark.parametrize('query', ['month=9999-12', 'month=0001-01', 'month=2030-13', 'month=2030-01&day=9999-12-31',
+                                   'month=2030-01&day=0001-01-01'])
+@pytest.mark.parametrize('kind', ['venues', 'artists'])
+def test_calendar_rejects_months_out_of_range(client, populate, kind, query):
+    venue_ids, artist_ids = populate(venues=1, artists=1, shows=2)
+    entity_id = venue_ids[0] if kind == 'venues' else artist_ids[0]
+    assert client.get(f'/{kind}/{entity_id}/calendar?{query}').status_code == 400
+
+
+@pytest.mark.parametrize('query', ['month=9998-12', 'month=0002-01'])
+def test_calendar_shows_months_at_the_edges(client, populate, query):
+    venue_ids, _ = populate(venues=1, artists=1, shows=2)
+    assert client.get(f'/venues/{venue_ids[0]}/calendar?{query}').status_code == 200
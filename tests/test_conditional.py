@@ -0,0 +1,29 @@
+import pytest
+
+import app as fyyur
+
+
+@pytest.mark.parametrize('url, model', [('/venues', fyyur.Venue), ('/artists', fyyur.Artist), ('/shows', fyyur.Show)])
+def test_list_pages_change_after_a_delete(client, db, populate, url, model):
+    populate(venues=2, artists=2, shows=4)
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.last_modified is None
+    assert client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    row_id = db.session.query(db.func.min(model.id)).scalar()
+    db.session.remove()
+    assert client.delete(f'{url}/{row_id}').status_code == 200
+
+    assert client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 200
+    since = client.get(url, headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    assert since.status_code == 200
+
+
+def test_detail_pages_keep_last_modified(client, populate):
+    venue_ids, _ = populate(venues=1, artists=1, shows=2)
+    response = client.get(f'/venues/{venue_ids[0]}')
+    assert response.status_code == 200
+    assert response.last_modified is not None
+    headers = {'If-Modified-Since': response.headers['Last-Modified']}
+    assert client.get(f'/venues/{venue_ids[0]}', headers=headers).status_code == 304
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+import app as fyyur
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def statement_timeout(code):
+    environ = dict(os.environ)
+    environ.pop('FYYUR_SERVING', None)
+    result = subprocess.run([sys.executable, '-c', code + '\nprint(db.session.execute("SHOW statement_timeout").scalar())'],
+                            cwd=ROOT, env=environ, capture_output=True, text=True, check=True)
+    return result.stdout.split()[-1]
+
+
+def test_web_servers_get_a_statement_timeout():
+    assert statement_timeout('import wsgi\nfrom app import db') == '5s'
+
+
+def test_migrations_and_commands_run_without_a_statement_timeout(app):
+    # flask commands and migrations/env.py share the app's engine
+    assert statement_timeout('from app import db') == '0'
+    with app.app_context():
+        assert fyyur.db.session.execute('SHOW statement_timeout').scalar() == '0'
@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.mark.parametrize('url', ['/venues', '/artists', '/shows'])
+def test_listing_queries_do_not_grow_with_rows(client, populate, count_statements, url):
+    populate(venues=2, artists=2, shows=4)
+    response, few = count_statements(client, url)
+    assert response.status_code == 200
+
+    populate(venues=12, artists=12, shows=24, city='Oakland')
+    response, many = count_statements(client, url)
+    assert response.status_code == 200
+    assert many == few
@@ -0,0 +1,13 @@
+import pytest
+
+from app import QUERY_BUDGETS
+
+
+@pytest.mark.parametrize('url, budget', list(QUERY_BUDGETS.items()))
+def test_route_stays_within_query_budget(client, populate, query_budget, url, budget):
+    venue_ids, artist_ids = populate(venues=5, artists=5, shows=20)
+    url = url.format(venue_id=venue_ids[0], artist_id=artist_ids[0])
+    with query_budget(budget):
+        response = client.get(url)
+        response.get_data()
+    assert response.status_code == 200
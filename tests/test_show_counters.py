@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as fyyur
+
+
+@pytest.mark.parametrize('model', [fyyur.Venue, fyyur.Artist])
+def test_counters_waiting_for_roll_over_are_not_drift(app, db, populate, model):
+    populate(venues=2, artists=2, shows=8)
+    now = datetime.now()
+    # as the counters stand when the last roll-over ran two days ago
+    for counted in (fyyur.Venue, fyyur.Artist):
+        fyyur.rebuild_show_counters(counted, now - timedelta(days=2))
+    db.session.commit()
+    assert model.query.filter(model.next_show_time<now).count()
+
+    assert fyyur.show_counter_drift(model, now) == []
+    result = app.test_cli_runner().invoke(args=['fyyur', 'verify-show-counters', '--dry-run'])
+    assert result.output.endswith('0 drifted rows\n'), result.output
+
+    fyyur.roll_over_show_counters(model, now)
+    db.session.commit()
+    assert fyyur.show_counter_drift(model, now) == []
+
+
+def test_drift_is_still_reported(app, db, populate):
+    venue_ids, _ = populate(venues=2, artists=2, shows=8)
+    fyyur.rebuild_show_counters(fyyur.Venue, datetime.now() - timedelta(days=2))
+    fyyur.Venue.query.get(venue_ids[0]).past_shows_count += 1
+    db.session.commit()
+    assert [row.id for row in fyyur.show_counter_drift(fyyur.Venue, datetime.now())] == [venue_ids[0]]
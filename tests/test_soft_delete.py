@@ -0,0 +1,42 @@
+import json
+
+import app as fyyur
+
+
+def listed_show_ids(client):
+    response = client.get('/api/v1/shows', headers={'Accept': 'application/x-ndjson'})
+    assert response.status_code == 200
+    return {json.loads(line)['id'] for line in response.get_data(as_text=True).splitlines() if line}
+
+
+def test_deleted_venue_shows_are_hidden_at_once(client, db, populate):
+    venue_ids, _ = populate(venues=2, artists=2, shows=4)
+    shows = {show.id: show.venue_id for show in fyyur.Show.query}
+    assert b'Venue 0' in client.get('/shows').data
+
+    assert client.delete(f'/venues/{venue_ids[0]}').status_code == 200
+
+    kept = {show_id for show_id, venue_id in shows.items() if venue_id != venue_ids[0]}
+    assert {show_id for show_id, in db.session.query(fyyur.ShowListing.show_id)} == kept
+    assert listed_show_ids(client) == kept
+    assert b'Venue 0' not in client.get('/shows').data
+
+
+def test_delete_show_of_deleted_artist(client, db, populate):
+    _, artist_ids = populate(venues=2, artists=2, shows=4)
+    show_id = fyyur.Show.query.filter_by(artist_id=artist_ids[0]).first().id
+    assert client.delete(f'/artists/{artist_ids[0]}').status_code == 200
+
+    assert client.delete(f'/shows/{show_id}').status_code == 200
+    assert fyyur.Show.query.get(show_id) is None
+
+
+def test_artist_page_counts_only_listed_shows(client, populate):
+    venue_ids, artist_ids = populate(venues=2, artists=1, shows=4)
+    page = client.get(f'/artists/{artist_ids[0]}').data
+    assert b'2 Upcoming Shows' in page and b'2 Past Shows' in page
+
+    assert client.delete(f'/venues/{venue_ids[0]}').status_code == 200
+
+    page = client.get(f'/artists/{artist_ids[0]}').data
+    assert b'1 Upcoming Show<' in page and b'1 Past Show<' in page
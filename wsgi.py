@@ -0,0 +1,11 @@
+"""WSGI entry point for production servers.
+
+    $ FYYUR_CONFIG=production gunicorn -c gunicorn.conf.py wsgi:application
+    $ FYYUR_CONFIG=production uvicorn --interface wsgi wsgi:application
+"""
+
+import os
+
+os.environ['FYYUR_SERVING'] = '1'
+
+from app import app as application